@@ -1,7 +1,19 @@
+import argparse
 import inspect
+import logging
+import os
+import sys
 from pathlib import Path
 from pipeline.tasks import *
+from pipeline.utils.ChangelogStore import ChangelogStore, SHARDS_FOLDER, STORE_FILENAME
+from pipeline.utils.EnrichmentBundle import EnrichmentBundle
+from pipeline.utils.changelog_analytics import (
+    CHANGE_COLUMNS, changelog_stats, query_changes, records_without, write_rows
+)
+from pipeline.utils.load_config import load_config
+from pipeline.utils.logging import setup_logging
 from pipeline.utils.PipelineContext import PipelineContext
+from pipeline.utils.WorkerPool import WorkerPool
 
 
 def execute_task(task, xml_file, input_folder=None, output_folder=None, context=None, **kwargs):
@@ -29,6 +41,26 @@ def execute_task(task, xml_file, input_folder=None, output_folder=None, context=
     task(**task_args)
 
 
+def get_conversion_tables(tasks):
+    """
+    Returns the conversion tables declared by the tasks (module-level
+    CONVERSION_TABLES), in task order.
+    """
+    tables = []
+    for task, _ in tasks:
+        tables.extend(getattr(sys.modules[task.__module__], "CONVERSION_TABLES", ()))
+    return tables
+
+
+def get_batch_task(task):
+    """
+    Returns the function running a task on a list of XML files at once
+    (module-level BATCH_TASK, e.g. add_fresh_enrichment_namespace), if the
+    task declares one.
+    """
+    return getattr(sys.modules[task.__module__], "BATCH_TASK", None)
+
+
 def run_pipeline():
     """
     Executes the entire XML modification pipeline.
@@ -81,15 +113,56 @@ def run_pipeline():
         (add_parent_category,{}),
         (convert_icd_codes_to_uris, {}),
         (remove_duplicate_empty, {}),
-        
-        #(split_fr_en, {})
+        (split_fr_en, {}),
     ]
     
 
+    # Compile and validate all the conversion tables before touching any record
+    try:
+        run_context.compile_plans(get_conversion_tables(tasks))
+    except ValueError as e:
+        logger.error("Compilation failed, stopping the run: %s", e)
+        raise
+
+    # Records are processed in worker processes when 'workers' is set in configs/pipeline.yaml
+    workers = run_context.pipeline_config.get("workers", 0)
+    pool = None
+    if workers:
+        settings = run_context.pipeline_config
+        pool = WorkerPool(
+            run_context,
+            workers,
+            chunk_size=settings.get("chunk_size", 0),
+            start_method=settings.get("start_method", "spawn"),
+            max_chunks_per_worker=settings.get("max_chunks_per_worker", 0),
+        )
+        logger.info("Processing records with %d worker processes (%s)", workers, pool.start_method)
+
+    try:
+        run_tasks(tasks, run_context, pool)
+    finally:
+        if pool:
+            pool.close()
+        run_context.close_changelogs()
+
+    run_context.write_unmatched_report()
+    run_context.write_operation_stats()
+
+    logger.info("Pipeline execution completed.")
+
+
+def run_tasks(tasks, run_context, pool=None):
+    """
+    Runs the tasks one after the other on every XML file, in the main process
+    or, if a WorkerPool is given, in its worker processes. Tasks declaring a
+    batch function (see get_batch_task) get all the files of the stage, or of
+    a worker's chunk, in one call, with the context.
+    """
     current_input_folder = Path(run_context.get_original_folder())
 
     for idx, (task, kwargs) in enumerate(tasks):
         task_name = f"{idx + 1:02d}-{task.__name__}"
+        run_context.start_task(idx, task.__name__)
 
         # Each task writes to its own subfolder inside outputs/
         current_output_folder = (
@@ -102,28 +175,197 @@ def run_pipeline():
             current_output_folder.mkdir(parents=True, exist_ok=True)
 
         xml_files = get_xml_files(current_input_folder, context=run_context)
+        batch_task = get_batch_task(task)
 
-        for xml_file in xml_files:
-            # Initialize changelog for this file
-            run_context.init_changelog_for_file(xml_file)
-
-            # Execute the task
-            execute_task(
+        if pool:
+            pool.run_task(
+                execute_task,
                 task,
-                xml_file,
+                xml_files,
+                input_folder=current_input_folder,
+                output_folder=current_output_folder,
+                batch_task=batch_task,
+                **kwargs
+            )
+        elif batch_task:
+            batch_task(
+                xml_files,
                 input_folder=current_input_folder,
                 output_folder=current_output_folder,
                 context=run_context,
                 **kwargs
             )
+        else:
+            for xml_file in xml_files:
+                # Initialize changelog for this file
+                run_context.begin_record(xml_file)
+
+                # Execute the task
+                try:
+                    execute_task(
+                        task,
+                        xml_file,
+                        input_folder=current_input_folder,
+                        output_folder=current_output_folder,
+                        context=run_context,
+                        **kwargs
+                    )
+                finally:
+                    run_context.end_record(xml_file)
+
+        # Changelogs on disk are complete at the end of each task
+        run_context.flush_changelogs()
+        run_context.end_task()
 
         # Update input folder for the next task
         if current_output_folder:
             current_input_folder = current_output_folder
 
 
-    logger.info("Pipeline execution completed.")
+def build_bundle(output=None):
+    """
+    Compiles the ID-keyed conversion tables into the enrichment bundle used by
+    the tasks (see EnrichmentBundle), at the path set in configs/pipeline.yaml
+    ('enrichment_bundle') unless another output is given.
+    """
+    setup_logging()
+    logger = logging.getLogger(__name__)
+    tables_folder = load_config("folders.yaml").get("conversion_tables_folder")
+    output = output or (load_config("pipeline.yaml") or {}).get("enrichment_bundle")
+    if not output:
+        raise ValueError("No output given and no 'enrichment_bundle' set in configs/pipeline.yaml")
+
+    counts = EnrichmentBundle.build(tables_folder, output)
+    logger.info("Enrichment bundle written to %s: %d tables, %d rows", output, len(counts), sum(counts.values()))
+
+
+def export_changelogs(run_dir, records=None, output=None):
+    """
+    Generates the per-file `.log` and `.csv` changelogs of a run recorded in a
+    changelog store (configs/pipeline.yaml 'changelog_store: sqlite'), in the
+    run's changelogs folder unless another output is given.
+    """
+    setup_logging()
+    logger = logging.getLogger(__name__)
+    run_dir = Path(run_dir)
+    store_path = run_dir / STORE_FILENAME
+    if not store_path.is_file():
+        raise FileNotFoundError(f"No changelog store in {run_dir}")
+
+    output = Path(output) if output else run_dir / "changelogs"
+    output.mkdir(parents=True, exist_ok=True)
+    store = ChangelogStore(store_path, read_only=True)
+    try:
+        count = store.export(output, records=records)
+    finally:
+        store.close()
+    logger.info("Exported the changelogs of %d records to %s", count, output)
+
+
+def merge_changelogs(run_dir):
+    """
+    Merges the changelog shards found in a run folder (e.g. copied there from
+    other nodes) into the run's changelog store.
+    """
+    setup_logging()
+    logger = logging.getLogger(__name__)
+    run_dir = Path(run_dir)
+    shards = sorted((run_dir / SHARDS_FOLDER).glob("*.sqlite"))
+    store = ChangelogStore(run_dir / STORE_FILENAME)
+    try:
+        count = store.merge_shards(shards)
+    finally:
+        store.close()
+    logger.info("Merged %d changelog entries from %d shards into %s", count, len(shards), run_dir / STORE_FILENAME)
+
+
+def changelog_report(args):
+    """
+    Runs 'changelog stats' or 'changelog query' on a run's changelogs and writes
+    the result (CSV or JSON) to the output file or to the standard output.
+    """
+    filters = dict(records=args.records, tasks=args.tasks, actions=args.actions)
+    if args.changelog_command == "stats":
+        by = [column.strip() for column in args.by.split(",") if column.strip()]
+        rows = changelog_stats(args.run_dir, by=by, fields=args.fields, **filters)
+        columns = [*by, "changes", "records"]
+    elif args.without_field:
+        rows = records_without(args.run_dir, args.without_field, **filters)
+        columns = ["record"]
+    else:
+        rows = query_changes(args.run_dir, fields=args.fields, **filters)
+        columns = CHANGE_COLUMNS
+
+    if args.output:
+        with open(args.output, "w", newline="", encoding="utf-8") as f:
+            write_rows(rows, columns, f, fmt=args.format)
+    else:
+        sys.stdout.reconfigure(newline="")
+        try:
+            write_rows(rows, columns, sys.stdout, fmt=args.format)
+        except BrokenPipeError:
+            # output closed early (e.g. piped to 'head')
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PEF to FReSH XML pipeline")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("run", help="Run the pipeline (default)")
+    bundle_parser = commands.add_parser(
+        "build-bundle", help="Compile the ID-keyed conversion tables into the SQLite enrichment bundle"
+    )
+    bundle_parser.add_argument("--output", help="Bundle path (default: 'enrichment_bundle' in configs/pipeline.yaml)")
+
+    changelog_parser = commands.add_parser("changelog", help="Work on the changelogs of a run")
+    changelog_commands = changelog_parser.add_subparsers(dest="changelog_command", required=True)
+    export_parser = changelog_commands.add_parser(
+        "export", help="Generate the per-file .log and .csv changelogs from the run's changelog store"
+    )
+    export_parser.add_argument("run_dir", help="Run folder (files/runs/run-...)")
+    export_parser.add_argument("--record", action="append", dest="records",
+                               help="Record to export (XML file name without extension); repeatable")
+    export_parser.add_argument("--output", help="Output folder (default: the run's changelogs folder)")
+    merge_parser = changelog_commands.add_parser(
+        "merge", help="Merge the changelog shards of the workers (or nodes) into the run's changelog store"
+    )
+    merge_parser.add_argument("run_dir", help="Run folder (files/runs/run-...)")
+    for name, help_text in (
+        ("stats", "Count the changes of a run by task, action and field"),
+        ("query", "List the changes of a run, or the records without changes on a field"),
+    ):
+        report_parser = changelog_commands.add_parser(name, help=help_text)
+        report_parser.add_argument("run_dir", help="Run folder (files/runs/run-...)")
+        report_parser.add_argument("--record", action="append", dest="records",
+                                   help="Only these records (shell-style pattern); repeatable")
+        report_parser.add_argument("--task", action="append", dest="tasks",
+                                   help="Only these tasks (shell-style pattern); repeatable")
+        report_parser.add_argument("--action", action="append", dest="actions", choices=["add", "update", "delete"],
+                                   help="Only these actions; repeatable")
+        report_parser.add_argument("--field", action="append", dest="fields",
+                                   help="Only these fields (shell-style pattern, e.g. 'NationFR*'); repeatable")
+        report_parser.add_argument("--format", choices=["csv", "json"], default="csv", help="Output format")
+        report_parser.add_argument("--output", help="Output file (default: standard output)")
+    stats_parser = changelog_commands.choices["stats"]
+    stats_parser.add_argument("--by", default="task,action,field",
+                              help="Columns to group by, among record, task, action, field (default: task,action,field)")
+    changelog_commands.choices["query"].add_argument(
+        "--without-field", action="append",
+        help="List the records with no change on this field (shell-style pattern); repeatable",
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "build-bundle":
+        build_bundle(args.output)
+    elif args.command == "changelog" and args.changelog_command == "merge":
+        merge_changelogs(args.run_dir)
+    elif args.command == "changelog" and args.changelog_command in ("stats", "query"):
+        changelog_report(args)
+    elif args.command == "changelog":
+        export_changelogs(args.run_dir, records=args.records, output=args.output)
+    else:
+        run_pipeline()
 
 
 if __name__ == "__main__":
-    run_pipeline()
+    main()
@@ -1,6 +1,5 @@
 from pathlib import Path
 from lxml import etree
-import pandas as pd
 from os.path import join
 
 FRESH_NAMESPACE_URI = "urn:fresh-enrichment:v1"
@@ -45,9 +44,7 @@ def add_collection_mode_categories(xml_file: str, input_folder: str, output_fold
         # read excel mapping
         tables_folder = context.get_conversion_tables_folder()
         excel_path = join(tables_folder, 'new-collection-modes.xlsx')
-        df = pd.read_excel(excel_path, dtype=str).fillna("")
-
-        modes = df[df["PEF_ID"] == file_id]
+        modes = context.get_rows(excel_path, "PEF_ID", file_id, fillna="")
 
         if modes.empty:
             if logger:
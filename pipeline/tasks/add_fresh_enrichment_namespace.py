@@ -1,36 +1,135 @@
 from os.path import join
 import logging
-from pipeline.utils.xslt_tools import execute_xsl_transformation
+import os
+import re
+from lxml import etree
+from pipeline.utils.xslt_tools import execute_xsl_batch, execute_xsl_transformation
 from pipeline.utils.load_config import load_config
 
 logger = logging.getLogger(__name__)
 
-def add_fresh_enrichment_namespace(xml_file: str, input_folder: str, output_folder: str):
+FRESH_NAMESPACE_URI = "urn:fresh-enrichment:v1"
+ROOT_TAG = "FichePortailEpidemiologieFrance"
+
+# Implementations of the stage (configs/pipeline.yaml 'enrichment_namespace_engine'):
+# 'lxml' (native, same output) or 'xslt' (add-enrichment-namespace.xsl, the reference)
+ENGINES = ("lxml", "xslt")
+
+# The output of the stylesheet, as serialized by Saxon, starts with this declaration
+_XML_DECLARATION = b'<?xml version="1.0" encoding="UTF-8"?>'
+# Documents left to the stylesheet: namespace declarations other than the fresh
+# one (dropped or moved by xsl:element), DTDs, comments and processing
+# instructions (written as they are, see _SAXON_REFERENCES) and encodings that
+# are not ASCII-compatible
+_FRESH_DECLARATION = b'xmlns:fresh="urn:fresh-enrichment:v1"'
+_XSLT_ONLY = re.compile(rb'xmlns(?!:fresh="urn:fresh-enrichment:v1")|<!DOCTYPE|<!--|<\?(?!xml[ \t\r\n])|\x00')
+# Characters written as character references by Saxon, but not by libxml2
+_SAXON_ESCAPED = re.compile(rb"\x7f|\xc2[\x80-\x9f]|\xe2\x80\xa8")
+# Character references written differently by libxml2 and Saxon
+_SAXON_REFERENCES = ((b"&quot;", b"&#34;"), (b"&#9;", b"&#x9;"), (b"&#10;", b"&#xA;"), (b"&#13;", b"&#xD;"))
+
+
+def _xsl_file():
+    """Path of the stylesheet, in the XSLT folder of folders.yaml."""
+    config = load_config("folders.yaml")
+    return join(config.get('xslt_files_folder'), 'add-enrichment-namespace.xsl')
+
+
+def _engine(context=None):
     """
-    Applies an XSLT transformation to an XML file.
-    
+    Implementation of the stage set in pipeline.yaml ('lxml' by default), read
+    from the context's settings if any.
+    """
+    settings = context.pipeline_config if context is not None else (load_config("pipeline.yaml") or {})
+    engine = settings.get("enrichment_namespace_engine", "lxml")
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown enrichment_namespace_engine '{engine}', expected one of {ENGINES}")
+    return engine
+
+
+def enrich_namespace(data: bytes):
+    """
+    Native implementation of add-enrichment-namespace.xsl: declares the fresh
+    namespace on the root <FichePortailEpidemiologieFrance> element with lxml
+    and serializes the document as Saxon does, byte for byte.
+
+    Documents outside what it reproduces (namespace declarations other than
+    the fresh one on the root, as left by a previous run of the stage, DTDs,
+    comments and processing instructions, characters Saxon writes as
+    character references, <FichePortailEpidemiologieFrance> elements below
+    another root) are left to the stylesheet.
+
+    Args:
+        data: Content of the XML file.
+
+    Returns:
+        bytes: The transformed document, or None if the stylesheet must be applied.
+    """
+    if _XSLT_ONLY.search(data) or data.count(_FRESH_DECLARATION) > 1:
+        return None
+    root = etree.fromstring(data)
+    if _FRESH_DECLARATION in data and root.nsmap.get("fresh") != FRESH_NAMESPACE_URI:
+        # declared below the root
+        return None
+    if root.tag == ROOT_TAG:
+        enriched = etree.Element(ROOT_TAG, attrib=root.attrib, nsmap={"fresh": FRESH_NAMESPACE_URI})
+        enriched.text = root.text
+        enriched.extend(root)
+        root = enriched
+    elif root.find(f".//{ROOT_TAG}") is not None:
+        return None
+
+    body = etree.tostring(root, encoding="UTF-8")
+    if _SAXON_ESCAPED.search(body):
+        return None
+    for libxml2_reference, saxon_reference in _SAXON_REFERENCES:
+        body = body.replace(libxml2_reference, saxon_reference)
+    return _XML_DECLARATION + body
+
+
+def _transform_native(xml_file: str, input_folder: str, output_folder: str):
+    """
+    Transforms a file with enrich_namespace and writes it to the output folder.
+
+    Returns:
+        The path to the transformed output file, or None if the stylesheet must be applied.
+    """
+    with open(join(input_folder, xml_file), "rb") as f:
+        transformed_output = enrich_namespace(f.read())
+    if transformed_output is None:
+        return None
+    output_path = join(output_folder, f"{xml_file}")
+    with open(output_path, "wb") as f:
+        f.write(transformed_output)
+    return output_path
+
+
+def add_fresh_enrichment_namespace(xml_file: str, input_folder: str, output_folder: str, context=None):
+    """
+    Applies an XSLT transformation to an XML file, natively with lxml
+    (enrich_namespace) unless 'enrichment_namespace_engine' is 'xslt' in pipeline.yaml.
+
     Args:
         xml_file: The name of the XML file to transform.
         input_folder: Folder containing the XML file.
         output_folder: Folder where the transformed output will be saved.
-        xsl_file: Path to the XSL file to apply.
-    
+        context (optional): Shared context object, whose settings give the engine.
+
     Returns:
         The path to the transformed output file.
     """
     try:
         logger.info("Applying XSLT transformation to XML file: %s", xml_file)
         input_path = join(input_folder, xml_file)
-        
-        config = load_config("folders.yaml")
 
-        # Configuring API URL and key
-        input_files_folder=config.get('xslt_files_folder')
-        
-        xsl_file=join(input_files_folder,'add-enrichment-namespace.xsl')
+        if _engine(context) == "lxml":
+            output_path = _transform_native(xml_file, input_folder, output_folder)
+            if output_path is not None:
+                logger.info("Successfully wrote transformed file: %s", output_path)
+                return output_path
 
         # Execute the transformation
-        transformed_output = execute_xsl_transformation(input_path, xsl_file)
+        transformed_output = execute_xsl_transformation(input_path, _xsl_file())
 
         # Define and write to output file
         output_path = join(output_folder, f"{xml_file}")
@@ -42,4 +141,76 @@ def add_fresh_enrichment_namespace(xml_file: str, input_folder: str, output_fold
 
     except Exception as e:
         logger.error("An error occurred while transforming the file %s: %s", xml_file, e)
-        raise
\ No newline at end of file
+        raise
+
+
+def add_fresh_enrichment_namespace_batch(xml_files, input_folder: str, output_folder: str, context=None):
+    """
+    Applies the XSLT transformation to a list of XML files, with the same
+    output as add_fresh_enrichment_namespace on each file: natively with lxml,
+    then the files left to the stylesheet (or all of them, with the 'xslt'
+    engine) in one Saxon session (see execute_xsl_batch).
+
+    Args:
+        xml_files: The names of the XML files to transform.
+        input_folder: Folder containing the XML files.
+        output_folder: Folder where the transformed files will be saved.
+        context (optional): Shared context object, whose settings give the engine.
+
+    Returns:
+        The paths to the transformed output files.
+    """
+    xml_files = list(xml_files)
+    logger.info("Applying XSLT transformation to %d XML files", len(xml_files))
+    output_paths = []
+    xslt_files = xml_files
+    if _engine(context) == "lxml":
+        xslt_files = []
+        for xml_file in xml_files:
+            try:
+                output_path = _transform_native(xml_file, input_folder, output_folder)
+            except Exception as e:
+                logger.error("An error occurred while transforming the file %s: %s", xml_file, e)
+                raise
+            if output_path is None:
+                xslt_files.append(xml_file)
+            else:
+                output_paths.append(output_path)
+        if xslt_files:
+            logger.info("%d XML files left to the XSLT transformation", len(xslt_files))
+    if xslt_files:
+        output_paths.extend(execute_xsl_batch(xslt_files, input_folder, output_folder, _xsl_file()))
+    logger.info("Successfully wrote %d transformed files to %s", len(output_paths), output_folder)
+    return output_paths
+
+
+def compare_engines(input_folder: str):
+    """
+    Checks that enrich_namespace gives the same bytes as the stylesheet on
+    every XML file of a folder.
+
+    Args:
+        input_folder: Folder containing the XML files.
+
+    Returns:
+        dict: The number of files compared ('files'), of files transformed
+            natively ('native', the others are left to the stylesheet) and
+            the names of the files whose outputs differ ('different').
+    """
+    xsl_file = _xsl_file()
+    result = {"files": 0, "native": 0, "different": []}
+    for xml_file in sorted(name for name in os.listdir(input_folder) if name.endswith(".xml")):
+        input_path = join(input_folder, xml_file)
+        with open(input_path, "rb") as f:
+            native = enrich_namespace(f.read())
+        result["files"] += 1
+        if native is None:
+            continue
+        result["native"] += 1
+        if native != execute_xsl_transformation(input_path, xsl_file).encode("utf-8"):
+            result["different"].append(xml_file)
+    return result
+
+
+# The runner transforms the whole stage (or each chunk of a worker) at once
+BATCH_TASK = add_fresh_enrichment_namespace_batch
@@ -1,6 +1,5 @@
 from pathlib import Path
 from lxml import etree
-import pandas as pd
 from os.path import join
 import unicodedata
 
@@ -91,7 +90,7 @@ def add_id_to_age(
         excel_path = join(tables_folder, VOCAB_EXCEL)
 
         # Read Excel as strings and convert NaN → empty strings
-        df = pd.read_excel(excel_path, dtype=str).fillna("")
+        df = context.get_table(excel_path, dtype=str, fillna="")
 
         # Identify the unique "URI_*" vocabulary column (e.g. URI_MeSH)
         uri_columns = [c for c in df.columns if c.startswith("URI_")]
@@ -1,6 +1,5 @@
 from pathlib import Path
 from lxml import etree
-import pandas as pd
 from os.path import join
 import unicodedata
 
@@ -83,7 +82,7 @@ def add_id_to_dataaccess(
         tables_folder = context.get_vocabs_folder()
         excel_path = join(tables_folder, VOCAB_EXCEL)
 
-        df = pd.read_excel(excel_path, dtype=str).fillna("")
+        df = context.get_table(excel_path, dtype=str, fillna="")
 
         # Identify URI column
         uri_columns = [c for c in df.columns if c.startswith("URI_")]
@@ -1,6 +1,5 @@
 from pathlib import Path
 from lxml import etree
-import pandas as pd
 from os.path import join
 import unicodedata
 
@@ -53,7 +52,7 @@ def add_id_to_healthspecs(xml_file: str, input_folder: str, output_folder: str,
         tables_folder = context.get_vocabs_folder()
         excel_path = join(tables_folder, VOCAB_EXCEL)
 
-        df = pd.read_excel(excel_path, dtype=str).fillna("")
+        df = context.get_table(excel_path, dtype=str, fillna="")
 
         # Identify URI columns and map them to vocabulary names
         uri_cols = [c for c in df.columns if c.startswith("URI_")]
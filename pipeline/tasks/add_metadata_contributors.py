@@ -3,6 +3,9 @@ from lxml import etree
 import os
 from pipeline.utils.FieldTransformer import FieldTransformer
 
+# Conversion tables applied by this task, compiled at run start (see main.py)
+CONVERSION_TABLES = ("Contributeurs_arricchito_pids.xlsx",)
+
 FRESH_NAMESPACE_URI = "urn:fresh-enrichment:v1"
 
 def add_metadata_contributor(xml_file: str, input_folder: str, output_folder: str, context=None):
@@ -69,7 +72,7 @@ def add_metadata_contributor(xml_file: str, input_folder: str, output_folder: st
         file_id = xml_file.split('_')[0]
 
         tables_folder = context.get_conversion_tables_folder()
-        excel_path = os.path.join(tables_folder, 'Contributeurs_arricchito_pids.xlsx')
+        excel_path = os.path.join(tables_folder, CONVERSION_TABLES[0])
         task_name = "add_metadata_contributor"
 
         transformer = FieldTransformer(
@@ -77,6 +80,7 @@ def add_metadata_contributor(xml_file: str, input_folder: str, output_folder: st
             file_id=file_id,
             changelog=changelog,
             task_name=task_name,
+            plan=context.get_compiled_plan(excel_path),
         )
 
         updated_tree = transformer.apply_transformations(tree)
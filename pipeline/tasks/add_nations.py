@@ -1,5 +1,4 @@
 from pathlib import Path
-import pandas as pd
 from lxml import etree
 from pipeline.utils.FieldTransformer import FieldTransformer
 from os.path import join
@@ -54,10 +53,11 @@ def add_nations(xml_file: str, input_folder: str, output_folder: str, context=No
         # carica mapping da Excel
         tables_folder = context.get_conversion_tables_folder()
         excel_path = join(tables_folder, 'add-nations.xlsx')
-        df = pd.read_excel(excel_path, dtype=str).fillna("")
 
-        # filtra righe per questo file_id
-        df_filtered = df[df["ID_PEF"] == file_id]
+        # righe per questo file_id
+        df_filtered = context.get_rows(
+            excel_path, "ID_PEF", file_id, fillna="", columns=["ID_PEF", "ISO", "label_en", "label_fr"]
+        )
 
         if df_filtered.empty:
             if logger:
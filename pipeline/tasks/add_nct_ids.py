@@ -1,7 +1,6 @@
 from os.path import join
 from lxml import etree
 import logging
-import pandas as pd
 
 logger = logging.getLogger(__name__)
 
@@ -35,8 +34,8 @@ def add_nct_identifier(xml_file: str, input_folder: str, output_folder: str, con
         # Extract PEF ID from filename (first part before "_")
         id_pef = xml_file.split("_")[0]
 
-        # Load mapping from Excel
-        df = pd.read_excel(excel_path, dtype=str)
+        # Load the mapping rows of this ID from Excel
+        df = context.get_rows(excel_path, "ID_PEF", id_pef, columns=["ID_PEF", "ID_NCT"], strip=True)
         df = df.dropna(subset=["ID_PEF", "ID_NCT"])
         mapping = dict(zip(df["ID_PEF"].str.strip(), df["ID_NCT"].str.strip()))
 
@@ -2,6 +2,10 @@ from pathlib import Path
 from lxml import etree
 from pipeline.utils.FieldTransformer import FieldTransformer
 
+# Conversion tables applied by this task, compiled at run start (see main.py)
+CONVERSION_TABLES = ("pathologies.xlsx",)
+
+
 def add_pathologies(xml_file: str, input_folder: str, output_folder: str, context=None):
     """
     Applies CIM-11 codes for pathologies.
@@ -41,7 +45,7 @@ def add_pathologies(xml_file: str, input_folder: str, output_folder: str, contex
         # file_id non utilizzato in modalità general
         file_id = xml_file.split('_')[0]
 
-        excel_path = "pathologies.xlsx"
+        excel_path = CONVERSION_TABLES[0]
         task_name = "add_pathologies"
 
         transformer = FieldTransformer(
@@ -49,6 +53,7 @@ def add_pathologies(xml_file: str, input_folder: str, output_folder: str, contex
             file_id=file_id,
             changelog=changelog,
             task_name=task_name,
+            plan=context.get_compiled_plan(excel_path),
         )
 
         updated_tree = transformer.apply_transformations(tree)
@@ -2,6 +2,10 @@ from pathlib import Path
 from lxml import etree
 from pipeline.utils.FieldTransformer import FieldTransformer
 
+# Conversion tables applied by this task, compiled at run start (see main.py)
+CONVERSION_TABLES = ("rare-diseases-repartition.xlsx",)
+
+
 def add_rare_diseases(xml_file: str, input_folder: str, output_folder: str, context=None):
     """
     Applies general field replacements for biobank content in the given XML file
@@ -43,7 +47,7 @@ def add_rare_diseases(xml_file: str, input_folder: str, output_folder: str, cont
         # file_id non utilizzato in modalità general
         file_id = xml_file.split('_')[0]
 
-        excel_path = "rare-diseases-repartition.xlsx"
+        excel_path = CONVERSION_TABLES[0]
         task_name = "add_rare_diseases"
 
         transformer = FieldTransformer(
@@ -51,6 +55,7 @@ def add_rare_diseases(xml_file: str, input_folder: str, output_folder: str, cont
             file_id=file_id,
             changelog=changelog,
             task_name=task_name,
+            plan=context.get_compiled_plan(excel_path),
         )
 
         updated_tree = transformer.apply_transformations(tree)
@@ -1,7 +1,6 @@
 from os.path import join
 from lxml import etree
 import logging
-import pandas as pd
 
 logger = logging.getLogger(__name__)
 
@@ -47,8 +46,7 @@ def add_related_documents(xml_file: str, input_folder: str, output_folder: str,
         # Leggi Excel
         tables_folder = context.get_conversion_tables_folder()
         excel_file = join(tables_folder, '20251028-liste-autres-liens.xlsx')
-        df = pd.read_excel(excel_file, dtype=str).fillna("")
-        matches = df[df['ID'] == xml_id]
+        matches = context.get_rows(excel_file, "ID", xml_id, fillna="", columns=["ID", "Description", "url"])
 
         if matches.empty:
             logger.info("No matching rows in Excel for ID: %s", xml_id)
@@ -1,5 +1,4 @@
 from pathlib import Path
-import pandas as pd
 from lxml import etree
 from os.path import join
 
@@ -51,12 +50,9 @@ def add_third_party_source(xml_file: str, input_folder: str, output_folder: str,
 
         tables_folder = context.get_conversion_tables_folder()
         excel_path = join(tables_folder, 'add-third-party-source.xlsx')
-        df = pd.read_excel(excel_path, dtype=str)
-
-        df = df.fillna("")  # gestisci eventuali NaN
-        df["PEF_ID"] = df["PEF_ID"].astype(str)
-
-        match = df[df["PEF_ID"] == file_id]
+        match = context.get_rows(
+            excel_path, "PEF_ID", file_id, fillna="", columns=["PEF_ID", "ChampFReSH_fr", "ChampFReSH_en"]
+        )  # gestisci eventuali NaN
 
         # crea elemento IsDataIntegration
         is_data_integration = etree.Element(f"{{{FRESH_NAMESPACE_URI}}}IsDataIntegration", nsmap=nsmap)
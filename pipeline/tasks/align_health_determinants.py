@@ -2,6 +2,10 @@ from pathlib import Path
 from lxml import etree
 from pipeline.utils.FieldTransformer import FieldTransformer
 
+# Conversion tables applied by this task, compiled at run start (see main.py)
+CONVERSION_TABLES = ("align-health-determinants-fr-en.xlsx",)
+
+
 def align_health_determinants(xml_file: str, input_folder: str, output_folder: str, context=None):
     """
     Applies general field replacements for health determinants in the given XML file
@@ -43,7 +47,7 @@ def align_health_determinants(xml_file: str, input_folder: str, output_folder: s
         # file_id non utilizzato in modalità general
         file_id = xml_file.split('_')[0]
 
-        excel_path = "align-health-determinants-fr-en.xlsx"
+        excel_path = CONVERSION_TABLES[0]
         task_name = "align_health_determinants"
 
         transformer = FieldTransformer(
@@ -51,6 +55,7 @@ def align_health_determinants(xml_file: str, input_folder: str, output_folder: s
             file_id=file_id,
             changelog=changelog,
             task_name=task_name,
+            plan=context.get_compiled_plan(excel_path),
         )
 
         updated_tree = transformer.apply_transformations(tree)
@@ -2,6 +2,10 @@ from pathlib import Path
 from lxml import etree
 from pipeline.utils.FieldTransformer import FieldTransformer
 
+# Conversion tables applied by this task, compiled at run start (see main.py)
+CONVERSION_TABLES = ("align-sex.xlsx",)
+
+
 def align_sex(xml_file: str, input_folder: str, output_folder: str, context=None):
     """
     Applies general field replacements for sex alignment in the given XML file
@@ -42,7 +46,7 @@ def align_sex(xml_file: str, input_folder: str, output_folder: str, context=None
         # file_id non utilizzato in modalità general
         file_id = xml_file.split('_')[0]
 
-        excel_path = "align-sex.xlsx"
+        excel_path = CONVERSION_TABLES[0]
         task_name = "align_sex"
 
         transformer = FieldTransformer(
@@ -50,6 +54,7 @@ def align_sex(xml_file: str, input_folder: str, output_folder: str, context=None
             file_id=file_id,
             changelog=changelog,
             task_name=task_name,
+            plan=context.get_compiled_plan(excel_path),
         )
 
         updated_tree = transformer.apply_transformations(tree)
@@ -2,6 +2,10 @@ from pathlib import Path
 from lxml import etree
 from pipeline.utils.FieldTransformer import FieldTransformer
 
+# Conversion tables applied by this task, compiled at run start (see main.py)
+CONVERSION_TABLES = ("dispatch-data-access-fr-en.xlsx",)
+
+
 def dispatch_data_access(xml_file: str, input_folder: str, output_folder: str, context=None):
     """
     Applies field-level transformations to the given XML file using an Excel mapping
@@ -40,13 +44,14 @@ def dispatch_data_access(xml_file: str, input_folder: str, output_folder: str, c
             return
 
         # Path to Excel file (assumed to be in working directory)
-        excel_path = "dispatch-data-access-fr-en.xlsx"
+        excel_path = CONVERSION_TABLES[0]
 
         transformer = FieldTransformer(
             excel_path=excel_path,
             file_id=file_id,
             changelog=changelog,
-            task_name=task_name
+            task_name=task_name,
+            plan=context.get_compiled_plan(excel_path),
         )
 
         updated_tree = transformer.apply_transformations(tree)
@@ -1,4 +1,3 @@
-import pandas as pd
 from os import listdir
 from os.path import isfile, join
 from pipeline.utils.PipelineContext import PipelineContext
@@ -26,7 +25,7 @@ def get_xml_files(folder: str, context: PipelineContext):
 
         # Read the Excel file with the list of IDs to exclude
         exclusion_path = join("public", "utility-files", "id-fiches-exclus-fresh.xlsx")
-        df = pd.read_excel(exclusion_path)
+        df = context.get_table(exclusion_path, columns=["ID"])
 
         # Extract the list of IDs to exclude (as strings, to match filename format)
         excluded_ids = set(df['ID'].astype(str))
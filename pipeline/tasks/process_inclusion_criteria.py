@@ -2,6 +2,8 @@ from pathlib import Path
 from lxml import etree
 from pipeline.utils.FieldTransformer import FieldTransformer
 
+# Conversion tables applied by this task, compiled at run start (see main.py)
+CONVERSION_TABLES = ("new-clusion.xlsx",)
 
 
 def process_inclusion_criteria(xml_file: str, input_folder: str, output_folder: str, context=None):
@@ -42,9 +44,9 @@ def process_inclusion_criteria(xml_file: str, input_folder: str, output_folder:
             return
 
         # Path to Excel file (assumed to be in working directory)
-        excel_path = "new-clusion.xlsx"
+        excel_path = CONVERSION_TABLES[0]
 
-        transformer = FieldTransformer(excel_path=excel_path, file_id=file_id, changelog=changelog, task_name=task_name)
+        transformer = FieldTransformer(excel_path=excel_path, file_id=file_id, changelog=changelog, task_name=task_name, plan=context.get_compiled_plan(excel_path))
         updated_tree = transformer.apply_transformations(tree)
 
         output_path.parent.mkdir(parents=True, exist_ok=True)
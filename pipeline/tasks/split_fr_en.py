@@ -1,52 +1,185 @@
 from os.path import join
 import os
 import logging
+import re
+from lxml import etree
 from pipeline.utils.xslt_tools import execute_xsl_transformation
 from pipeline.utils.load_config import load_config
 
 logger = logging.getLogger(__name__)
 
-def split_fr_en(xml_file: str, input_folder: str, output_folder: str):
+# Implementations of the split (configs/pipeline.yaml 'split_fr_en_engine'):
+# 'lxml' (single pass, same output) or 'xslt' (split-fr.xsl and split-en.xsl, the reference)
+ENGINES = ("lxml", "xslt")
+LANGUAGES = ("FR", "EN")
+
+# Start of the documents, as serialized by Saxon from split-fr.xsl and split-en.xsl
+_DOCUMENT_START = '<?xml version="1.0" encoding="UTF-8"?><Root>'
+# Characters escaped by Saxon in text nodes
+_NEEDS_ESCAPE = re.compile("[&<>\r\u2028\x7f-\x9f]")
+_TEXT_ESCAPES = str.maketrans({
+    "&": "&amp;", "<": "&lt;", ">": "&gt;", "\r": "&#xD;", "\u2028": "&#x2028;",
+    **{chr(code): f"&#x{code:x};" for code in range(0x7f, 0xa0)},
+})
+
+
+def _engine(context=None):
+    """
+    Implementation of the split set in pipeline.yaml ('lxml' by default), read
+    from the context's settings if any.
+    """
+    settings = context.pipeline_config if context is not None else (load_config("pipeline.yaml") or {})
+    engine = settings.get("split_fr_en_engine", "lxml")
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown split_fr_en_engine '{engine}', expected one of {ENGINES}")
+    return engine
+
+
+def _write_element(node, documents, languages, namespace):
+    """
+    Writes an element and its content to the documents, as the split
+    stylesheets do: in the document of its language without the suffix
+    ('TitreFR' -> 'Titre', out of any namespace), not at all in the document
+    of the other language, and otherwise with the same name and namespace.
+    Attributes are not written.
+
+    Args:
+        node: Element of the bilingual document.
+        documents: Parts of each document the parent element is written to.
+        languages: Language of each of these documents.
+        namespace: Default namespace in scope in these documents.
     """
-    Splits a bilingual XML file into two monolingual versions (French and English),
-    using separate XSL transformations, and writes them into 'fr/' and 'en/' subfolders.
+    tag = node.tag
+    if tag[0] == "{":
+        element_namespace, name = tag[1:].split("}", 1)
+    else:
+        element_namespace, name = "", tag
+    if name.endswith(LANGUAGES):
+        language = name[-2:]
+        if language not in languages:
+            return
+        if len(languages) > 1:
+            documents = [documents[languages.index(language)]]
+            languages = (language,)
+        name, element_namespace = name[:-2], ""
+        if not name:
+            raise ValueError(f"Element <{tag}> has no name once its language suffix is removed")
+
+    if element_namespace == namespace:
+        start = f"<{name}>"
+    else:
+        start = f'<{name} xmlns="{element_namespace}">'
+    marks = []
+    for parts in documents:
+        parts.append(start)
+        marks.append(len(parts))
+
+    text = node.text
+    if text:
+        if _NEEDS_ESCAPE.search(text):
+            text = text.translate(_TEXT_ESCAPES)
+        for parts in documents:
+            parts.append(text)
+    for child in node:
+        if child.tag.__class__ is str:
+            _write_element(child, documents, languages, element_namespace)
+        else:
+            if child.tag is etree.Comment:
+                markup = f"<!--{child.text or ''}-->"
+            elif child.text:
+                markup = f"<?{child.target} {child.text}?>"
+            else:
+                markup = f"<?{child.target}?>"
+            for parts in documents:
+                parts.append(markup)
+        tail = child.tail
+        if tail:
+            if _NEEDS_ESCAPE.search(tail):
+                tail = tail.translate(_TEXT_ESCAPES)
+            for parts in documents:
+                parts.append(tail)
+
+    end = f"</{name}>"
+    for parts, mark in zip(documents, marks):
+        if len(parts) == mark:
+            # nothing written since the start tag
+            parts[-1] = start[:-1] + "/>"
+        else:
+            parts.append(end)
+
+
+def split_document(data: bytes):
+    """
+    Splits a bilingual document into its French and English documents in a
+    single pass: the document is parsed once and each element is written to
+    both documents at the same time. The output is the same as split-fr.xsl
+    and split-en.xsl, byte for byte.
+
+    Args:
+        data: Content of the bilingual XML file.
+
+    Returns:
+        Tuple[str, str]: The French and English documents.
+    """
+    root = etree.fromstring(data)
+    documents = [[_DOCUMENT_START] for _ in LANGUAGES]
+    _write_element(root, documents, LANGUAGES, "")
+
+    results = []
+    for parts in documents:
+        if len(parts) == 1:
+            parts[0] = parts[0][:-1] + "/>"
+        else:
+            parts.append("</Root>")
+        results.append("".join(parts))
+    return tuple(results)
+
+
+def _output_files(xml_file: str, output_folder: str):
+    """Paths of the French and English outputs, in the 'fr/' and 'en/' subfolders."""
+    #id_value = xml_file.split('_')[0]
+    id_value = xml_file
+    return join(output_folder, "fr", f"{id_value}-fr.xml"), join(output_folder, "en", f"{id_value}-en.xml")
+
+
+def split_fr_en(xml_file: str, input_folder: str, output_folder: str, context=None):
+    """
+    Splits a bilingual XML file into two monolingual versions (French and English)
+    and writes them into 'fr/' and 'en/' subfolders: in a single pass
+    (split_document), unless 'split_fr_en_engine' is 'xslt' in pipeline.yaml,
+    which applies the separate XSL transformations.
 
     Args:
         xml_file (str): The name of the XML file to transform.
         input_folder (str): Directory containing the input XML.
         output_folder (str): Base output directory. Two subfolders 'fr/' and 'en/' will be created here.
+        context (optional): Shared context object, whose settings give the engine.
 
     Returns:
         Tuple[str, str]: Paths to the French and English output XML files.
     """
     try:
-        logger.info("Applying XSLT transformation to XML file: %s", xml_file)
+        logger.info("Splitting XML file into French and English: %s", xml_file)
         input_path = join(input_folder, xml_file)
 
-        config = load_config("folders.yaml")
-        xslt_files_folder = config.get('xslt_files_folder')
+        # Create fr/ and en/ output subfolders if they don't exist
+        fr_output_file, en_output_file = _output_files(xml_file, output_folder)
+        os.makedirs(os.path.dirname(fr_output_file), exist_ok=True)
+        os.makedirs(os.path.dirname(en_output_file), exist_ok=True)
 
-        #id_value = xml_file.split('_')[0]
-        id_value = xml_file
+        if _engine(context) == "lxml":
+            with open(input_path, "rb") as f:
+                fr_result, en_result = split_document(f.read())
+        else:
+            xslt_files_folder = load_config("folders.yaml").get('xslt_files_folder')
+            # Francese
+            fr_result = execute_xsl_transformation(input_path, join(xslt_files_folder, 'split-fr.xsl'))
+            # Inglese
+            en_result = execute_xsl_transformation(input_path, join(xslt_files_folder, 'split-en.xsl'))
 
-        # Create fr/ and en/ output subfolders if they don't exist
-        fr_folder = join(output_folder, "fr")
-        en_folder = join(output_folder, "en")
-        os.makedirs(fr_folder, exist_ok=True)
-        os.makedirs(en_folder, exist_ok=True)
-
-        # Francese
-        fr_xsl_file = join(xslt_files_folder, 'split-fr.xsl')
-        fr_result = execute_xsl_transformation(input_path, fr_xsl_file)
-        fr_output_file = join(fr_folder, f"{id_value}-fr.xml")
         with open(fr_output_file, "w", encoding="utf-8") as f:
             f.write(fr_result)
         logger.info("Successfully wrote French output to: %s", fr_output_file)
-
-        # Inglese
-        en_xsl_file = join(xslt_files_folder, 'split-en.xsl')
-        en_result = execute_xsl_transformation(input_path, en_xsl_file)
-        en_output_file = join(en_folder, f"{id_value}-en.xml")
         with open(en_output_file, "w", encoding="utf-8") as f:
             f.write(en_result)
         logger.info("Successfully wrote English output to: %s", en_output_file)
@@ -55,4 +188,42 @@ def split_fr_en(xml_file: str, input_folder: str, output_folder: str):
 
     except Exception as e:
         logger.error("An error occurred while transforming the file %s: %s", xml_file, e)
-        raise
\ No newline at end of file
+        raise
+
+
+def compare_engines(input_folder: str):
+    """
+    Checks that split_document gives the same documents as split-fr.xsl and
+    split-en.xsl on every XML file of a folder, or fails on the same files.
+
+    Args:
+        input_folder: Folder containing the XML files.
+
+    Returns:
+        dict: The number of files compared ('files'), of files split
+            natively ('native', all of them) and the names of the files whose
+            French or English outputs differ ('different').
+    """
+    xslt_files_folder = load_config("folders.yaml").get('xslt_files_folder')
+    result = {"files": 0, "native": 0, "different": []}
+    for xml_file in sorted(name for name in os.listdir(input_folder) if name.endswith(".xml")):
+        input_path = join(input_folder, xml_file)
+        with open(input_path, "rb") as f:
+            data = f.read()
+        try:
+            documents = split_document(data)
+        except Exception:
+            documents = None
+        references = []
+        for language in LANGUAGES:
+            xsl_file = join(xslt_files_folder, f"split-{language.lower()}.xsl")
+            try:
+                references.append(execute_xsl_transformation(input_path, xsl_file))
+            except Exception:
+                references.append(None)
+        result["files"] += 1
+        result["native"] += 1
+        # a record the stylesheets cannot split must not be split natively either
+        if documents != (None if None in references else tuple(references)):
+            result["different"].append(xml_file)
+    return result
@@ -1,10 +1,15 @@
 from os.path import join
 from lxml import etree
-import pandas as pd
 
 ELEMENTS_TO_REMOVE = ["ResponsableScientifique", "ContactSupplementaire"] 
 FRESH_NAMESPACE_URI = "urn:fresh-enrichment:v1"
 
+# Colonne dell'Excel usate dal task (le altre non vengono lette)
+CONTACT_COLUMNS = [
+    "ID Fiche", "Role", "Prénom", "Nom", "Mail", "OrcidFinal", "IdRefFinal",
+    "RNSR", "ROR", "SIREN_DEF", "OrganismeNorm", "LaboratoireNorm",
+]
+
 def _clean_value(val: str) -> str:
     """
     Normalizza i valori provenienti dall'Excel:
@@ -65,9 +70,8 @@ def update_contacts(xml_file: str, input_folder: str, output_folder: str, contex
         excel_path = join(tables_folder, 'Contacts_arricchito_pids.xlsx')
 
         # --- STEP 2: load Excel and filter rows ---
-        df = pd.read_excel(excel_path, dtype=str).fillna("")
         file_id = xml_file.split("_")[0]  # prima parte del nome file
-        df_file = df[df["ID Fiche"].astype(str) == file_id]
+        df_file = context.get_rows(excel_path, "ID Fiche", file_id, fillna="", columns=CONTACT_COLUMNS)
 
         if logger:
             logger.info("Found %d contacts in Excel for file_id=%s", len(df_file), file_id)
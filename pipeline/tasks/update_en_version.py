@@ -2,6 +2,10 @@ from pathlib import Path
 from lxml import etree
 from pipeline.utils.FieldTransformer import FieldTransformer
 
+# Conversion tables applied by this task, compiled at run start (see main.py)
+CONVERSION_TABLES = ("update_en_version.xlsx",)
+
+
 def update_en_version(xml_file: str, input_folder: str, output_folder: str, context=None):
     """
     Applies general field replacements to the given XML file using an Excel mapping
@@ -41,13 +45,14 @@ def update_en_version(xml_file: str, input_folder: str, output_folder: str, cont
         # Extract file_id anyway but it won't be used in general mode
         file_id = xml_file.split('_')[0]
 
-        excel_path = "update_en_version.xlsx"
+        excel_path = CONVERSION_TABLES[0]
 
         transformer = FieldTransformer(
             excel_path=excel_path,
             file_id=file_id,        # passed but ignored in 'general' mode
             changelog=changelog,
             task_name=task_name,
+            plan=context.get_compiled_plan(excel_path),
         )
 
         updated_tree = transformer.apply_transformations(tree)
@@ -1,6 +1,5 @@
 from pathlib import Path
 from lxml import etree
-import pandas as pd
 from os.path import join
 
 FRESH_NAMESPACE_URI = "urn:fresh-enrichment:v1"
@@ -45,9 +44,7 @@ def update_fundings(xml_file: str, input_folder: str, output_folder: str, contex
 
         tables_folder = context.get_conversion_tables_folder()
         excel_path = join(tables_folder, 'OK-Financeurs.xlsx')
-        df = pd.read_excel(excel_path, dtype=str).fillna("")
-
-        sponsors = df[df["ID"] == file_id]
+        sponsors = context.get_rows(excel_path, "ID", file_id, fillna="")
 
         if sponsors.empty:
             if logger:
@@ -1,6 +1,9 @@
 from pathlib import Path
 from lxml import etree
-from pipeline.utils.FieldTransformer import FieldTransformer
+
+# Conversion tables applied by this task, compiled at run start (see main.py)
+CONVERSION_TABLES = ("population-types-regles-migration.xlsx", "population-types-repartition.xlsx")
+
 
 def update_population_types(xml_file: str, input_folder: str, output_folder: str, context=None):
     """
@@ -47,32 +50,13 @@ def update_population_types(xml_file: str, input_folder: str, output_folder: str
         # file_id is unused in 'general' mode, but still provided for compatibility
         file_id = xml_file.split('_')[0]
 
-        migration_rules_excel_path = "population-types-regles-migration.xlsx"
-        
-        task_name = "update_population_types"
+        migration_rules_excel_path, repartition_file = CONVERSION_TABLES
 
-        # Apply transformations using FieldTransformer
-        transformer = FieldTransformer(
-            excel_path=migration_rules_excel_path,
-            file_id=file_id,
-            changelog=changelog,
-            task_name=task_name,
-        )
+        task_name = "update_population_types"
 
-        updated_tree = transformer.apply_transformations(tree)
-        
-        
-        
-        repartition_file="population-types-repartition.xlsx"
-        # Apply transformations using FieldTransformer
-        transformer = FieldTransformer(
-            excel_path=repartition_file,
-            file_id=file_id,
-            changelog=changelog,
-            task_name=task_name,
-        )
-
-        updated_tree = transformer.apply_transformations(updated_tree)
+        # Apply all conversion tables in order, fused into a single pass over the tree
+        plan = context.get_fused_plan(migration_rules_excel_path, repartition_file)
+        updated_tree = plan.apply(tree, file_id, task_name, changelog)
         
 
         # Save the updated XML
@@ -2,6 +2,13 @@ from pathlib import Path
 from lxml import etree
 from pipeline.utils.FieldTransformer import FieldTransformer
 
+# Conversion tables applied by this task, compiled at run start (see main.py)
+CONVERSION_TABLES = (
+    "study-categories-regles-migration.xlsx",
+    "study-categories-add-registers.xlsx",
+)
+
+
 def update_study_categories(xml_file: str, input_folder: str, output_folder: str, context=None):
     """
     Aligns study categories values in the given XML file by applying general field
@@ -47,31 +54,13 @@ def update_study_categories(xml_file: str, input_folder: str, output_folder: str
         # file_id is unused in 'general' mode, but still provided for compatibility
         file_id = xml_file.split('_')[0]
 
-        migration_rules_excel_path = "study-categories-regles-migration.xlsx"
-        
-        task_name = "update_study_categories"
+        migration_rules_excel_path, repartition_file = CONVERSION_TABLES
 
-        # Apply transformations using FieldTransformer
-        transformer = FieldTransformer(
-            excel_path=migration_rules_excel_path,
-            file_id=file_id,
-            changelog=changelog,
-            task_name=task_name,
-        )
-
-        updated_tree = transformer.apply_transformations(tree)
-        
-        
-        repartition_file="study-categories-add-registers.xlsx"
-        # Apply transformations using FieldTransformer
-        transformer = FieldTransformer(
-            excel_path=repartition_file,
-            file_id=file_id,
-            changelog=changelog,
-            task_name=task_name,
-        )
+        task_name = "update_study_categories"
 
-        updated_tree = transformer.apply_transformations(updated_tree)
+        # Apply all conversion tables in order, fused into a single pass over the tree
+        plan = context.get_fused_plan(migration_rules_excel_path, repartition_file)
+        updated_tree = plan.apply(tree, file_id, task_name, changelog)
         """
         delete_file="recruitment-sources-delete.xlsx"
         # Apply transformations using FieldTransformer
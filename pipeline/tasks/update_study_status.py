@@ -1,6 +1,5 @@
 from pathlib import Path
 from lxml import etree
-import pandas as pd
 from os.path import join
 
 
@@ -45,9 +44,7 @@ def update_study_status(xml_file: str, input_folder: str, output_folder: str, co
         # read Excel mapping
         tables_folder = context.get_conversion_tables_folder()
         excel_path = join(tables_folder, "study-status.xlsx")
-        df = pd.read_excel(excel_path, dtype=str).fillna("")
-
-        status_row = df[df["PEF_ID"] == file_id]
+        status_row = context.get_rows(excel_path, "PEF_ID", file_id, fillna="")
 
         if status_row.empty:
             fr_value = "Inconnu"
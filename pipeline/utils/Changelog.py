@@ -2,7 +2,34 @@ from pathlib import Path
 from datetime import datetime
 import csv
 import difflib
+import io
 import re
+import threading
+
+# Changelog verbosities: every change, the number of changes per field, or nothing
+VERBOSITIES = ("full", "summary", "off")
+
+# Wording of the actions in the `.log` file
+_ACTION_WORDS = {"add": "ADDED", "update": "UPDATED", "delete": "DELETED"}
+
+# CSV formatter of each thread (a csv.writer keeps a sizeable buffer, so it is not created per record)
+_csv_local = threading.local()
+
+
+def _csv_line(row: list) -> str:
+    """
+    Formats a row as a line of CSV, as csv.writer writes it.
+    """
+    formatter = getattr(_csv_local, "formatter", None)
+    if formatter is None:
+        buffer = io.StringIO(newline="")
+        formatter = _csv_local.formatter = (buffer, csv.writer(buffer))
+    buffer, writer = formatter
+    writer.writerow(row)
+    line = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return line
 
 
 class Changelog:
@@ -12,27 +39,66 @@ class Changelog:
     Each change is logged in two formats:
     - A human-readable `.log` file (one per input file), for review and debugging.
     - A structured `.csv` file (one per input file), for downstream analysis or reporting.
+
+    With a ChangelogWriter, lines are queued and written by its background
+    thread; otherwise each line is appended to its file directly.
+    With a ChangelogStore, the changes are recorded in the run-wide store
+    instead, and the two files are generated from it on demand (see replay).
+
+    The verbosity (set by the PipelineContext for each task) controls what is
+    recorded: every change ("full"), only the number of changes per task,
+    action and field ("summary", recorded by flush_summary as "summary"
+    entries), or nothing ("off").
     """
 
-    def __init__(self, xml_file: str, log_dir: Path):
+    def __init__(self, xml_file: str, log_dir: Path, writer=None, store=None):
         """
         Initializes the Changelog instance for a specific XML file.
 
         Args:
             xml_file (str): Path to the XML file being tracked.
             log_dir (Path): Directory where log and CSV files will be written.
+            writer (ChangelogWriter, optional): Background writer of the run's changelogs.
+            store (ChangelogStore, optional): Run-wide store recording the changes
+                instead of the two files.
         """
         self.file_stem = Path(xml_file).stem  # Get file name without extension
         self.log_path = log_dir / f"{self.file_stem}.log"
         self.csv_path = log_dir / f"{self.file_stem}.csv"
+        self.writer = writer
+        self.store = store
+        self.verbosity = "full"
+        # (task, action, field) -> number of changes, for the "summary" verbosity
+        self._summary = {}
+
+        if store is not None:
+            store.add_record(self.file_stem)
+            return
 
         log_dir.mkdir(parents=True, exist_ok=True)
 
         # Initialize CSV file with header, if not already present
         if not self.csv_path.exists():
-            with open(self.csv_path, "w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow(["timestamp", "task", "action", "field", "old_value", "new_value"])
+            self._append_csv(["timestamp", "task", "action", "field", "old_value", "new_value"])
+
+    def _append(self, path: Path, text, newline=None):
+        """
+        Appends text (or the text rendered by a function) to one of the changelog
+        files, through the writer if any.
+        """
+        if self.writer is not None:
+            self.writer.write(path, text, newline=newline)
+        else:
+            if callable(text):
+                text = text()
+            with open(path, "a", newline=newline, encoding="utf-8") as f:
+                f.write(text)
+
+    def _append_csv(self, row: list):
+        """
+        Appends a row to the CSV file, formatted by csv.writer.
+        """
+        self._append(self.csv_path, _csv_line(row), newline="")
 
     def _timestamp(self) -> str:
         """
@@ -40,32 +106,36 @@ class Changelog:
         """
         return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-    def _write_log_line(self, message: str):
+    def _write_log_line(self, message, timestamp: str = None):
         """
         Appends a line to the text-based log file.
 
         Args:
-            message (str): Message to write to the log file.
+            message (str | Callable[[], str]): Message to write to the log file, or
+                a function rendering it, called only when the line is written.
+            timestamp (str, optional): Time of the change. Defaults to now.
         """
-        timestamp = self._timestamp()
-        with open(self.log_path, "a", encoding="utf-8") as f:
-            f.write(f"{timestamp} - {message}\n")
+        timestamp = timestamp or self._timestamp()
+        if callable(message):
+            self._append(self.log_path, lambda: f"{timestamp} - {message()}\n")
+        else:
+            self._append(self.log_path, f"{timestamp} - {message}\n")
 
-    def _write_csv_row(self, task: str, action: str, field: str, old: str = "", new: str = ""):
+    def _write_csv_row(self, task: str, action: str, field: str, old: str = "", new: str = "",
+                       timestamp: str = None):
         """
         Appends a row to the CSV log.
 
         Args:
             task (str): Name of the task or transformation.
-            action (str): One of "add", "update", or "delete".
+            action (str): One of "add", "update", "delete" or "summary".
             field (str): Name of the field being modified.
             old (str): Previous value (if any).
             new (str): New value (if any).
+            timestamp (str, optional): Time of the change. Defaults to now.
         """
-        timestamp = self._timestamp()
-        with open(self.csv_path, "a", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow([timestamp, task, action, field, old, new])
+        timestamp = timestamp or self._timestamp()
+        self._append_csv([timestamp, task, action, field, old, new])
 
     def start_task(self, task_name: str):
         """
@@ -74,8 +144,10 @@ class Changelog:
         Args:
             task_name (str): Identifier for the current task (e.g., a transformation step).
         """
-        with open(self.log_path, "a", encoding="utf-8") as f:
-            f.write(f"\n==> Task: {task_name}\n")
+        if self.store is not None:
+            self.store.add(self.file_stem, self._timestamp(), task_name, "task")
+        else:
+            self._append(self.log_path, f"\n==> Task: {task_name}\n")
 
     def _normalize_line(self, line: str) -> str:
         """
@@ -107,6 +179,12 @@ class Changelog:
         old_norm = [self._normalize_line(l) for l in old_lines]
         new_norm = [self._normalize_line(l) for l in new_lines]
 
+        # same result as ndiff without running it: unchanged text, or at most one line on each side
+        if old_norm == new_norm:
+            return '\n'.join(f"  {l}" for l in old_lines)
+        if len(old_lines) <= 1 and len(new_lines) <= 1:
+            return '\n'.join([f"- {l}" for l in old_lines] + [f"+ {l}" for l in new_lines])
+
         diff = difflib.ndiff(old_norm, new_norm)
 
         result = []
@@ -135,9 +213,7 @@ class Changelog:
             field (str): Name of the added field.
             new_value (str): Value of the new field.
         """
-        diff = f"+ {new_value}"
-        self._write_log_line(f"[{task}] Field '{field}' ADDED:\n{diff}")
-        self._write_csv_row(task, "add", field, "", new_value)
+        self._log(task, "add", field, "", new_value)
 
     def log_update(self, task: str, field: str, old_value: str, new_value: str):
         """
@@ -149,9 +225,7 @@ class Changelog:
             old_value (str): Previous value.
             new_value (str): New value.
         """
-        diff = self._get_diff_by_line(old_value, new_value)
-        self._write_log_line(f"[{task}] Field '{field}' UPDATED:\n{diff}")
-        self._write_csv_row(task, "update", field, old_value, new_value)
+        self._log(task, "update", field, old_value, new_value)
 
     def log_delete(self, task: str, field: str, old_value: str = ""):
         """
@@ -162,9 +236,75 @@ class Changelog:
             field (str): Name of the deleted field.
             old_value (str, optional): Previous value of the field. Defaults to "".
         """
-        msg = f"[{task}] Field '{field}' DELETED"
-        if old_value:
-            diff = f"- {old_value}"
-            msg += f":\n{diff}"
-        self._write_log_line(msg)
-        self._write_csv_row(task, "delete", field, old_value, "")
+        self._log(task, "delete", field, old_value, "")
+
+    def _log(self, task: str, action: str, field: str, old_value, new_value):
+        """
+        Records a change, in the store if any, otherwise in the two files;
+        only counts it with the "summary" verbosity.
+        """
+        if self.verbosity != "full":
+            if self.verbosity == "summary":
+                key = (task, action, field)
+                self._summary[key] = self._summary.get(key, 0) + 1
+            return
+        timestamp = self._timestamp()
+        if self.store is not None:
+            self.store.add(self.file_stem, timestamp, task, action, field, old_value, new_value)
+        else:
+            self._write_change(timestamp, task, action, field, old_value, new_value)
+
+    def flush_summary(self):
+        """
+        Records the changes counted with the "summary" verbosity, one "summary"
+        entry per task, action and field (the action in old_value, the number
+        of changes in new_value). Called at the end of each task.
+        """
+        summary, self._summary = self._summary, {}
+        for (task, action, field), count in summary.items():
+            timestamp = self._timestamp()
+            if self.store is not None:
+                self.store.add(self.file_stem, timestamp, task, "summary", field, action, count)
+            else:
+                self._write_change(timestamp, task, "summary", field, action, count)
+
+    def _write_change(self, timestamp: str, task: str, action: str, field: str, old_value, new_value):
+        """
+        Writes a change to the `.log` file (with its diff) and the `.csv` file.
+        """
+        if action == "summary":
+            message = f"[{task}] Field '{field}' {_ACTION_WORDS.get(old_value, old_value)} {new_value} time(s)"
+        elif action == "add":
+            message = f"[{task}] Field '{field}' ADDED:\n+ {new_value}"
+        elif action == "update" and not (isinstance(old_value, str) and isinstance(new_value, str)):
+            # fails here, in the task, as before
+            message = f"[{task}] Field '{field}' UPDATED:\n{self._get_diff_by_line(old_value, new_value)}"
+        elif action == "update":
+            # the diff is rendered when the line is written (by the writer thread, if any)
+            header = f"[{task}] Field '{field}' UPDATED:\n"
+            message = lambda: header + self._get_diff_by_line(old_value, new_value)
+        else:
+            message = f"[{task}] Field '{field}' DELETED"
+            if old_value:
+                message += f":\n- {old_value}"
+        self._write_log_line(message, timestamp)
+        self._write_csv_row(task, action, field, old_value, new_value, timestamp)
+
+    def replay(self, timestamp: str, task: str, action: str, field: str = "", old_value="", new_value=""):
+        """
+        Writes a change recorded in a ChangelogStore to the two files, as it
+        would have been written during the run.
+
+        Args:
+            timestamp (str): Time of the change.
+            task (str): Task name.
+            action (str): "task" (start of a task block), "add", "update", "delete"
+                or "summary" (number of changes, see flush_summary).
+            field (str): Name of the field.
+            old_value: Previous value.
+            new_value: New value.
+        """
+        if action == "task":
+            self._append(self.log_path, f"\n==> Task: {task}\n")
+        else:
+            self._write_change(timestamp, task, action, field, old_value, new_value)
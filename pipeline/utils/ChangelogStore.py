@@ -0,0 +1,285 @@
+import atexit
+import heapq
+import itertools
+import os
+import socket
+import sqlite3
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from pipeline.utils.Changelog import Changelog
+from pipeline.utils.ChangelogWriter import ChangelogWriter
+
+# Name of the store in the run folder
+STORE_FILENAME = "changelog.sqlite"
+
+# Subfolder of the run folder holding the shards written by the worker processes
+SHARDS_FOLDER = "changelog-shards"
+
+# Changes buffered in memory before they are inserted
+MAX_BUFFERED_CHANGES = 10000
+
+# Kinds of entries: the start of a task block, the three kinds of changes, and
+# the number of changes of a kind recorded instead of them (see Changelog.flush_summary)
+ACTIONS = ("task", "add", "update", "delete", "summary")
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS records (
+    record TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    epoch INTEGER NOT NULL,
+    record TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    task TEXT NOT NULL,
+    action TEXT NOT NULL CHECK (action IN ({", ".join(repr(a) for a in ACTIONS)})),
+    field TEXT,
+    old_value,
+    new_value
+);
+CREATE INDEX IF NOT EXISTS changes_record ON changes (record, epoch, seq);
+CREATE INDEX IF NOT EXISTS changes_task ON changes (task);
+CREATE INDEX IF NOT EXISTS changes_field ON changes (field);
+"""
+
+
+def _value(value):
+    """
+    Stored form of a logged value: text and numbers are kept as they are
+    (None included), anything else as its text, the way the CSV file writes it.
+    """
+    if value is None or isinstance(value, (str, float)) or (isinstance(value, int) and not isinstance(value, bool)):
+        return value
+    return str(value)
+
+
+class ChangelogStore:
+    """
+    Run-wide changelog store: the changes of every record in a single SQLite
+    file, instead of a `.log` and a `.csv` file per record.
+
+    Each change is a typed row (record, timestamp, task, action, field, old and
+    new value) numbered by 'seq', in the order the changes were made, and
+    tagged with the 'epoch' it was made in (the index of the task in the run),
+    with indexes on record, task and field. Records are registered as soon as their
+    changelog is created, so that records without changes are kept too. The
+    per-record `.log` and `.csv` files are generated on demand by export(),
+    identical to the ones written during a run without the store.
+
+    Changes are buffered in memory and inserted by flush() (at the end of each
+    task, and of each chunk in the worker processes, or once MAX_BUFFERED_CHANGES
+    are buffered) and close().
+
+    Worker processes do not share the run's store: each one writes its own
+    shard (a store of the same layout in the SHARDS_FOLDER of the run folder,
+    see shard_path), with no contention between them. merge_shards() then
+    adds the changes of every shard to the run's store with a streaming
+    k-way merge on (record, epoch, seq): each record is handled by a single
+    worker per task, so this is the order a serial run would have recorded.
+    """
+
+    def __init__(self, path, wal: bool = True, read_only: bool = False):
+        """
+        Opens the store, creating it if needed.
+
+        Args:
+            path: Path of the SQLite file.
+            wal (bool): Use SQLite's write-ahead log, so that the store can be
+                read while it is written (shards, written by a single process, do not).
+            read_only (bool): Open an existing store for reading only (e.g. to
+                export or analyse the changelogs of a run): nothing is created
+                or written, not even the schema or the journal mode.
+
+        Raises:
+            FileNotFoundError: If the store is opened read-only and does not exist.
+        """
+        self.path = Path(path)
+        self.read_only = read_only
+        if read_only:
+            if not self.path.is_file():
+                raise FileNotFoundError(f"No changelog store at {self.path}")
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.wal = wal
+        # index of the current task in the run (set by PipelineContext.start_task)
+        self.epoch = 0
+        self._connection = self._connect()
+        self._pid = os.getpid()
+        self._records: List[Tuple[str]] = []
+        self._changes: List[tuple] = []
+        self._closed = False
+        if not read_only:
+            atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.read_only:
+            return sqlite3.connect(
+                f"{self.path.resolve().as_uri()}?mode=ro", uri=True, timeout=60, check_same_thread=False
+            )
+        connection = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+        connection.execute(f"PRAGMA journal_mode={'WAL' if self.wal else 'DELETE'}")
+        connection.executescript(_SCHEMA)
+        return connection
+
+    def add_record(self, record: str):
+        """
+        Registers a record (the stem of its XML file).
+        """
+        self._check_writable()
+        self._records.append((record,))
+
+    def add(self, record: str, timestamp: str, task: str, action: str, field: str = "", old_value="",
+            new_value=""):
+        """
+        Records a change, or with action "task" the start of a task block
+        (or "summary" a number of changes).
+        """
+        self._check_writable()
+        self._changes.append(
+            (self.epoch, record, timestamp, task, action, field, _value(old_value), _value(new_value))
+        )
+        if len(self._changes) >= MAX_BUFFERED_CHANGES:
+            self.flush()
+
+    def _check_writable(self):
+        if self.read_only:
+            raise ValueError(f"Changelog store {self.path} is open read-only")
+
+    def flush(self):
+        """
+        Inserts the buffered records and changes.
+        """
+        if not (self._records or self._changes):
+            return
+        with self._connection:
+            self._connection.executemany("INSERT OR IGNORE INTO records VALUES (?)", self._records)
+            self._connection.executemany(
+                "INSERT INTO changes (epoch, record, timestamp, task, action, field, old_value, new_value) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                self._changes,
+            )
+        self._records = []
+        self._changes = []
+
+    def close(self):
+        """
+        Inserts the buffered changes and closes the store. Idempotent; also
+        called when the process exits.
+        """
+        if not self._closed and self._pid == os.getpid():
+            self._closed = True
+            if not self.read_only:
+                atexit.unregister(self.close)
+                self.flush()
+            self._connection.close()
+
+    @staticmethod
+    def shard_path(run_dir) -> Path:
+        """
+        Returns the shard of the calling process in a run folder
+        ('<run>/changelog-shards/<host>-<pid>.sqlite').
+        """
+        return Path(run_dir) / SHARDS_FOLDER / f"{socket.gethostname()}-{os.getpid()}.sqlite"
+
+    def merge_shards(self, shard_paths: Iterable, batch_size: int = 10000) -> int:
+        """
+        Adds the records and changes of shards to this store, in the order a
+        serial run would have recorded them, then deletes the shards.
+
+        The changes of each shard are read in (record, epoch, seq) order from its
+        index and merged with heapq.merge, so only one row per shard (plus the
+        insert batch) is held in memory whatever the size of the run.
+
+        Args:
+            shard_paths (Iterable): Shard files (e.g. copied from several nodes).
+            batch_size (int): Changes inserted per executemany call.
+
+        Returns:
+            int: Number of changes merged.
+        """
+        self._check_writable()
+        shard_paths = sorted(Path(p) for p in shard_paths)
+        if not shard_paths:
+            return 0
+        self.flush()
+        shards = [sqlite3.connect(f"{p.resolve().as_uri()}?mode=ro", uri=True) for p in shard_paths]
+        count = 0
+        try:
+            with self._connection:
+                for shard in shards:
+                    self._connection.executemany(
+                        "INSERT OR IGNORE INTO records VALUES (?)", shard.execute("SELECT record FROM records")
+                    )
+                streams = [
+                    shard.execute(
+                        "SELECT record, epoch, seq, timestamp, task, action, field, old_value, new_value "
+                        "FROM changes ORDER BY record, epoch, seq"
+                    )
+                    for shard in shards
+                ]
+                merged = heapq.merge(*streams, key=lambda row: row[:3])
+                while True:
+                    batch = [(epoch, record, *rest) for record, epoch, _, *rest in itertools.islice(merged, batch_size)]
+                    if not batch:
+                        break
+                    self._connection.executemany(
+                        "INSERT INTO changes (epoch, record, timestamp, task, action, field, old_value, new_value) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        batch,
+                    )
+                    count += len(batch)
+        finally:
+            for shard in shards:
+                shard.close()
+        for path in shard_paths:
+            path.unlink()
+        return count
+
+    def records(self) -> List[str]:
+        """
+        Returns the registered records, sorted.
+        """
+        return [row[0] for row in self._connection.execute("SELECT record FROM records ORDER BY record")]
+
+    def changes(self, record: Optional[str] = None) -> Iterator[tuple]:
+        """
+        Iterates over the changes, record by record and in the order they were made.
+
+        Args:
+            record (str, optional): Only the changes of this record.
+
+        Returns:
+            Iterator[tuple]: (record, timestamp, task, action, field, old_value, new_value) rows.
+        """
+        query = "SELECT record, timestamp, task, action, field, old_value, new_value FROM changes"
+        if record is None:
+            return self._connection.execute(query + " ORDER BY record, epoch, seq")
+        return self._connection.execute(query + " WHERE record = ? ORDER BY epoch, seq", (record,))
+
+    def export(self, log_dir, records: Optional[Iterable[str]] = None) -> int:
+        """
+        Generates the `.log` and `.csv` files of records from the store,
+        replacing any previous export.
+
+        Args:
+            log_dir: Folder to write the files to.
+            records (Iterable[str], optional): Records to export. Defaults to every record.
+
+        Returns:
+            int: Number of records exported.
+        """
+        log_dir = Path(log_dir)
+        writer = ChangelogWriter()
+        count = 0
+        try:
+            for record in (self.records() if records is None else records):
+                for suffix in (".log", ".csv"):
+                    (log_dir / f"{record}{suffix}").unlink(missing_ok=True)
+                changelog = Changelog(f"{record}.xml", log_dir, writer=writer)
+                for _, timestamp, task, action, field, old_value, new_value in self.changes(record):
+                    changelog.replay(timestamp, task, action, field, old_value, new_value)
+                count += 1
+        finally:
+            writer.close()
+        return count
@@ -0,0 +1,168 @@
+import atexit
+import logging
+import queue
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Changelog files kept open at a time; the least recently written is closed first
+MAX_OPEN_FILES = 512
+
+# Lines queued before a writing task waits for the writer thread to catch up
+MAX_QUEUED_LINES = 100000
+
+# Queue markers asking the writer thread to flush (with the event to set once done) or to stop
+_FLUSH = object()
+_STOP = object()
+
+
+class ChangelogWriter:
+    """
+    Background writer of the changelog files of a process.
+
+    Changelog lines are queued in memory by the tasks and appended to their
+    files by a single background thread, through persistent buffered file
+    handles, instead of opening and closing the file for every line. Lines
+    are written in the order they were queued, so each file gets exactly the
+    content the tasks would have written directly.
+
+    The queue holds about max_queued_lines lines at most: past that, write()
+    waits for the writer thread to catch up. The buffers are written to disk
+    by flush() (called at the end of each task, and by the worker processes
+    at the end of each chunk) and by close(), which also runs when the
+    process exits. A line that cannot be written (e.g. a full disk, or a diff
+    that fails to render) is logged with its file and skipped, the other
+    lines are written; the first such error is raised again by the next
+    flush() or close().
+    """
+
+    def __init__(self, max_open_files: int = MAX_OPEN_FILES, max_queued_lines: int = MAX_QUEUED_LINES):
+        """
+        Starts the writer thread.
+
+        Args:
+            max_open_files (int): Files kept open at a time.
+            max_queued_lines (int): Lines queued at most (checked every
+                max_queued_lines writes): past this, write() waits until the
+                writer thread has written them.
+        """
+        self.max_open_files = max_open_files
+        self.max_queued_lines = max_queued_lines
+        self._writes = 0
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._files: "OrderedDict[str, object]" = OrderedDict()
+        # first error raised while writing a line, with the file of the line
+        self._error: Optional[tuple] = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="changelog-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, path, text, newline: Optional[str] = None):
+        """
+        Queues text to append to a file.
+
+        Args:
+            path: File to append to.
+            text (str | Callable[[], str]): Text to append, with its line endings,
+                or a function returning it, called by the writer thread (e.g. to
+                render a diff off the tasks' path).
+            newline (str, optional): newline option the file is opened with
+                ("" for CSV files, as for csv.writer).
+        """
+        if self._closed:
+            raise ValueError("Changelog writer is closed")
+        self._queue.put((str(path), text, newline))
+        self._writes += 1
+        if self._writes >= self.max_queued_lines:
+            # keeps the queue (and the memory it holds) bounded when the tasks outpace the disk
+            self._writes = 0
+            if self._queue.qsize() >= self.max_queued_lines:
+                self.flush()
+
+    def flush(self):
+        """
+        Waits until every queued line is written to disk.
+
+        Raises:
+            OSError: If a line could not be written since the last flush (the
+                first error, with the file of the line; the other lines are written).
+        """
+        if not self._closed:
+            done = threading.Event()
+            self._queue.put((_FLUSH, done, None))
+            done.wait()
+        self._raise_error()
+
+    def close(self):
+        """
+        Writes the queued lines, closes the files and stops the writer thread.
+        Idempotent.
+        """
+        if not self._closed:
+            self._closed = True
+            self._queue.put((_STOP, None, None))
+            self._thread.join()
+            atexit.unregister(self.close)
+        self._raise_error()
+
+    def abandon(self):
+        """
+        Drops a writer inherited by a forked process, where its thread does not
+        run: the files stay as the parent left them (it flushes before forking).
+        """
+        self._closed = True
+        self._files = OrderedDict()
+        atexit.unregister(self.close)
+
+    def _raise_error(self):
+        if self._error is not None:
+            (error, path), self._error = self._error, None
+            if path in (_FLUSH, _STOP):
+                raise error
+            raise OSError(f"Could not write a changelog line to {path}: {error}") from error
+
+    def _file(self, path: str, newline: Optional[str]):
+        """
+        Returns the open handle of a file, opening it (and closing the least
+        recently used one past max_open_files) if needed.
+        """
+        handle = self._files.get(path)
+        if handle is not None:
+            self._files.move_to_end(path)
+            return handle
+        if len(self._files) >= self.max_open_files:
+            _, oldest = self._files.popitem(last=False)
+            oldest.close()
+        handle = open(path, "a", encoding="utf-8", newline=newline)
+        self._files[path] = handle
+        return handle
+
+    def _run(self):
+        """
+        Writer thread: appends the queued lines until asked to stop.
+        """
+        while True:
+            path, payload, newline = self._queue.get()
+            try:
+                if path is _FLUSH:
+                    for handle in self._files.values():
+                        handle.flush()
+                elif path is _STOP:
+                    while self._files:
+                        self._files.popitem()[1].close()
+                else:
+                    self._file(path, newline).write(payload() if callable(payload) else payload)
+            except Exception as e:
+                # only this line is lost: the error is kept for the caller, with its file
+                if path not in (_FLUSH, _STOP):
+                    logger.error("Could not write a changelog line to %s: %s", path, e)
+                if self._error is None:
+                    self._error = (e, path)
+            finally:
+                if path is _FLUSH:
+                    payload.set()
+            if path is _STOP:
+                return
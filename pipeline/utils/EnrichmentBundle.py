@@ -0,0 +1,273 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from pipeline.utils.excel_loader import read_workbook
+from pipeline.utils.excel_sidecar import file_hash
+
+logger = logging.getLogger(__name__)
+
+# Bumped when the bundle layout changes, so that old bundles are rebuilt
+BUNDLE_VERSION = 1
+
+# ID-keyed tables of the conversion tables folder, and the column holding the PEF ID
+BUNDLE_TABLES = {
+    "Contacts_arricchito_pids.xlsx": "ID Fiche",
+    "add-nations.xlsx": "ID_PEF",
+    "OK-Financeurs.xlsx": "ID",
+    "OK_StatutOrganismeSplit.xlsx": "ID",
+    "add-sampling-procedure.xlsx": "ID_PEF",
+    "new-collection-modes.xlsx": "PEF_ID",
+    "20251028-liste-autres-liens.xlsx": "ID",
+    "study-status.xlsx": "PEF_ID",
+    "nct-repartition.xlsx": "ID_PEF",
+    "add-third-party-source.xlsx": "PEF_ID",
+}
+
+
+def _key(value) -> Optional[str]:
+    """
+    Indexed form of an ID cell: the text without surrounding whitespace (None for empty cells).
+    """
+    if isinstance(value, str):
+        return value.strip()
+    return None
+
+
+class EnrichmentBundle:
+    """
+    The ID-keyed conversion tables compiled into a single SQLite file, with an
+    index on the ID column of each table.
+
+    Tasks enriching a record with the rows of its PEF ID (contacts, nations,
+    fundings...) used to load each table whole into pandas and filter it for
+    every record. With the bundle, each record runs one indexed query per
+    table: nothing is loaded at startup and the memory used does not grow with
+    the tables.
+
+    Each workbook is stored as read by the tasks (every cell as text, empty
+    cells as NULL) in a table with one TEXT column per workbook column, plus
+    its row position ('_row') and the stripped ID ('_key', indexed). The
+    'bundle_tables' table records, for each workbook, its SHA-256, ID column,
+    column names and row count: a workbook changed since the bundle was built
+    is detected and read from the Excel file instead (see is_fresh).
+
+    The bundle is opened read-only, with one connection per thread and process.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path: Path of the bundle file (built by EnrichmentBundle.build).
+
+        Raises:
+            FileNotFoundError: If the bundle does not exist.
+            ValueError: If the bundle was built by another version of the pipeline.
+        """
+        self.path = Path(path)
+        if not self.path.is_file():
+            raise FileNotFoundError(f"Enrichment bundle not found: {self.path}")
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        connection = self._connection()
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != BUNDLE_VERSION:
+            raise ValueError(f"Enrichment bundle {self.path} has version {version}, expected {BUNDLE_VERSION}")
+        self.tables = {
+            name: {"table": table, "id_column": id_column, "sha256": sha256, "columns": json.loads(columns), "rows": rows}
+            for name, table, id_column, sha256, columns, rows in connection.execute(
+                "SELECT name, sql_table, id_column, sha256, columns, rows FROM bundle_tables"
+            )
+        }
+        # workbook path -> (mtime, whether its content matches the bundle)
+        self._fresh: Dict[str, tuple] = {}
+
+    @staticmethod
+    def build(tables_folder, bundle_path, tables: Optional[Dict[str, str]] = None) -> Dict[str, int]:
+        """
+        Compiles the ID-keyed workbooks of a folder into a new bundle file.
+
+        The bundle is written next to its final path and moved into place once
+        complete, so that a running pipeline never reads a partial bundle.
+
+        Args:
+            tables_folder: Folder of the workbooks (the conversion tables folder).
+            bundle_path: Path of the bundle to write.
+            tables (Dict[str, str], optional): Workbook filename -> ID column.
+                Defaults to BUNDLE_TABLES.
+
+        Returns:
+            Dict[str, int]: Rows stored per workbook.
+
+        Raises:
+            FileNotFoundError: If a workbook is missing.
+            KeyError: If a workbook has no ID column.
+        """
+        tables = BUNDLE_TABLES if tables is None else tables
+        bundle_path = Path(bundle_path)
+        bundle_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = bundle_path.with_name(f"{bundle_path.name}.{os.getpid()}.tmp")
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+        counts = {}
+        connection = sqlite3.connect(tmp_path)
+        try:
+            connection.execute(
+                "CREATE TABLE bundle_tables (name TEXT PRIMARY KEY, sql_table TEXT, id_column TEXT, "
+                "sha256 TEXT, columns TEXT, rows INTEGER)"
+            )
+            for position, (name, id_column) in enumerate(tables.items()):
+                excel_path = Path(tables_folder) / name
+                sha256 = file_hash(excel_path)
+                df = read_workbook(excel_path, dtype=str)
+                if id_column not in df.columns:
+                    raise KeyError(f"{name}: ID column '{id_column}' not found")
+
+                table = f"t{position}"
+                columns = list(df.columns)
+                column_defs = ", ".join(f"c{i} TEXT" for i in range(len(columns)))
+                connection.execute(f"CREATE TABLE {table} (_row INTEGER PRIMARY KEY, _key TEXT, {column_defs})")
+
+                id_position = columns.index(id_column)
+                placeholders = ", ".join("?" * (len(columns) + 2))
+                values = df.astype(object).where(df.notna(), None)
+                connection.executemany(
+                    f"INSERT INTO {table} VALUES ({placeholders})",
+                    (
+                        (row_number, _key(row[id_position]), *row)
+                        for row_number, row in enumerate(values.itertuples(index=False, name=None))
+                    ),
+                )
+                connection.execute(f"CREATE INDEX {table}_key ON {table} (_key)")
+                connection.execute(
+                    "INSERT INTO bundle_tables VALUES (?, ?, ?, ?, ?, ?)",
+                    (name, table, id_column, sha256, json.dumps(columns, ensure_ascii=False, default=str), len(df)),
+                )
+                counts[name] = len(df)
+                logger.info("Bundled %s: %d rows, %d columns, indexed on '%s'", name, len(df), len(columns), id_column)
+
+            connection.execute(f"PRAGMA user_version = {BUNDLE_VERSION}")
+            connection.commit()
+        except BaseException:
+            connection.close()
+            tmp_path.unlink(missing_ok=True)
+            raise
+        connection.close()
+
+        os.replace(tmp_path, bundle_path)
+        return counts
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Returns the read-only connection of the calling thread, opening it on first use.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(f"{self.path.resolve().as_uri()}?mode=ro", uri=True)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def is_fresh(self, excel_path) -> bool:
+        """
+        Tells whether the bundle holds the current content of a workbook (same
+        SHA-256 as when it was built). The hash is computed once per
+        modification time of the workbook.
+
+        Args:
+            excel_path: Path of the workbook.
+
+        Returns:
+            bool: False if the workbook is not bundled, missing or changed since.
+        """
+        excel_path = os.path.abspath(str(excel_path))
+        entry = self.tables.get(os.path.basename(excel_path))
+        if entry is None:
+            return False
+        try:
+            mtime = os.stat(excel_path).st_mtime_ns
+        except OSError:
+            return False
+
+        with self._lock:
+            cached = self._fresh.get(excel_path)
+            if cached is None or cached[0] != mtime:
+                fresh = file_hash(excel_path) == entry["sha256"]
+                if not fresh:
+                    logger.warning(
+                        "%s changed since the enrichment bundle was built, reading the workbook instead "
+                        "(rebuild it with 'python main.py build-bundle')", os.path.basename(excel_path)
+                    )
+                cached = (mtime, fresh)
+                self._fresh[excel_path] = cached
+            return cached[1]
+
+    def rows(self, excel_path, file_id: str, columns: Optional[Iterable[str]] = None, fillna=None,
+             strip: bool = False) -> pd.DataFrame:
+        """
+        Returns the rows of a bundled workbook for one ID.
+
+        The result is the DataFrame the tasks used to get by filtering the table
+        read with dtype=str: same columns (in workbook order), same values, rows
+        in workbook order and indexed by their position in the table.
+
+        Args:
+            excel_path: Path (or filename) of the workbook.
+            file_id (str): ID to look up.
+            columns (Iterable[str], optional): Columns to return; requested columns
+                missing from the workbook are ignored. Defaults to every column.
+            fillna: If not None, value used to fill the empty cells.
+            strip (bool): Compare the IDs without their surrounding whitespace
+                (by default an ID cell must be exactly file_id).
+
+        Returns:
+            pd.DataFrame: The matching rows.
+
+        Raises:
+            KeyError: If the workbook is not in the bundle.
+        """
+        entry = self.tables[os.path.basename(str(excel_path))]
+        names = entry["columns"]
+        if columns is None:
+            positions = list(range(len(names)))
+        else:
+            wanted = set(columns)
+            positions = [i for i, name in enumerate(names) if str(name) in wanted]
+
+        selected = ", ".join(["_row"] + [f"c{i}" for i in positions])
+        query = f"SELECT {selected} FROM {entry['table']} WHERE _key = ?"
+        params = [file_id]
+        if not strip:
+            query += f" AND c{names.index(entry['id_column'])} = ?"
+            params = [file_id.strip(), file_id]
+        records = self._connection().execute(query + " ORDER BY _row", params).fetchall()
+
+        empty = np.nan if fillna is None else fillna
+        index = pd.Index([record[0] for record in records], dtype="int64")
+        data = [[empty if value is None else value for value in record[1:]] for record in records]
+        return pd.DataFrame(data, index=index, columns=[names[i] for i in positions], dtype=object)
+
+    def reset_after_fork(self):
+        """
+        Renews the lock and drops the connections inherited by a forked worker process.
+        """
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def close(self):
+        """
+        Closes the connection of the calling thread.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.pid == os.getpid():
+            connection.close()
+        self._local = threading.local()
@@ -3,66 +3,185 @@ import json
 import re
 import html
 import unicodedata
+import time
+from bisect import bisect_right
 import pandas as pd
 from lxml import etree
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 from pipeline.utils.Changelog import Changelog
+from pipeline.utils.OperationStats import COUNTERS
+from pipeline.utils.SharedTables import PositionLists, SharedMap, SharedRecords, SharedSet, StringColumn
+from pipeline.utils.excel_loader import read_workbook
 
 
-class FieldTransformer:
+def _sanitize_for_xml(value) -> str:
     """
-    FieldTransformer applies XML transformations to a single file using
-    a combination of Excel lookup tables and a corresponding JSON configuration file.
+    Cleans a value to make it safe and valid for XML output.
 
-    It supports two operational modes:
+    Args:
+        value: Any value from Excel or XML.
 
-    - 'by_id' (default): applies transformations based on a unique file identifier (e.g., file name),
-      matching the corresponding row in the Excel file.
-    - 'general': applies transformations row-by-row across the entire Excel file,
-      matching values globally within the XML without needing a specific file ID.
+    Returns:
+        str: Sanitized and XML-safe string.
+    """
+    if pd.isna(value):
+        return ""
+    value = str(value)
+    value = value.replace("_x000D_", " ").replace("\n", " ").replace("\t", " ")
+    value = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F]', '', value)
+    value = html.escape(value)
+    return ' '.join(value.split())
 
-    All changes are logged using the provided Changelog instance.
+
+def _sanitize_column(values: pd.Series) -> pd.Series:
+    """
+    Vectorized version of _sanitize_for_xml for a whole table column.
+
+    Args:
+        values (pd.Series): Column of the Excel table.
+
+    Returns:
+        pd.Series: Sanitized strings, NaN where the cell is empty.
+    """
+    present = values.notna()
+    s = values[present].astype(str)
+    s = (
+        s.str.replace("_x000D_", " ", regex=False)
+        .str.replace("\n", " ", regex=False)
+        .str.replace("\t", " ", regex=False)
+        .str.replace(r'[\x00-\x08\x0B\x0C\x0E-\x1F]', '', regex=True)
+    )
+    # html.escape, '&' first
+    for char, entity in (("&", "&amp;"), ("<", "&lt;"), (">", "&gt;"), ('"', "&quot;"), ("'", "&#x27;")):
+        s = s.str.replace(char, entity, regex=False)
+    s = s.str.split().str.join(" ")
+    return s.reindex(values.index).astype(object)
+
+
+def _normalize_xpath(xpath: str) -> str:
+    """
+    Converts shorthand XPath to a fully-qualified one, ensuring it starts with '/' or '//'.
+
+    Args:
+        xpath (str): Original XPath string.
+
+    Returns:
+        str: Normalized XPath string.
+    """
+    return xpath if xpath.startswith(("/", ".", "//")) else f"//{xpath}"
+
+
+def _canon_for_match(s: str) -> str:
+    """
+    Canonical form used to match XML values against the Excel 'from' column
+    in 'replace_set' operations.
+
+    Args:
+        s (str): Value to canonicalize.
+
+    Returns:
+        str: Canonical string (not lowercased).
+    """
+    # 1) stringa
+    s = "" if s is None else str(s)
+    # 2) decodifica entità HTML/XML (es. &#x27; -> ')
+    s = html.unescape(s)
+    # 3) normalizzazione Unicode (NFKC gestisce accenti composti/decomposti)
+    s = unicodedata.normalize("NFKC", s)
+    # 4) uniforma apostrofi/virgolette “curve” a l'apostrofo semplice
+    s = re.sub(r"[’‘ʼ`´ˈʹ\u2019\u2018\u2032\u02BC]", "'", s)
+    # 5) sostituisci NBSP e compatta spazi
+    s = s.replace("\xa0", " ").strip()
+    s = re.sub(r"\s+", " ", s)
+    s = s.replace("&#x27;","'")
+    return s
+
+
+# Keys that each operation type reads from its configuration
+_REQUIRED_OPERATION_KEYS = {
+    "update": (("from", "xpath"), ("to", "xpath")),
+    "add": (("to", "xpath"),),
+    "delete": (("from", "xpath"),),
+    "replace_set": (("from", "xpath"), ("from", "col"), ("to", "xpath"), ("to", "col")),
+}
+
+
+class CompiledPlan:
+    """
+    Immutable part of a FieldTransformer: the JSON configuration, the Excel
+    mapping table and the lookup indexes derived from them.
+
+    A plan is built once per run for each conversion table and shared by all
+    the records (and threads) that use that table. Its attributes are not
+    reassigned after construction; per-record state (file ID, matched rows,
+    changelog) lives in FieldTransformer. The run-wide collectors it is given
+    are the only mutable objects it refers to: they record what the records
+    report, and are thread-safe.
 
     Attributes:
-        task_name (str): Name of the task for changelog tracking.
         excel_filename (str): Filename of the Excel mapping table.
         excel_path (str): Full path to the Excel file (inside 'files/conversion-tables').
-        file_id (str): Unique identifier for the current XML file.
-        changelog (Changelog): Changelog instance to record all modifications.
         config_path (str): Path to the associated JSON configuration file.
         config (Dict): Parsed JSON configuration.
-        df (pd.DataFrame): Loaded Excel data as a DataFrame.
-        row (pd.Series): Matched row for the current file (used in 'by_id' mode).
+        df (pd.DataFrame): Loaded Excel data as a DataFrame (raw cells). None on
+            plans attached by worker processes (see SharedTables).
+        sanitized (pd.DataFrame): Columns referenced by the operations, sanitized
+            for XML at load time (NaN where the cell is empty). None on attached plans.
+        records (List[Dict[str, Optional[str]]]): Rows of 'sanitized' as dicts
+            (None for empty cells), passed to the operation handlers. A SharedRecords
+            view on attached plans.
         mode (str): Operation mode, either 'by_id' or 'general'.
+        xpath_errors (Dict[str, str]): XPath expressions of the config that do not compile.
+        unmatched (UnmatchedValues): Optional run-wide collector of the values missing
+            from the table.
+        stats (OperationStats): Optional run-wide per-operation counters.
     """
 
-    def __init__(self, excel_path: str, file_id: str, task_name: str, changelog: Changelog):
+    def __init__(self, excel_path: str, tables=None, unmatched=None, stats=None):
         """
-        Initialize the FieldTransformer with file paths and configuration.
+        Loads and validates the configuration and the Excel table, then builds
+        the lookup indexes used by FieldTransformer.
 
         Args:
             excel_path (str): Path to the Excel file containing the mapping table.
-            file_id (str): Identifier used to locate the relevant row in 'by_id' mode.
-            task_name (str): Name of the task for changelog grouping.
-            changelog (Changelog): Changelog instance used for logging operations.
+            tables (TableCache, optional): Cache to read the Excel table from.
+            unmatched (UnmatchedValues, optional): Collector of the values missing from the table.
+            stats (OperationStats, optional): Collector of the per-operation counters.
         """
-        self.task_name = task_name
         self.excel_filename = os.path.basename(excel_path)
         self.excel_path = os.path.join("files", "conversion-tables", self.excel_filename)
-        self.file_id = str(file_id)
-        self.changelog = changelog
+        self.tables = tables
         self.config_path = self._resolve_config_path()
         self.config: Dict[str, Any] = {}
         self.df: Optional[pd.DataFrame] = None
-        self.row: Optional[pd.Series] = None
         self.mode: str = "by_id"
-        self._replace_set_logged = set()
+        self.unmatched = unmatched
+        self.stats = stats
 
         self._load_config()
         self._load_excel()
 
-        if self.mode == "by_id":
-            self._match_row()
+        self.sanitized: pd.DataFrame = pd.DataFrame(index=self.df.index)
+        self.records: List[Dict[str, Optional[str]]] = []
+        self._significant_values: set = set()
+        self._sanitize_table()
+
+        # by_id mode: positions of the rows matching each file ID
+        self._rows_by_id: Dict[str, Any] = {}
+        # replace_set: (from_col, to_col) -> {canonical lowercased value: sanitized 'to' value}
+        self._replace_set_maps: Dict[Tuple[str, str], Dict[str, str]] = {}
+        # general update with 'from.col': op index -> (lowercased 'from' -> row positions, 'to' values)
+        self._update_indexes: Dict[int, Tuple[Dict[str, List[int]], List[str]]] = {}
+        # values that are not misses: canonical 'to' values of replace_set maps,
+        # lowercased 'from' and 'to' values of indexed updates
+        self._replace_set_targets: Dict[Tuple[str, str], set] = {}
+        self._update_known: Dict[int, set] = {}
+        # normalized XPath expression -> compiled evaluator
+        self._xpaths: Dict[str, etree.XPath] = {}
+        # normalized XPath expression -> syntax error, for expressions that do not compile
+        self.xpath_errors: Dict[str, str] = {}
+        self._build_indexes()
+        self._compile_xpaths()
 
     def _resolve_config_path(self) -> str:
         """
@@ -74,36 +193,6 @@ class FieldTransformer:
         excel_name = os.path.splitext(self.excel_filename)[0]
         return os.path.join("configs", f"{excel_name}.json")
 
-    def _sanitize_for_xml(self, value) -> str:
-        """
-        Cleans a value to make it safe and valid for XML output.
-
-        Args:
-            value: Any value from Excel or XML.
-
-        Returns:
-            str: Sanitized and XML-safe string.
-        """
-        if pd.isna(value):
-            return ""
-        value = str(value)
-        value = value.replace("_x000D_", " ").replace("\n", " ").replace("\t", " ")
-        value = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F]', '', value)
-        value = html.escape(value)
-        return ' '.join(value.split())
-
-    def _normalize_xpath(self, xpath: str) -> str:
-        """
-        Converts shorthand XPath to a fully-qualified one, ensuring it starts with '/' or '//'.
-
-        Args:
-            xpath (str): Original XPath string.
-
-        Returns:
-            str: Normalized XPath string.
-        """
-        return xpath if xpath.startswith(("/", ".", "//")) else f"//{xpath}"
-
     def _load_config(self):
         """
         Loads the transformation configuration from the JSON file.
@@ -142,7 +231,12 @@ class FieldTransformer:
         """
         if not os.path.exists(self.excel_path):
             raise FileNotFoundError(f"Excel file not found: {self.excel_path}")
-        self.df = pd.read_excel(self.excel_path)
+        # only the columns used by the configuration are read
+        columns = self._table_columns()
+        if self.tables is not None:
+            self.df = self.tables.get(self.excel_path, columns=columns)
+        else:
+            self.df = read_workbook(self.excel_path, columns=columns)
         self._validate_excel_columns()
 
     def _validate_excel_columns(self):
@@ -164,34 +258,702 @@ class FieldTransformer:
         if missing:
             raise ValueError(f"Missing columns in Excel file: {missing}")
 
+    def _referenced_columns(self) -> List[str]:
+        """
+        Returns the Excel columns referenced by the operations, in configuration order.
+        """
+        columns = []
+        for op in self.config["operations"]:
+            for side in ("from", "to"):
+                if isinstance(op.get(side), dict) and "col" in op[side] and op[side]["col"] not in columns:
+                    columns.append(op[side]["col"])
+        return columns
+
+    def _table_columns(self) -> List[str]:
+        """
+        Returns the Excel columns the plan reads: the referenced columns and, in
+        'by_id' mode, the file ID column.
+        """
+        columns = self._referenced_columns()
+        if self.mode == "by_id" and self.config["file_id_column"] not in columns:
+            columns.append(self.config["file_id_column"])
+        return columns
+
+    def _sanitize_table(self):
+        """
+        Sanitizes once, with vectorized string operations, every column referenced
+        by the operations, and precomputes which sanitized values are significant.
+        The raw cells stay available in 'df'.
+        """
+        for col in self._referenced_columns():
+            self.sanitized[col] = _sanitize_column(self.df[col])
+
+        present = self.sanitized.stack()
+        if not present.empty:
+            significant = present.str.strip().astype(bool) & present.str.contains(r"\w", regex=True)
+            self._significant_values = set(present[significant])
+
+        cleaned = self.sanitized.astype(object).where(self.sanitized.notna(), None)
+        self.records = cleaned.to_dict("records")
+
+    def _build_indexes(self):
+        """
+        Precomputes the lookups that would otherwise be recomputed for every record:
+        the row positions for each file ID ('by_id' mode), the canonical value maps
+        of 'replace_set' operations and the value indexes of 'general' updates.
+        """
+        if self.mode == "by_id":
+            ids = self.df[self.config["file_id_column"]].astype(str)
+            self._rows_by_id = ids.groupby(ids, sort=False).indices
+
+        for op_idx, op in enumerate(self.config["operations"]):
+            if not op.get("enabled", True):
+                continue
+            op_type = op.get("type")
+
+            if op_type == "replace_set":
+                key = (op["from"]["col"], op["to"]["col"])
+                if key not in self._replace_set_maps:
+                    self._replace_set_maps[key] = self._build_replace_set_map(*key)
+                    self._replace_set_targets[key] = {
+                        _canon_for_match(to_val).lower() for to_val in self._replace_set_maps[key].values()
+                    }
+
+            elif op_type == "update" and self.mode == "general" and "col" in op["from"]:
+                # Predicates may depend on the values being rewritten: keep the row-by-row path
+                if "[" not in _normalize_xpath(op["to"]["xpath"]):
+                    self._update_indexes[op_idx] = self._build_update_index(op)
+                    value_index, to_vals = self._update_indexes[op_idx]
+                    self._update_known[op_idx] = set(value_index) | {to_val.lower() for to_val in to_vals}
+
+    def _compile_xpaths(self):
+        """
+        Compiles once the XPath expressions used by the operations, including the
+        parent path of 'add' operations. Expressions that do not compile are left
+        out of the evaluators and recorded in 'xpath_errors' (see validate).
+        """
+        expressions = set()
+        for op in self.config["operations"]:
+            for side in ("from", "to"):
+                if op.get(side) and "xpath" in op[side]:
+                    expressions.add(_normalize_xpath(op[side]["xpath"]))
+            if op.get("type") == "add" and op.get("to") and "xpath" in op["to"]:
+                xpath = _normalize_xpath(op["to"]["xpath"].strip()).rstrip("/")
+                path_parts = xpath.rsplit("/", 1)
+                expressions.add(path_parts[0] if len(path_parts) == 2 else ".")
+        for expression in expressions:
+            try:
+                self._xpaths[expression] = etree.XPath(expression)
+            except etree.XPathSyntaxError as e:
+                self.xpath_errors[expression] = str(e)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """
+        Pickled state of the plan, used to publish it to worker processes (see SharedTables).
+
+        The table cache, the compiled XPaths and the DataFrames are left out: the
+        records, file ID positions, value maps and value sets are packed into the
+        columnar types of SharedTables, which travel as out-of-band buffers and
+        are read in place by the workers. The run-wide collectors stay in the
+        state: SharedTables pickles them as references, so that each worker's
+        plans are rebuilt with that worker's collectors.
+        """
+        state = self.__dict__.copy()
+        for name in ("tables", "_xpaths", "df", "sanitized"):
+            state[name] = None
+        state["records"] = SharedRecords(list(self.sanitized.columns), self.records)
+        state["_significant_values"] = SharedSet(self._significant_values)
+        state["_rows_by_id"] = SharedMap(self._rows_by_id, pack=PositionLists)
+        state["_replace_set_maps"] = {key: SharedMap(mapping) for key, mapping in self._replace_set_maps.items()}
+        state["_replace_set_targets"] = {key: SharedSet(values) for key, values in self._replace_set_targets.items()}
+        state["_update_indexes"] = {
+            op_idx: (SharedMap(value_index, pack=PositionLists), StringColumn(to_vals))
+            for op_idx, (value_index, to_vals) in self._update_indexes.items()
+        }
+        state["_update_known"] = {op_idx: SharedSet(values) for op_idx, values in self._update_known.items()}
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        """
+        Restores a pickled plan (see __getstate__) and compiles its XPaths again.
+        """
+        self.__dict__.update(state)
+        self._xpaths = {}
+        self.xpath_errors = {}
+        self._compile_xpaths()
+
+    def validate(self) -> Tuple[List[str], List[str]]:
+        """
+        Checks the operations against what the handlers expect: known type,
+        required 'from'/'to' keys and XPaths that compile. Missing files, invalid
+        JSON, unsupported modes and missing columns already fail when the plan is built.
+
+        Returns:
+            Tuple[List[str], List[str]]: Errors (enabled operations that would fail or
+            do nothing) and warnings (the same problems on disabled operations).
+        """
+        errors, warnings = [], []
+        for op_idx, op in enumerate(self.config["operations"]):
+            problems = []
+            op_type = op.get("type")
+            if op_type not in _REQUIRED_OPERATION_KEYS:
+                problems.append(f"unknown type '{op_type}'")
+            else:
+                for side, key in _REQUIRED_OPERATION_KEYS[op_type]:
+                    if not isinstance(op.get(side), dict) or key not in op[side]:
+                        problems.append(f"missing '{side}.{key}'")
+            for side in ("from", "to"):
+                if isinstance(op.get(side), dict) and "xpath" in op[side]:
+                    expression = _normalize_xpath(op[side]["xpath"])
+                    if expression in self.xpath_errors:
+                        problems.append(f"invalid {side} XPath '{expression}': {self.xpath_errors[expression]}")
+            target = errors if op.get("enabled", True) else warnings
+            target.extend(f"operation {op_idx}: {problem}" for problem in problems)
+        return errors, warnings
+
+    def describe(self) -> Dict[str, Any]:
+        """
+        Returns a summary of the plan for the compile report.
+        """
+        operations = self.config["operations"]
+        return {
+            "excel_path": self.excel_path,
+            "config_path": self.config_path,
+            "mode": self.mode,
+            "rows": len(self.df),
+            "operations": len(operations),
+            "enabled_operations": sum(1 for op in operations if op.get("enabled", True)),
+            "file_ids": len(self._rows_by_id),
+            "replace_set_maps": len(self._replace_set_maps),
+            "update_indexes": len(self._update_indexes),
+            "compiled_xpaths": len(self._xpaths),
+        }
+
+    def xpath(self, root: etree._Element, expression: str) -> list:
+        """
+        Evaluates an XPath expression on an element, using the compiled evaluator
+        when the expression belongs to the plan.
+
+        Args:
+            root (etree._Element): Context element.
+            expression (str): Normalized XPath expression.
+
+        Returns:
+            list: Result of the evaluation.
+        """
+        compiled = self._xpaths.get(expression)
+        if compiled is None:
+            return root.xpath(expression)
+        return compiled(root)
+
+    def _build_replace_set_map(self, from_col: str, to_col: str) -> Dict[str, str]:
+        """
+        Maps the canonical, lowercased form of each 'from' value to the sanitized
+        'to' value of its first matching row.
+        """
+        canon = self.df[from_col].astype(str).map(_canon_for_match).str.lower()
+        mapping = {}
+        for key, to_val in zip(canon, self.sanitized[to_col]):
+            if key not in mapping:
+                mapping[key] = "" if pd.isna(to_val) else to_val
+        return mapping
+
+    def _build_update_index(self, op: Dict[str, Any]) -> Tuple[Dict[str, List[int]], List[str]]:
+        """
+        Indexes the rows of a 'general' update operation by lowercased 'from' value.
+
+        Rows that can never change a value (missing 'from' or 'to', or a 'to' value
+        equal to the 'from' one) are left out of the index.
+        """
+        index: Dict[str, List[int]] = {}
+        to_vals: List[str] = []
+        for pos, (from_clean, to_clean) in enumerate(zip(self.sanitized[op["from"]["col"]], self.sanitized[op["to"]["col"]])):
+            to_val = "" if pd.isna(to_clean) else to_clean
+            to_vals.append(to_val)
+            if pd.isna(from_clean) or pd.isna(to_clean):
+                continue
+            from_key = from_clean.lower()
+            if from_key != to_val.lower():
+                index.setdefault(from_key, []).append(pos)
+        return index, to_vals
+
+    def records_for(self, file_id: str) -> List[Dict[str, Optional[str]]]:
+        """
+        Returns the sanitized rows matching a file ID ('by_id' mode), in table order.
+        """
+        positions = self._rows_by_id.get(str(file_id))
+        if positions is None:
+            return []
+        return [self.records[pos] for pos in positions]
+
+    def is_significant(self, value: Optional[str]) -> bool:
+        """
+        Tells whether a sanitized table value contains meaningful (non-whitespace) content.
+        """
+        return value in self._significant_values
+
+    def rows_for(self, file_id: str) -> pd.DataFrame:
+        """
+        Returns the rows matching a file ID ('by_id' mode), in table order. Only
+        available on plans built in this process (attached plans have no DataFrame).
+
+        Args:
+            file_id (str): Identifier of the XML file.
+
+        Returns:
+            pd.DataFrame: Matching rows, empty if there are none.
+        """
+        positions = self._rows_by_id.get(str(file_id))
+        if positions is None:
+            return pd.DataFrame()
+        return self.df.iloc[positions]
+
+    def replace_set_lookup(self, from_col: str, to_col: str, value: str) -> Optional[str]:
+        """
+        Returns the sanitized 'to' value mapped to an XML value by a 'replace_set'
+        operation, or None if the value is not in the table.
+        """
+        return self._replace_set_maps[(from_col, to_col)].get(_canon_for_match(value).lower())
+
+    def update_index(self, op_idx: int) -> Optional[Tuple[Dict[str, List[int]], List[str]]]:
+        """
+        Returns the value index of a 'general' update operation, or None if the
+        operation has to be applied row by row.
+        """
+        return self._update_indexes.get(op_idx)
+
+    def is_replace_set_target(self, from_col: str, to_col: str, value: str) -> bool:
+        """
+        Tells whether a value already is one of the 'to' values of a 'replace_set' map.
+        """
+        return _canon_for_match(value).lower() in self._replace_set_targets.get((from_col, to_col), ())
+
+    def is_update_known(self, op_idx: int, value: str) -> bool:
+        """
+        Tells whether a sanitized value appears (as 'from' or 'to') in the table of
+        an indexed 'general' update.
+        """
+        return value.lower() in self._update_known.get(op_idx, ())
+
+    def update_chain(self, op_idx: int, text: str) -> List[Tuple[int, str, str]]:
+        """
+        Follows the value index of a 'general' update operation for one XML value.
+
+        A value rewritten by one row can be matched again by a later row, so the
+        result lists every rewrite the row-by-row loop would perform, in table order.
+
+        Args:
+            op_idx (int): Position of the operation in the configuration.
+            text (str): Current text of the value node.
+
+        Returns:
+            List[Tuple[int, str, str]]: (row position, old value, new value) for each rewrite.
+        """
+        value_index, to_vals = self._update_indexes[op_idx]
+        chain = []
+        last_pos = -1
+        while True:
+            old_val = _sanitize_for_xml(text)
+            positions = value_index.get(old_val.lower())
+            if positions is None:
+                break
+            i = bisect_right(positions, last_pos)
+            if i == len(positions):
+                break
+            last_pos = int(positions[i])
+            text = to_vals[last_pos]
+            chain.append((last_pos, old_val, text))
+        return chain
+
+    def resolve_update_chains(self, op_idx: int, texts) -> Dict[str, List[Tuple[int, str, str]]]:
+        """
+        Resolves the update chains of many XML values at once, joining all the
+        distinct values against the operation's index with one merge per rewrite
+        step instead of one lookup per value.
+
+        Args:
+            op_idx (int): Position of the operation in the configuration.
+            texts: XML values (texts of the value nodes), possibly repeated.
+
+        Returns:
+            Dict[str, List[Tuple[int, str, str]]]: Chain (see update_chain) of each distinct value.
+        """
+        value_index, to_vals = self._update_indexes[op_idx]
+        distinct = pd.Series(pd.unique(pd.Series(list(texts), dtype=object)), dtype=object)
+        chains: Dict[str, List[Tuple[int, str, str]]] = {text: [] for text in distinct}
+        if distinct.empty or not value_index:
+            return chains
+
+        index_df = pd.DataFrame(
+            [(key, pos) for key, positions in value_index.items() for pos in positions],
+            columns=["key", "pos"],
+        )
+        to_series = pd.Series(to_vals, dtype=object)
+
+        old = distinct.map(_sanitize_for_xml)
+        frontier = pd.DataFrame({"text": distinct, "old": old, "key": old.str.lower(), "last_pos": -1})
+        while not frontier.empty:
+            candidates = frontier.merge(index_df, on="key")
+            candidates = candidates[candidates["pos"] > candidates["last_pos"]]
+            if candidates.empty:
+                break
+            step = candidates.sort_values("pos").drop_duplicates("text")
+            new = to_series.iloc[step["pos"].to_numpy()].to_numpy()
+            for text, pos, old_val, new_val in zip(step["text"], step["pos"], step["old"], new):
+                chains[text].append((int(pos), old_val, new_val))
+            next_old = pd.Series(new, dtype=object).map(_sanitize_for_xml)
+            frontier = pd.DataFrame({
+                "text": step["text"].to_numpy(),
+                "old": next_old.to_numpy(),
+                "key": next_old.str.lower().to_numpy(),
+                "last_pos": step["pos"].to_numpy(),
+            })
+        return chains
+
+    def resolve_replace_set(self, from_col: str, to_col: str, values) -> Dict[str, Optional[str]]:
+        """
+        Resolves many XML values of a 'replace_set' operation with a single join
+        of their canonical forms against the mapping table.
+
+        Args:
+            from_col (str): 'from' column of the operation.
+            to_col (str): 'to' column of the operation.
+            values: Sanitized XML values, possibly repeated.
+
+        Returns:
+            Dict[str, Optional[str]]: Mapped value (or None) for each distinct value.
+        """
+        distinct = pd.Series(pd.unique(pd.Series(list(values), dtype=object)), dtype=object)
+        if distinct.empty:
+            return {}
+        mapping = self._replace_set_maps[(from_col, to_col)]
+        table = pd.DataFrame({"key": list(mapping.keys()), "mapped": list(mapping.values())})
+        lookup = pd.DataFrame({"value": distinct, "key": distinct.map(_canon_for_match).str.lower()})
+        joined = lookup.merge(table, on="key", how="left")
+        return {
+            value: (None if pd.isna(mapped) else mapped)
+            for value, mapped in zip(joined["value"], joined["mapped"])
+        }
+
+    def apply(self, tree: etree._ElementTree, file_id: str, task_name: str, changelog: Changelog) -> etree._ElementTree:
+        """
+        Applies the plan to one record.
+
+        Args:
+            tree (etree._ElementTree): Parsed XML of the record.
+            file_id (str): Identifier used to locate the relevant rows in 'by_id' mode.
+            task_name (str): Name of the task for changelog grouping.
+            changelog (Changelog): Changelog instance used for logging operations.
+
+        Returns:
+            etree._ElementTree: The transformed tree.
+        """
+        return FieldTransformer(self.excel_filename, file_id, task_name, changelog, plan=self).apply_transformations(tree)
+
+    def apply_transformations_many(self, trees: List[etree._ElementTree], file_ids: List[str],
+                                   task_name: str, changelogs: List[Changelog]) -> List[etree._ElementTree]:
+        """
+        Applies the plan to a batch of records.
+
+        Operations run one at a time over the whole batch. For 'general' updates
+        and 'replace_set' operations, the target values of all the trees are
+        collected first and resolved against the table with one vectorized join,
+        then written back tree by tree. Each tree gets the same result and
+        changelog entries as with apply_transformations.
+
+        Args:
+            trees (List[etree._ElementTree]): Parsed XML of the records.
+            file_ids (List[str]): Identifier of each record (used in 'by_id' mode).
+            task_name (str): Name of the task for changelog grouping.
+            changelogs (List[Changelog]): Changelog of each record.
+
+        Returns:
+            List[etree._ElementTree]: The transformed trees.
+        """
+        transformers = [
+            FieldTransformer(self.excel_filename, file_id, task_name, changelog, plan=self)
+            for file_id, changelog in zip(file_ids, changelogs)
+        ]
+        roots = [tree.getroot() for tree in trees]
+        for op_idx, op in enumerate(self.config["operations"]):
+            if op.get("enabled", True):
+                self._apply_step_many(op_idx, op, transformers, roots)
+        return trees
+
+    def _apply_step_many(self, op_idx: int, op: Dict[str, Any],
+                         transformers: List["FieldTransformer"], roots: List[etree._Element]):
+        """
+        Applies one operation to a batch of records (see apply_transformations_many).
+        """
+        if self.mode == "general" and op_idx in self._update_indexes:
+            xpath_to = _normalize_xpath(op["to"]["xpath"])
+            texts = [
+                val_node.text or ""
+                for transformer, root in zip(transformers, roots)
+                for node in self.xpath(root, xpath_to)
+                for val_node in transformer._extract_value_nodes(node)
+            ]
+            chains = self.resolve_update_chains(op_idx, texts)
+            for transformer, root in zip(transformers, roots):
+                transformer.apply_step(op_idx, op, root, chains=chains)
+
+        elif self.mode == "general" and op.get("type") == "replace_set" and self.records:
+            from_xpath = _normalize_xpath(op["from"]["xpath"])
+            values = [
+                _sanitize_for_xml(val_node.text or "")
+                for transformer, root in zip(transformers, roots)
+                for node in self.xpath(root, from_xpath)
+                for val_node in transformer._extract_value_nodes(node)
+            ]
+            resolved = self.resolve_replace_set(op["from"]["col"], op["to"]["col"], values)
+            for transformer, root in zip(transformers, roots):
+                transformer.apply_step(op_idx, op, root, resolved=resolved)
+
+        else:
+            for transformer, root in zip(transformers, roots):
+                if self.mode == "by_id" and not transformer.records:
+                    continue
+                transformer.apply_step(op_idx, op, root)
+
+
+class FusedPlan:
+    """
+    Several CompiledPlans fused into one ordered list of operations, so that
+    tasks chaining conversion tables (migration rules, then repartition, then
+    delete) go through the tree in a single call.
+
+    Operations run in configuration order, table after table, and each table
+    keeps its own per-record state (matched rows, 'replace_set' logging), so
+    the result is the same as applying the FieldTransformers back to back.
+
+    Attributes:
+        plans (List[CompiledPlan]): Fused plans, in application order.
+        steps (List[Tuple[int, int, Dict]]): (plan position, operation index, operation)
+            for every enabled operation.
+    """
+
+    def __init__(self, plans: List[CompiledPlan]):
+        """
+        Args:
+            plans (List[CompiledPlan]): Plans to fuse, in application order.
+        """
+        self.plans = list(plans)
+        self.steps = [
+            (plan_pos, op_idx, op)
+            for plan_pos, plan in enumerate(self.plans)
+            for op_idx, op in enumerate(plan.config["operations"])
+            if op.get("enabled", True)
+        ]
+
+    def apply(self, tree: etree._ElementTree, file_id: str, task_name: str, changelog: Changelog) -> etree._ElementTree:
+        """
+        Applies all fused operations to one record.
+
+        Args:
+            tree (etree._ElementTree): Parsed XML of the record.
+            file_id (str): Identifier used to locate the relevant rows in 'by_id' mode.
+            task_name (str): Name of the task for changelog grouping.
+            changelog (Changelog): Changelog instance used for logging operations.
+
+        Returns:
+            etree._ElementTree: The transformed tree.
+        """
+        transformers = [
+            FieldTransformer(plan.excel_filename, file_id, task_name, changelog, plan=plan)
+            for plan in self.plans
+        ]
+        root = tree.getroot()
+        for plan_pos, op_idx, op in self.steps:
+            transformer = transformers[plan_pos]
+            if transformer.mode == "by_id" and not transformer.records:
+                continue
+            transformer.apply_step(op_idx, op, root)
+        return tree
+
+    def apply_transformations_many(self, trees: List[etree._ElementTree], file_ids: List[str],
+                                   task_name: str, changelogs: List[Changelog]) -> List[etree._ElementTree]:
+        """
+        Applies all fused operations to a batch of records, resolving the lookups
+        of each operation for the whole batch at once
+        (see CompiledPlan.apply_transformations_many).
+        """
+        transformers = [
+            [
+                FieldTransformer(plan.excel_filename, file_id, task_name, changelog, plan=plan)
+                for file_id, changelog in zip(file_ids, changelogs)
+            ]
+            for plan in self.plans
+        ]
+        roots = [tree.getroot() for tree in trees]
+        for plan_pos, op_idx, op in self.steps:
+            self.plans[plan_pos]._apply_step_many(op_idx, op, transformers[plan_pos], roots)
+        return trees
+
+
+class FieldTransformer:
+    """
+    FieldTransformer applies XML transformations to a single file using
+    a combination of Excel lookup tables and a corresponding JSON configuration file.
+
+    It supports two operational modes:
+
+    - 'by_id' (default): applies transformations based on a unique file identifier (e.g., file name),
+      matching the corresponding row in the Excel file.
+    - 'general': applies transformations row-by-row across the entire Excel file,
+      matching values globally within the XML without needing a specific file ID.
+
+    The configuration, the Excel table and the lookup indexes are held by a
+    CompiledPlan, which can be built once per run and shared between records;
+    a FieldTransformer only carries the per-record state.
+
+    All changes are logged using the provided Changelog instance.
+
+    Attributes:
+        plan (CompiledPlan): Compiled configuration and mapping table.
+        task_name (str): Name of the task for changelog tracking.
+        excel_filename (str): Filename of the Excel mapping table.
+        excel_path (str): Full path to the Excel file (inside 'files/conversion-tables').
+        file_id (str): Unique identifier for the current XML file.
+        changelog (Changelog): Changelog instance to record all modifications.
+        config_path (str): Path to the associated JSON configuration file.
+        config (Dict): Parsed JSON configuration.
+        df (pd.DataFrame): Loaded Excel data as a DataFrame (None on plans attached
+            by worker processes, see SharedTables).
+        records (List[Dict[str, Optional[str]]]): Sanitized rows matched for the
+            current file (used in 'by_id' mode).
+        mode (str): Operation mode, either 'by_id' or 'general'.
+    """
+
+    def __init__(self, excel_path: str, file_id: str, task_name: str, changelog: Changelog,
+                 plan: Optional[CompiledPlan] = None):
+        """
+        Initialize the FieldTransformer with file paths and configuration.
+
+        Args:
+            excel_path (str): Path to the Excel file containing the mapping table.
+            file_id (str): Identifier used to locate the relevant row in 'by_id' mode.
+            task_name (str): Name of the task for changelog grouping.
+            changelog (Changelog): Changelog instance used for logging operations.
+            plan (CompiledPlan, optional): Precompiled plan for this table. When omitted,
+                the configuration and the Excel table are loaded for this instance only.
+        """
+        self.plan = plan if plan is not None else CompiledPlan(excel_path)
+        self.task_name = task_name
+        self.excel_filename = self.plan.excel_filename
+        self.excel_path = self.plan.excel_path
+        self.file_id = str(file_id)
+        self.changelog = changelog
+        self.config_path = self.plan.config_path
+        self.config: Dict[str, Any] = self.plan.config
+        self.df: Optional[pd.DataFrame] = self.plan.df
+        self.records: List[Dict[str, Optional[str]]] = []
+        self.mode: str = self.plan.mode
+        self._replace_set_logged = set()
+        # counters of the operation being applied (see OperationStats)
+        self._counters: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+
+        if self.mode == "by_id":
+            self._match_row()
+
+    def _sanitize_for_xml(self, value) -> str:
+        """
+        Cleans a value to make it safe and valid for XML output.
+
+        Args:
+            value: Any value from Excel or XML.
+
+        Returns:
+            str: Sanitized and XML-safe string.
+        """
+        return _sanitize_for_xml(value)
+
+    def _normalize_xpath(self, xpath: str) -> str:
+        """
+        Converts shorthand XPath to a fully-qualified one, ensuring it starts with '/' or '//'.
+
+        Args:
+            xpath (str): Original XPath string.
+
+        Returns:
+            str: Normalized XPath string.
+        """
+        return _normalize_xpath(xpath)
+
+    def _xpath(self, root: etree._Element, expression: str) -> list:
+        result = self.plan.xpath(root, expression)
+        self._counters["xpath_evaluations"] += 1
+        if isinstance(result, list):
+            self._counters["nodes_visited"] += len(result)
+        return result
+
     def _match_row(self):
-        match = self.df[self.df[self.config["file_id_column"]].astype(str) == self.file_id]
-        self.row = match if not match.empty else pd.DataFrame()
+        self.records = self.plan.records_for(self.file_id)
 
     def apply_transformations(self, tree: etree._ElementTree) -> etree._ElementTree:
-        if self.mode == "by_id" and self.row.empty:
+        if self.mode == "by_id" and not self.records:
             return tree
 
         root = tree.getroot()
-        for op in self.config["operations"]:
+        for op_idx, op in enumerate(self.config["operations"]):
             if not op.get("enabled", True):
                 continue
-            if self.mode == "by_id":
-                for _, row in self.row.iterrows():  # iteri su tutte le righe corrispondenti
-                    self._apply_operation(op, root, row)
-            else:
-                for _, row in self.df.iterrows():
-                    self._apply_operation(op, root, row)
+            self.apply_step(op_idx, op, root)
         return tree
 
-    def _apply_operation(self, op: Dict[str, Any], root: etree._Element, row: pd.Series):
+    def apply_step(self, op_idx: int, op: Dict[str, Any], root: etree._Element,
+                   chains: Optional[Dict[str, List[Tuple[int, str, str]]]] = None,
+                   resolved: Optional[Dict[str, Optional[str]]] = None):
+        """
+        Applies one enabled operation of the plan to the XML tree, over the matched
+        rows ('by_id' mode) or the whole table ('general' mode). When the plan has
+        run-wide stats, the operation's counters are added to them.
+
+        Args:
+            op_idx (int): Position of the operation in the configuration.
+            op (Dict[str, Any]): Operation configuration.
+            root (etree._Element): Root XML element.
+            chains (Dict, optional): Update chains resolved for a batch of records.
+            resolved (Dict, optional): 'replace_set' values resolved for a batch of records.
+        """
+        stats = self.plan.stats
+        if stats is not None:
+            self._counters = dict.fromkeys(COUNTERS, 0)
+            start = time.perf_counter()
+
+        if self.mode == "by_id":
+            self._apply_rows(op, root, self.records)  # iteri su tutte le righe corrispondenti
+        elif self.plan.update_index(op_idx) is not None:
+            self._apply_update_indexed(op_idx, op, root, chains=chains)
+        elif op.get("type") == "replace_set" and self.plan.records:
+            self._apply_replace_set_general(op, root, resolved=resolved)
+        else:
+            self._apply_rows(op, root, self.plan.records)
+
+        if stats is not None:
+            stats.record(self.task_name, self.excel_filename, op_idx, op,
+                         time.perf_counter() - start, self._counters)
+
+    def _apply_rows(self, op: Dict[str, Any], root: etree._Element, rows: List[Dict[str, Optional[str]]]):
+        """
+        Applies an operation row by row. A row that changes the tree counts as a hit.
+        """
+        counters = self._counters
+        for row in rows:
+            changed = counters["nodes_changed"]
+            self._apply_operation(op, root, row)
+            if counters["nodes_changed"] > changed:
+                counters["hits"] += 1
+            else:
+                counters["misses"] += 1
+
+    def _apply_operation(self, op: Dict[str, Any], root: etree._Element, row: Dict[str, Optional[str]]):
         """
         Dispatches the operation to the correct handler based on 'type'.
 
         Args:
             op (Dict[str, Any]): Operation configuration.
             root (etree._Element): Root element of the XML tree.
-            row (pd.Series): Current row (from Excel).
+            row (Dict[str, Optional[str]]): Current row, sanitized at load (see CompiledPlan.records).
         """
         op_type = op.get("type")
         if op_type == "update":
@@ -203,6 +965,17 @@ class FieldTransformer:
         elif op_type == "replace_set":
             self._apply_replace_set(op, root, row)
             
+    def _record_unmatched(self, from_col: str, value: str):
+        """
+        Reports a value missing from the conversion table to the run's collector, if any.
+
+        Args:
+            from_col (str): Column the value was looked up in.
+            value (str): Sanitized XML value.
+        """
+        if self.plan.unmatched is not None and self._is_significant(value):
+            self.plan.unmatched.record(self.task_name, self.excel_filename, from_col, value, self.file_id)
+
     def _is_significant(self, value: str) -> bool:
         """
         Checks if a string contains meaningful (non-whitespace) content.
@@ -218,7 +991,8 @@ class FieldTransformer:
     
 
 
-    def _apply_replace_set(self, op: Dict[str, Any], root: etree._Element, row: pd.Series):
+    def _apply_replace_set(self, op: Dict[str, Any], root: etree._Element, row: pd.Series,
+                           resolved: Optional[Dict[str, Optional[str]]] = None):
         """
         Performs a 'replace_set' operation on the XML tree, replacing all existing
         child <value> elements at the target XPath with new values derived from
@@ -236,6 +1010,8 @@ class FieldTransformer:
             root (etree._Element): The root element of the XML tree to modify.
             row (pd.Series): The current row from the Excel DataFrame. Not used
                             for logging deduplication in this method.
+            resolved (Dict[str, Optional[str]], optional): Values already resolved for a
+                            batch of records (see CompiledPlan.resolve_replace_set).
         """
         # Normalize XPath and column references
         from_xpath = self._normalize_xpath(op["from"]["xpath"])
@@ -244,45 +1020,34 @@ class FieldTransformer:
         to_col = op["to"]["col"]
 
         collected_vals = []
-        
-        def _canon_for_match(s: str) -> str:
-            # 1) stringa
-            s = "" if s is None else str(s)
-            # 2) decodifica entità HTML/XML (es. &#x27; -> ')
-            s = html.unescape(s)
-            # 3) normalizzazione Unicode (NFKC gestisce accenti composti/decomposti)
-            s = unicodedata.normalize("NFKC", s)
-            # 4) uniforma apostrofi/virgolette “curve” a l'apostrofo semplice
-            s = re.sub(r"[’‘ʼ`´ˈʹ\u2019\u2018\u2032\u02BC]", "'", s)
-            # 5) sostituisci NBSP e compatta spazi
-            s = s.replace("\xa0", " ").strip()
-            s = re.sub(r"\s+", " ", s)
-            s = s.replace("&#x27;","'")
-            return s
 
         # Step 1: Collect all current values from the 'from' XPath
-        from_nodes = root.xpath(from_xpath)
+        from_nodes = self._xpath(root, from_xpath)
         for node in from_nodes:
             for val_node in self._extract_value_nodes(node):
                 raw_val = self._sanitize_for_xml(val_node.text or "")
                 if not raw_val:
                     continue
 
-
-                # Step 2: Map XML value to Excel 'to' column
-                #matches = self.df[self.df[from_col].astype(str) == raw_val]
-                raw_val_norm = _canon_for_match(raw_val)
-                df_from_norm = self.df[from_col].astype(str).map(_canon_for_match)
-                #print("xml", raw_val_norm, "excel", df_from_norm )
-                matches = self.df[df_from_norm.str.lower() == raw_val_norm.lower()]
-                if not matches.empty:
-                    mapped_val = self._sanitize_for_xml(matches[to_col].iloc[0])
-                    if self._is_significant(mapped_val):
-                        collected_vals.append(mapped_val)
+                # Step 2: Map XML value to Excel 'to' column (canonical, case-insensitive match)
+                if resolved is not None and raw_val in resolved:
+                    mapped_val = resolved[raw_val]
+                else:
+                    mapped_val = self.plan.replace_set_lookup(from_col, to_col, raw_val)
+                if mapped_val is None:
+                    self._counters["misses"] += 1
+                    if not self.plan.is_replace_set_target(from_col, to_col, raw_val):
+                        self._record_unmatched(from_col, raw_val)
+                else:
+                    self._counters["hits"] += 1
+                if mapped_val is not None and self.plan.is_significant(mapped_val):
+                    collected_vals.append(mapped_val)
 
         # Step 3: Replace all child <value> elements at 'to' XPath
-        to_nodes = root.xpath(to_xpath)
+        to_nodes = self._xpath(root, to_xpath)
         for node in to_nodes:
+            if collected_vals or len(node):
+                self._counters["nodes_changed"] += 1
             # Remove existing children
             for val_node in list(node):
                 node.remove(val_node)
@@ -308,213 +1073,98 @@ class FieldTransformer:
 
 
             
-    def _apply_update_quasi(self, op: Dict[str, Any], root: etree._Element, row: pd.Series):
+    def _apply_replace_set_general(self, op: Dict[str, Any], root: etree._Element,
+                                   resolved: Optional[Dict[str, Optional[str]]] = None):
         """
-        Update XML nodes based on Excel mappings, supporting multiple target values.
+        Runs a 'replace_set' operation in 'general' mode.
 
-        If 'from.col' appears multiple times in the Excel table with different 'to.col' values,
-        all corresponding values are appended to the target node, replacing the old values.
-
-        Steps:
-            1. Collect all <value> children from target nodes to log old values.
-            2. Remove existing <value> children from target nodes.
-            3. Append all mapped values from Excel for the current source.
-            4. Log each update for each old-new combination.
+        The row-by-row loop runs the operation once per Excel row, but the
+        operation ignores the row: as long as the values it writes are not read
+        back by its own 'from' XPath, every run after the first one leaves the
+        tree unchanged, so it is applied only once. Otherwise the remaining runs
+        are carried out as before.
 
         Args:
-            op (Dict[str, Any]): Operation definition from config JSON.
-            root (etree._Element): Root XML element to modify.
-            row (pd.Series): Current Excel row (used for fallback if from.col not defined).
+            op (Dict[str, Any]): The 'replace_set' operation configuration.
+            root (etree._Element): Root XML element.
+            resolved (Dict[str, Optional[str]], optional): Values already resolved for a batch.
         """
-        to_col = op["to"]["col"]
-        xpath_to = self._normalize_xpath(op["to"]["xpath"])
-
-        # ----------------------------------------------------------------------
-        # CASE 1 — 'from.col' is defined: use Excel mapping
-        # ----------------------------------------------------------------------
-        if "col" in op["from"]:
-            from_col = op["from"]["col"]
-            nodes_to = root.xpath(xpath_to)
-            if not nodes_to:
-                return
-
-            for node in nodes_to:
-                # Collect old values for logging
-                old_vals = [self._sanitize_for_xml(v.text or "") for v in self._extract_value_nodes(node)]
-                if not old_vals:
-                    continue
-
-                # Find all Excel rows matching any old value
-                mapped_values = []
-                for old_val in old_vals:
-                    matches = self.df[self.df[from_col].astype(str).str.lower() == old_val.lower()]
-                    mapped_values.extend([
-                        self._sanitize_for_xml(v)
-                        for v in matches[to_col].astype(str).tolist()
-                        if self._is_significant(str(v))
-                    ])
-
-                if not mapped_values:
-                    continue
-
-                # Remove all existing <value> children
-                for child in list(node):
-                    if child.tag == "value":
-                        node.remove(child)
-
-                # Append all mapped values
-                for new_val in mapped_values:
-                    new_elem = etree.Element("value")
-                    new_elem.text = new_val
-                    node.append(new_elem)
-                    # Log each old-new combination
-                    for old_val in old_vals:
-                        self.changelog.log_update(self.task_name, xpath_to, old_val, new_val)
-
-        # ----------------------------------------------------------------------
-        # CASE 2 — 'from.col' is not defined: fallback to XPath-only replacement
-        # ----------------------------------------------------------------------
-        else:
-            to_val_raw = row.get(to_col)
-            if pd.isna(to_val_raw):
-                return
-            to_val = self._sanitize_for_xml(to_val_raw)
-
-            xpath_from = self._normalize_xpath(op["from"]["xpath"])
-            nodes_from = root.xpath(xpath_from)
-            nodes_to = root.xpath(xpath_to)
-            if not nodes_from or not nodes_to:
-                return
-
-            first_node = nodes_from[0]
-            first_val_nodes = self._extract_value_nodes(first_node)
-            if not first_val_nodes:
-                return
-
-            old_val = self._sanitize_for_xml(first_val_nodes[0].text or "")
-            if old_val.lower() != to_val.lower():
-                for node in nodes_to:
-                    # Remove all existing <value> children
-                    for val_node in list(node):
-                        node.remove(val_node)
-                    # Append the new value
-                    new_elem = etree.Element("value")
-                    new_elem.text = to_val
-                    node.append(new_elem)
-                self.changelog.log_update(self.task_name, xpath_to, old_val, to_val)
-
-
-
-    
+        from_xpath = self._normalize_xpath(op["from"]["xpath"])
+        to_xpath = self._normalize_xpath(op["to"]["xpath"])
 
+        from_before = self._xpath(root, from_xpath)
+        to_before = self._xpath(root, to_xpath)
+        to_set = set(to_before)
+        reads_own_output = any(
+            node in to_set or any(anc in to_set for anc in node.iterancestors())
+            for node in from_before
+        )
 
+        self._apply_replace_set(op, root, None, resolved)
 
+        if (not reads_own_output
+                and self._xpath(root, from_xpath) == from_before
+                and self._xpath(root, to_xpath) == to_before):
+            return
+        for _ in range(len(self.plan.records) - 1):
+            self._apply_replace_set(op, root, None, resolved)
 
-    def _apply_update_new(self, op: Dict[str, Any], root: etree._Element, row: pd.Series):
+    def _apply_update_indexed(self, op_idx: int, op: Dict[str, Any], root: etree._Element,
+                              chains: Optional[Dict[str, List[Tuple[int, str, str]]]] = None):
         """
-        Enhanced update operation:
-        - If 'from.col' appears multiple times in the Excel mapping table with different 'to.col' values,
-        replaces the old <value> elements with all corresponding mapped values.
-        - Maintains the original logic and logging behavior otherwise.
+        Runs an 'update' operation with 'from.col' in 'general' mode using the
+        plan's value index instead of scanning every Excel row.
 
-        Steps:
-            1. Collect all 'to' values for matching 'from.col' values in Excel.
-            2. Remove existing <value> children in the target XPath nodes.
-            3. Append one new <value> element per mapped value.
-            4. Log each replacement in the changelog.
+        For each value node, the rows that would have rewritten it are found by
+        following the index in table order (a value rewritten by one row can be
+        matched again by a later row). The resulting changes are then applied and
+        logged in the same order as the row-by-row loop.
 
         Args:
-            op (Dict[str, Any]): Operation configuration.
+            op_idx (int): Position of the operation in the configuration.
+            op (Dict[str, Any]): The 'update' operation configuration.
             root (etree._Element): Root XML element.
-            row (pd.Series): Current Excel row (used for fallback when from.col not defined).
+            chains (Dict, optional): Chains already resolved for a batch of records
+                (see CompiledPlan.resolve_update_chains).
         """
-        to_col = op["to"]["col"]
+        if not self.plan.update_index(op_idx)[0]:
+            return
         xpath_to = self._normalize_xpath(op["to"]["xpath"])
+        nodes_to = self._xpath(root, xpath_to)
+        if not nodes_to:
+            return
 
-        # ----------------------------------------------------------------------
-        # CASE 1 — Mapping based on Excel 'from.col' values
-        # ----------------------------------------------------------------------
-        if "col" in op["from"]:
-            from_col = op["from"]["col"]
-
-            # Get all target nodes
-            nodes_to = root.xpath(xpath_to)
-            if not nodes_to:
-                return
-
-            for node in nodes_to:
-                for val_node in self._extract_value_nodes(node):
-                    old_val = self._sanitize_for_xml(val_node.text or "")
-                    if not old_val:
-                        continue
-
-                    # Find all Excel rows where 'from.col' matches this XML value
-                    matches = self.df[self.df[from_col].astype(str).str.lower() == old_val.lower()]
-                    if matches.empty:
-                        continue
-
-                    # Collect all corresponding 'to' values
-                    mapped_values = [
-                        self._sanitize_for_xml(v)
-                        for v in matches[to_col].astype(str).tolist()
-                        if self._is_significant(str(v))
-                    ]
-                    if not mapped_values:
-                        continue
-
-                    # --- Replace existing child <value> elements ---
-                    parent = val_node.getparent() or node
-                    # Remove all child <value> elements (complete replacement)
-                    for child in list(parent):
-                        if child.tag == "value":
-                            parent.remove(child)
-
-                    # Append new <value> elements
-                    for new_val in mapped_values:
-                        new_elem = etree.Element("value")
-                        new_elem.text = new_val
-                        parent.append(new_elem)
-                        self.changelog.log_update(
-                            self.task_name,
-                            xpath_to,
-                            old_val,
-                            new_val
-                        )
-
-        # ----------------------------------------------------------------------
-        # CASE 2 — 'from.col' not defined → fallback to XPath-based update
-        # ----------------------------------------------------------------------
-        else:
-            to_val_raw = row.get(to_col)
-            if pd.isna(to_val_raw):
-                return
-            to_val = self._sanitize_for_xml(to_val_raw)
-
-            xpath_from = self._normalize_xpath(op["from"]["xpath"])
-            nodes_from = root.xpath(xpath_from)
-            nodes_to = root.xpath(xpath_to)
-            if not nodes_from or not nodes_to:
-                return
-
-            first_node = nodes_from[0]
-            first_val_nodes = self._extract_value_nodes(first_node)
-            if not first_val_nodes:
-                return
-
-            old_val = self._sanitize_for_xml(first_val_nodes[0].text or "")
-            if old_val.lower() != to_val.lower():
-                for node in nodes_to:
-                    # Replace all children with a single new value
-                    for val_node in list(node):
-                        node.remove(val_node)
-                    new_elem = etree.Element("value")
-                    new_elem.text = to_val
-                    node.append(new_elem)
-                self.changelog.log_update(self.task_name, xpath_to, old_val, to_val)
-
-
-
-    def _apply_update(self, op: Dict[str, Any], root: etree._Element, row: pd.Series):
+        events = []
+        seen = set()
+        seq = 0
+        for node in nodes_to:
+            for val_node in self._extract_value_nodes(node):
+                if val_node in seen:
+                    continue
+                seen.add(val_node)
+                text = val_node.text or ""
+                if chains is not None and text in chains:
+                    chain = chains[text]
+                else:
+                    chain = self.plan.update_chain(op_idx, text)
+                if not chain:
+                    self._counters["misses"] += 1
+                    value = self._sanitize_for_xml(text)
+                    if not self.plan.is_update_known(op_idx, value):
+                        self._record_unmatched(op["from"]["col"], value)
+                else:
+                    self._counters["hits"] += 1
+                for pos, old_val, new_val in chain:
+                    events.append((pos, seq, val_node, old_val, new_val))
+                seq += 1
+
+        events.sort(key=lambda e: (e[0], e[1]))
+        self._counters["nodes_changed"] += len(events)
+        for _, _, val_node, old_val, new_val in events:
+            val_node.text = new_val
+            self.changelog.log_update(self.task_name, xpath_to, old_val, new_val)
+
+    def _apply_update(self, op: Dict[str, Any], root: etree._Element, row: Dict[str, Optional[str]]):
         """
         Updates existing values in the XML.
         - If 'from.col' is present: replaces occurrences of that value with the new one.
@@ -523,37 +1173,36 @@ class FieldTransformer:
         Args:
             op (Dict[str, Any]): Update operation definition.
             root (etree._Element): Root XML element.
-            row (pd.Series): Row from the Excel table.
+            row (Dict[str, Optional[str]]): Sanitized row from the Excel table.
         """
         # Get the "to" value (must always exist)
-        to_val_raw = row.get(op["to"]["col"])
-        if pd.isna(to_val_raw):
+        to_val = row.get(op["to"]["col"])
+        if to_val is None:
             return
-        to_val = self._sanitize_for_xml(to_val_raw)
 
         xpath_to = self._normalize_xpath(op["to"]["xpath"])
-        nodes_to = root.xpath(xpath_to)
+        nodes_to = self._xpath(root, xpath_to)
         if not nodes_to:
             return
 
         # CASE 1: "from" has col -> use Excel
         if "col" in op["from"]:
-            from_val_raw = row.get(op["from"]["col"])
-            if pd.isna(from_val_raw):
+            from_val = row.get(op["from"]["col"])
+            if from_val is None:
                 return
-            from_val = self._sanitize_for_xml(from_val_raw)
 
             for node in nodes_to:
                 for val_node in self._extract_value_nodes(node):
                     old_val = self._sanitize_for_xml(val_node.text or "")
                     if old_val.lower() == from_val.lower() and old_val.lower() != to_val.lower():
                         val_node.text = to_val
+                        self._counters["nodes_changed"] += 1
                         self.changelog.log_update(self.task_name, xpath_to, old_val, to_val)
 
         # CASE 2: "from" has no col -> use first value found in from.xpath
         else:
             xpath_from = self._normalize_xpath(op["from"]["xpath"])
-            nodes_from = root.xpath(xpath_from)
+            nodes_from = self._xpath(root, xpath_from)
             if not nodes_from:
                 return
 
@@ -569,21 +1218,21 @@ class FieldTransformer:
                 for node in nodes_to:
                     for val_node in self._extract_value_nodes(node):
                         val_node.text = to_val
+                        self._counters["nodes_changed"] += 1
                 self.changelog.log_update(self.task_name, xpath_to, old_val, to_val)
 
 
-    def _apply_add(self, op: Dict[str, Any], root: etree._Element, row: pd.Series):
+    def _apply_add(self, op: Dict[str, Any], root: etree._Element, row: Dict[str, Optional[str]]):
         """
         Adds a new element to the XML tree with the specified value.
 
         Args:
             op (Dict[str, Any]): Add operation definition.
             root (etree._Element): Root XML element.
-            row (pd.Series): Row from the Excel table.
+            row (Dict[str, Optional[str]]): Sanitized row from the Excel table.
         """
-        raw_val = row.get(op["to"]["col"])
-        to_val = self._sanitize_for_xml(raw_val)
-        if not self._is_significant(to_val):
+        to_val = row.get(op["to"]["col"])
+        if not self.plan.is_significant(to_val):
             return
 
         xpath = self._normalize_xpath(op["to"]["xpath"].strip()).rstrip("/")
@@ -594,14 +1243,15 @@ class FieldTransformer:
             raise ValueError(f"Invalid XPath: cannot extract tag name from '{xpath}'")
 
         is_fresh = op["to"].get("is_fresh", True)
-        parent_nodes = root.xpath(parent_path) or [root]
+        parent_nodes = self._xpath(root, parent_path) or [root]
         for parent in parent_nodes:
             new_elem = etree.Element(f"{{urn:fresh-enrichment:v1}}{tag}") if is_fresh else etree.Element(tag)
             new_elem.text = to_val
             parent.append(new_elem)
+            self._counters["nodes_changed"] += 1
             self.changelog.log_add(self.task_name, xpath, to_val)
 
-    def _apply_delete(self, op: Dict[str, Any], root: etree._Element, row: pd.Series):
+    def _apply_delete(self, op: Dict[str, Any], root: etree._Element, row: Dict[str, Optional[str]]):
         """
         Deletes elements matching the specified XPath,
         restricted to those whose text matches the 'from' column value.
@@ -613,11 +1263,10 @@ class FieldTransformer:
         expected_val = None
         if from_col:
             expected_val = row.get(from_col)
-            if pd.isna(expected_val):
+            if expected_val is None:
                 return
-            expected_val = self._sanitize_for_xml(str(expected_val))
 
-        nodes = root.xpath(xpath)
+        nodes = self._xpath(root, xpath)
         for node in nodes:
             for val_node in self._extract_value_nodes(node):
                 old_val = self._sanitize_for_xml(val_node.text or "")
@@ -627,6 +1276,7 @@ class FieldTransformer:
                     parent = val_node.getparent()
                     if parent is not None:
                         parent.remove(val_node)
+                        self._counters["nodes_changed"] += 1
                         self.changelog.log_delete(self.task_name, xpath, old_val)
 
     def _extract_value_nodes(self, node: etree._Element) -> List[etree._Element]:
@@ -0,0 +1,144 @@
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Log modes: every message, or only the warnings, errors and task summaries
+LOG_MODES = ("verbose", "quiet")
+
+
+class LogAggregator(logging.Filter):
+    """
+    Filter of the log records of a process, counting them per task.
+
+    Each record is tagged with the current task and XML file (shown in the
+    JSON log file) and counted by kind: task, logger, level and message
+    template (e.g. "Found TypeEnqueteFR/value: %s", whatever the value).
+    Whether it is shown depends on the mode:
+
+    - 'verbose': every message, except that with a rate limit, only the first
+      rate_limit messages of each kind are shown in a task;
+    - 'quiet': only the warnings (rate limited too) and errors.
+
+    Errors are always shown. At the end of each task, summary() gives the
+    counts of the task, including the messages that were not shown. Worker
+    processes hand their counts over to the parent with drain() and merge(),
+    so that the summaries cover the whole task.
+
+    Records logged outside a task (e.g. at startup) are always shown and not counted.
+    """
+
+    # Kinds listed in a task summary, among the ones with messages not shown
+    SUMMARY_KINDS = 5
+
+    def __init__(self, mode: str = "verbose", rate_limit: int = 0):
+        super().__init__()
+        self.mode = "verbose"
+        self.rate_limit = 0
+        self.configure(mode=mode, rate_limit=rate_limit)
+        # current task and XML file, set by the PipelineContext
+        self.task: Optional[str] = None
+        self.xml_file: Optional[str] = None
+        # (task, logger, level, message template) -> [messages, messages shown]
+        self._kinds: Dict[Tuple[str, str, str, str], List[int]] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, mode: Optional[str] = None, rate_limit: Optional[int] = None):
+        """
+        Updates the mode and the rate limit (None keeps the current value).
+
+        Raises:
+            ValueError: If the mode is unknown or the rate limit negative.
+        """
+        if mode is not None:
+            if mode not in LOG_MODES:
+                raise ValueError(f"Unknown log_mode '{mode}', expected one of {LOG_MODES}")
+            self.mode = mode
+        if rate_limit is not None:
+            if rate_limit < 0:
+                raise ValueError(f"log_rate_limit must be 0 or more, got {rate_limit}")
+            self.rate_limit = rate_limit
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """
+        Tags and counts a record, and tells whether it is shown.
+        """
+        if getattr(record, "task_summary", False):
+            return True
+        task = self.task
+        record.task = task
+        record.xml_file = self.xml_file
+        if task is None:
+            return True
+
+        key = (task, record.name, record.levelname, str(record.msg))
+        with self._lock:
+            counts = self._kinds.get(key)
+            if counts is None:
+                counts = self._kinds[key] = [0, 0]
+            counts[0] += 1
+            if record.levelno >= logging.ERROR:
+                shown = True
+            elif self.mode == "quiet" and record.levelno < logging.WARNING:
+                shown = False
+            else:
+                shown = not self.rate_limit or counts[1] < self.rate_limit
+            if shown:
+                counts[1] += 1
+        return shown
+
+    def drain(self) -> Dict[Tuple[str, str, str, str], List[int]]:
+        """
+        Returns the counts and forgets them. Used by worker processes to hand
+        their counts over to the parent's aggregator (see merge).
+        """
+        with self._lock:
+            kinds, self._kinds = self._kinds, {}
+        return kinds
+
+    def merge(self, kinds: Dict[Tuple[str, str, str, str], List[int]]):
+        """
+        Adds counts drained from another aggregator.
+        """
+        with self._lock:
+            for key, (count, shown) in kinds.items():
+                counts = self._kinds.setdefault(key, [0, 0])
+                counts[0] += count
+                counts[1] += shown
+
+    def summary(self, task: str) -> List[str]:
+        """
+        Returns the summary of a task (messages per level, messages not shown
+        and their most frequent kinds) and forgets its counts.
+        """
+        with self._lock:
+            kinds = {key: counts for key, counts in self._kinds.items() if key[0] == task}
+            for key in kinds:
+                del self._kinds[key]
+
+        levels: Dict[str, int] = {}
+        total = hidden = 0
+        for (_, _, level, _), (count, shown) in kinds.items():
+            levels[level] = levels.get(level, 0) + count
+            total += count
+            hidden += count - shown
+        per_level = ", ".join(f"{count} {level.lower()}" for level, count in sorted(levels.items()))
+        lines = [f"Task {task}: {total} log messages" + (f" ({per_level})" if per_level else "")
+                 + (f", {hidden} not shown" if hidden else "")]
+
+        not_shown = sorted(
+            ((count - shown, count, logger, level, template)
+             for (_, logger, level, template), (count, shown) in kinds.items() if count > shown),
+            reverse=True,
+        )
+        for missing, count, logger, level, template in not_shown[:self.SUMMARY_KINDS]:
+            lines.append(f"  {level} {logger}: '{template}' x{count} ({missing} not shown)")
+        if len(not_shown) > self.SUMMARY_KINDS:
+            lines.append(f"  ... and {len(not_shown) - self.SUMMARY_KINDS} more kinds of messages not shown")
+        return lines
+
+    def reset_after_fork(self):
+        """
+        Renews the lock and forgets the counts inherited by a forked worker process.
+        """
+        self._lock = threading.Lock()
+        self._kinds = {}
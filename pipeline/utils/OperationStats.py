@@ -0,0 +1,156 @@
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+# Counters collected by FieldTransformer for each operation applied to a record
+COUNTERS = ("xpath_evaluations", "nodes_visited", "hits", "misses", "nodes_changed")
+
+
+class OperationStats:
+    """
+    Run-wide, per-operation instrumentation of FieldTransformer.
+
+    For every task and configuration operation, the counters of all the records
+    are summed: number of records, wall time, XPath evaluations, nodes returned
+    by those evaluations, lookup hits and misses, and nodes changed.
+
+    Hits and misses count table lookups: one per XML value for 'replace_set'
+    operations and indexed 'general' updates (the value is found in the table
+    or not), one per Excel row for the other operations (the row changed the
+    tree or not).
+
+    Recording is thread-safe.
+    """
+
+    REPORT_FILENAME = "operation-stats.json"
+
+    def __init__(self):
+        # (task, conversion table, operation index) -> aggregated counters
+        self._operations: Dict[Tuple[str, str, int], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, task_name: str, excel_filename: str, op_idx: int, op: Dict[str, Any],
+               wall_time: float, counters: Dict[str, int], records: int = 1):
+        """
+        Adds the counters of one operation applied to one record.
+
+        Args:
+            task_name (str): Name of the task.
+            excel_filename (str): Conversion table of the operation.
+            op_idx (int): Position of the operation in the configuration.
+            op (Dict[str, Any]): Operation configuration.
+            wall_time (float): Elapsed time, in seconds.
+            counters (Dict[str, int]): Values of the COUNTERS.
+            records (int): Number of records the counters cover.
+        """
+        key = (task_name, excel_filename, op_idx)
+        with self._lock:
+            entry = self._operations.get(key)
+            if entry is None:
+                entry = {
+                    "task": task_name,
+                    "conversion_table": excel_filename,
+                    "operation": op_idx,
+                    "type": op.get("type"),
+                    "xpath": (op.get("to") or op.get("from") or {}).get("xpath"),
+                    "records": 0,
+                    "wall_time": 0.0,
+                    **{name: 0 for name in COUNTERS},
+                }
+                self._operations[key] = entry
+            entry["records"] += records
+            entry["wall_time"] += wall_time
+            for name in COUNTERS:
+                entry[name] += counters.get(name, 0)
+
+    def drain(self) -> List[Dict[str, Any]]:
+        """
+        Returns the aggregated entries and resets the counters. Used by worker
+        processes to hand their counters over to the parent's collector (see merge).
+        """
+        with self._lock:
+            entries, self._operations = list(self._operations.values()), {}
+        return entries
+
+    def reset_after_fork(self):
+        """
+        Renews the lock and forgets the counters inherited by a forked worker process.
+        The collector itself is kept, since the compiled plans hold it.
+        """
+        self._lock = threading.Lock()
+        self._operations = {}
+
+    def merge(self, entries: List[Dict[str, Any]]):
+        """
+        Adds entries drained from another collector.
+        """
+        with self._lock:
+            for entry in entries:
+                key = (entry["task"], entry["conversion_table"], entry["operation"])
+                current = self._operations.get(key)
+                if current is None:
+                    self._operations[key] = dict(entry)
+                    continue
+                for name in ("records", "wall_time", *COUNTERS):
+                    current[name] += entry[name]
+
+    def operations(self) -> List[Dict[str, Any]]:
+        """
+        Returns a copy of the aggregated entries, in the order they were first recorded.
+        """
+        with self._lock:
+            return [dict(entry, wall_time=round(entry["wall_time"], 6)) for entry in self._operations.values()]
+
+    def write_report(self, run_dir) -> Path:
+        """
+        Writes the aggregated counters as JSON in the run folder, grouped by task.
+
+        Args:
+            run_dir: Run folder.
+
+        Returns:
+            Path: Path of the report.
+        """
+        tasks: Dict[str, Dict[str, Any]] = {}
+        for entry in self.operations():
+            task = tasks.setdefault(entry["task"], {"wall_time": 0.0, "operations": []})
+            task["wall_time"] = round(task["wall_time"] + entry["wall_time"], 6)
+            task["operations"].append({k: v for k, v in entry.items() if k != "task"})
+
+        report_path = Path(run_dir) / self.REPORT_FILENAME
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump({"tasks": tasks}, f, ensure_ascii=False, indent=2)
+        return report_path
+
+    def summary(self, top: int = 10) -> List[str]:
+        """
+        Returns a short text summary: the slowest operations, and the operations
+        that never matched or changed anything during the run.
+
+        Args:
+            top (int): Number of operations to list in each section.
+
+        Returns:
+            List[str]: Summary lines.
+        """
+        operations = self.operations()
+        lines = [f"Slowest FieldTransformer operations (top {top}):"]
+        for entry in sorted(operations, key=lambda e: e["wall_time"], reverse=True)[:top]:
+            lines.append(
+                f"  {entry['task']} / {entry['conversion_table']} op {entry['operation']} ({entry['type']}): "
+                f"{entry['wall_time']:.3f}s over {entry['records']} records, "
+                f"{entry['xpath_evaluations']} XPath evaluations, {entry['hits']} hits, "
+                f"{entry['misses']} misses, {entry['nodes_changed']} nodes changed"
+            )
+        idle = [e for e in operations if e["hits"] == 0 and e["nodes_changed"] == 0]
+        if idle:
+            lines.append(f"Operations that never matched ({len(idle)}):")
+            for entry in idle[:top]:
+                lines.append(
+                    f"  {entry['task']} / {entry['conversion_table']} op {entry['operation']} "
+                    f"({entry['type']} {entry['xpath']})"
+                )
+            if len(idle) > top:
+                lines.append(f"  ... and {len(idle) - top} more (see {self.REPORT_FILENAME})")
+        return lines
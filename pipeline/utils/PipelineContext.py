@@ -1,9 +1,20 @@
 import logging
 import datetime
+import json
+import os
+import sqlite3
+import threading
 from pathlib import Path
 from pipeline.utils.load_config import load_config
-from pipeline.utils.logging import setup_logging
-from pipeline.utils.Changelog import Changelog  
+from pipeline.utils.logging import reset_logging_after_fork, setup_logging
+from pipeline.utils.Changelog import Changelog, VERBOSITIES
+from pipeline.utils.ChangelogWriter import ChangelogWriter
+from pipeline.utils.ChangelogStore import ChangelogStore, SHARDS_FOLDER, STORE_FILENAME
+from pipeline.utils.FieldTransformer import CompiledPlan, FusedPlan
+from pipeline.utils.UnmatchedValues import UnmatchedValues
+from pipeline.utils.OperationStats import OperationStats
+from pipeline.utils.TableCache import TableCache
+from pipeline.utils.EnrichmentBundle import EnrichmentBundle
 
 
 
@@ -13,11 +24,18 @@ class PipelineContext:
     for the current pipeline run, including individual changelogs
     for each XML file.
     """
-    def __init__(self):
-        
+    def __init__(self, run_dir=None, changelog_shard=False):
+        """
+        Args:
+            run_dir (optional): Existing run folder to attach to (used by the worker
+                processes). By default a new timestamped run folder is created.
+            changelog_shard (bool): Record the changelogs in a shard of the changelog
+                store of this process (used by the worker processes).
+        """
         # Load folder configuration
         self.folder_config = load_config("folders.yaml")
         self.api_config = load_config("api.yaml")
+        self.pipeline_config = load_config("pipeline.yaml") or {}
         self.original_folder = self.folder_config.get('input_files_folder')
         self.runs_folder = self.folder_config.get('runs_folder')
         self.conversion_tables_folder = self.folder_config.get('conversion_tables_folder')
@@ -28,8 +46,10 @@ class PipelineContext:
         self.icd_token = None
 
         # Create a unique folder for this run
-        datetime_str = "run" + datetime.datetime.now().strftime("-%Y%m%d-%H%M%S")
-        self.run_dir = Path(self.runs_folder) / datetime_str
+        if run_dir is None:
+            datetime_str = "run" + datetime.datetime.now().strftime("-%Y%m%d-%H%M%S")
+            run_dir = Path(self.runs_folder) / datetime_str
+        self.run_dir = Path(run_dir)
         self.run_dir.mkdir(parents=True, exist_ok=True)
         
         self.outputs_dir = self.run_dir / "outputs"
@@ -38,12 +58,51 @@ class PipelineContext:
         self.outputs_dir.mkdir(parents=True, exist_ok=True)
         self.changelogs_dir.mkdir(parents=True, exist_ok=True)
         
-        # Setup logging configuration
-        setup_logging()
+        # Setup logging configuration (pipeline.yaml 'log_mode', 'log_format', 'log_rate_limit')
+        self.log_aggregator = setup_logging(
+            mode=self.pipeline_config.get("log_mode", "verbose"),
+            log_format=self.pipeline_config.get("log_format", "text"),
+            rate_limit=self.pipeline_config.get("log_rate_limit", 0),
+        )
         self.logger = logging.getLogger(__name__)
 
         # Will hold Changelog instances per XML file
         self.changelogs = {}
+        # Writes the changelog lines in the background, through buffered files
+        self.changelog_writer = ChangelogWriter()
+        # Run-wide changelog store, replacing the per-file changelogs (pipeline.yaml 'changelog_store')
+        changelog_store = self.pipeline_config.get("changelog_store", "files")
+        if changelog_store not in ("files", "sqlite"):
+            raise ValueError(f"Unknown changelog_store '{changelog_store}', expected 'files' or 'sqlite'")
+        self.changelog_store = None
+        if changelog_store == "sqlite":
+            self.changelog_store = (
+                ChangelogStore(ChangelogStore.shard_path(self.run_dir), wal=False) if changelog_shard
+                else ChangelogStore(self.run_dir / STORE_FILENAME)
+            )
+        # Index of the current task in the run, ordering the changelog shards
+        self.changelog_epoch = 0
+        # What the changelogs record, per task (pipeline.yaml 'changelog_verbosity')
+        self.changelog_verbosities = self._load_changelog_verbosities()
+        self.changelog_verbosity = self.changelog_verbosities["default"]
+
+        # Excel tables read by the tasks, loaded once per run and shared by all records
+        self.table_cache = TableCache(sidecar_folders=[self.conversion_tables_folder, self.vocabs_folder])
+
+        # ID-keyed tables compiled into SQLite (see get_rows), opened on first use
+        self._enrichment_bundle = None
+        self._bundle_lock = threading.Lock()
+
+        # Compiled FieldTransformer plans, one per conversion table, shared by all records
+        self.compiled_plans = {}
+        self.fused_plans = {}
+        self._plans_lock = threading.Lock()
+
+        # Values missing from the conversion tables, reported with their closest matches at the end of the run
+        self.unmatched_values = UnmatchedValues()
+
+        # Per-operation FieldTransformer counters, aggregated across records
+        self.operation_stats = OperationStats()
 
     def get_run_dir(self):
         return self.run_dir
@@ -60,21 +119,154 @@ class PipelineContext:
     def get_vocabs_folder(self):
         return self.vocabs_folder
 
+    def _load_changelog_verbosities(self) -> dict:
+        """
+        Reads the 'changelog_verbosity' mapping of pipeline.yaml: task function
+        name -> "full", "summary" or "off", with a "default" entry (defaults to "full").
+
+        Raises:
+            ValueError: If a verbosity is unknown.
+        """
+        verbosities = {"default": "full", **(self.pipeline_config.get("changelog_verbosity") or {})}
+        for task_name, verbosity in verbosities.items():
+            if verbosity is False:
+                # YAML reads an unquoted 'off' as false
+                verbosity = verbosities[task_name] = "off"
+            if verbosity not in VERBOSITIES:
+                raise ValueError(
+                    f"Unknown changelog_verbosity '{verbosity}' for '{task_name}', expected one of {VERBOSITIES}"
+                )
+        return verbosities
+
+    def start_task(self, epoch: int, task_name: str):
+        """
+        Starts a task of the run (in the main process, or in a worker for each
+        chunk): sets the changelog epoch and verbosity, and the task the log
+        records are counted for.
+
+        Args:
+            epoch (int): Index of the task in the run.
+            task_name (str): Function name of the task.
+        """
+        self.set_changelog_epoch(epoch)
+        self.set_changelog_verbosity(task_name)
+        self.log_aggregator.task = f"{epoch + 1:02d}-{task_name}"
+
+    def end_task(self):
+        """
+        Ends the current task in the main process: logs its summary (messages
+        per level, and the ones not shown, see LogAggregator), including the
+        counts merged from the workers.
+        """
+        task, self.log_aggregator.task = self.log_aggregator.task, None
+        if task is not None:
+            for line in self.log_aggregator.summary(task):
+                self.logger.info(line, extra={"task_summary": True, "task": task})
+
+    def set_changelog_verbosity(self, task_name: str):
+        """
+        Sets the changelog verbosity of the current task (given by its function
+        name), applied to the changelogs by init_changelog_for_file (see start_task).
+        """
+        self.changelog_verbosity = self.changelog_verbosities.get(task_name, self.changelog_verbosities["default"])
+
     def init_changelog_for_file(self, xml_file: str):
         """
-        Initialize a changelog object for a given XML file if not already present.
+        Initialize a changelog object for a given XML file if not already present,
+        and apply the verbosity of the current task to it.
         """
         if xml_file not in self.changelogs:
             self.changelogs[xml_file] = Changelog(
                 xml_file=xml_file,
-                log_dir=self.changelogs_dir
+                log_dir=self.changelogs_dir,
+                writer=self.changelog_writer,
+                store=self.changelog_store
             )
+        self.changelogs[xml_file].verbosity = self.changelog_verbosity
+
+    def begin_record(self, xml_file: str):
+        """
+        Prepares the per-record state of an XML file before a task processes it
+        (its changelog, with the verbosity of the current task).
+        Each begin_record is paired with an end_record once the task is done with the file.
+
+        Returns:
+            Changelog: The changelog of the file.
+        """
+        self.init_changelog_for_file(xml_file)
+        self.log_aggregator.xml_file = xml_file
+        return self.changelogs[xml_file]
+
+    def end_record(self, xml_file: str):
+        """
+        Releases the per-record state of an XML file once a task is done with
+        it: the changes counted by a "summary" task are recorded and its
+        changelog is dropped (begin_record creates a new one for the next task,
+        appending to the same files). Only the records being processed are held
+        in memory, whatever the size of the corpus.
+        """
+        self.log_aggregator.xml_file = None
+        changelog = self.changelogs.pop(xml_file, None)
+        if changelog is not None:
+            changelog.flush_summary()
 
     def get_changelog(self, xml_file: str):
         """
         Returns the changelog object for the given file.
         """
         return self.changelogs.get(xml_file, None)
+
+    def flush_changelogs(self):
+        """
+        Writes the queued changelog lines (or store entries) to disk. Called at the end of each task
+        (and of each chunk in the worker processes), so that the changelogs on
+        disk are complete before another process appends to them.
+        The changes counted with the "summary" verbosity are recorded first.
+        """
+        if self.changelog_verbosity == "summary":
+            for changelog in self.changelogs.values():
+                changelog.flush_summary()
+        self.changelog_writer.flush()
+        if self.changelog_store is not None:
+            self.changelog_store.flush()
+
+    def set_changelog_epoch(self, epoch: int):
+        """
+        Sets the index of the current task in the run, recorded with each change
+        of the changelog store to merge the shards of the workers in order
+        (see start_task).
+        """
+        self.changelog_epoch = epoch
+        if self.changelog_store is not None:
+            self.changelog_store.epoch = epoch
+
+    def merge_changelog_shards(self) -> int:
+        """
+        Merges the changelog shards written by the worker processes into the
+        run's changelog store (see ChangelogStore.merge_shards).
+
+        Returns:
+            int: Number of changes merged.
+        """
+        shards_dir = self.run_dir / SHARDS_FOLDER
+        if self.changelog_store is None or not shards_dir.is_dir():
+            return 0
+        shards = sorted(shards_dir.glob("*.sqlite"))
+        count = self.changelog_store.merge_shards(shards)
+        if not any(shards_dir.iterdir()):
+            shards_dir.rmdir()
+        self.logger.info(f"Merged {count} changelog entries from {len(shards)} worker shards")
+        return count
+
+    def close_changelogs(self):
+        """
+        Writes the queued changelog lines and closes the changelog files, after
+        merging the workers' shards into the changelog store. Called at the end of the run.
+        """
+        self.changelog_writer.close()
+        if self.changelog_store is not None:
+            self.merge_changelog_shards()
+            self.changelog_store.close()
     
     def get_logger(self):
         return self.logger
@@ -82,3 +274,214 @@ class PipelineContext:
     def get_conversion_tables_folder(self):
         return self.conversion_tables_folder
 
+    def get_table(self, path, dtype=None, fillna=None, columns=None):
+        """
+        Returns an Excel table from the run's table cache, reading it from disk only
+        the first time (or after the file changed). The returned DataFrame can be
+        filtered freely but its cells are read-only.
+
+        Args:
+            path: Path of the Excel file.
+            dtype: Passed to the parser (e.g. str).
+            fillna: If not None, value used to fill the empty cells.
+            columns: If not None, only these columns are read (the others are skipped).
+        """
+        return self.table_cache.get(path, dtype=dtype, fillna=fillna, columns=columns)
+
+    def get_enrichment_bundle(self):
+        """
+        Returns the run's enrichment bundle (configs/pipeline.yaml 'enrichment_bundle'),
+        opening it on first use, or None if it is not configured or not built.
+        """
+        with self._bundle_lock:
+            if self._enrichment_bundle is None:
+                path = self.pipeline_config.get("enrichment_bundle")
+                bundle = False
+                if path and os.path.isfile(path):
+                    try:
+                        bundle = EnrichmentBundle(path)
+                        self.logger.info(f"Using enrichment bundle {path}")
+                    except (ValueError, sqlite3.Error) as e:
+                        self.logger.warning(f"Ignoring enrichment bundle {path}: {e}")
+                elif path:
+                    self.logger.info(f"No enrichment bundle at {path}, reading the workbooks")
+                self._enrichment_bundle = bundle
+            return self._enrichment_bundle or None
+
+    def get_rows(self, path, id_column: str, file_id: str, fillna=None, columns=None, strip=False):
+        """
+        Returns the rows of an ID-keyed table for one file ID, read as text (dtype=str).
+
+        The rows come from an indexed query on the enrichment bundle when the
+        workbook is bundled and unchanged since, and otherwise from the table
+        cache (the whole table is read, then filtered). Both give the same
+        DataFrame.
+
+        Args:
+            path: Path of the Excel file.
+            id_column (str): Column holding the IDs.
+            file_id (str): ID to look up.
+            fillna: If not None, value used to fill the empty cells.
+            columns: If not None, only these columns are returned.
+            strip (bool): Compare the IDs without their surrounding whitespace.
+        """
+        bundle = self.get_enrichment_bundle()
+        if bundle is not None and bundle.is_fresh(path):
+            return bundle.rows(path, file_id, columns=columns, fillna=fillna, strip=strip)
+
+        read_columns = None if columns is None else list(dict.fromkeys([*columns, id_column]))
+        df = self.table_cache.get(path, dtype=str, fillna=fillna, columns=read_columns)
+        ids = df[id_column].str.strip() if strip else df[id_column]
+        rows = df[ids == file_id]
+        if columns is not None:
+            wanted = set(columns)
+            rows = rows[[col for col in rows.columns if str(col) in wanted]]
+        return rows
+
+    def get_compiled_plan(self, excel_path: str) -> CompiledPlan:
+        """
+        Returns the compiled FieldTransformer plan for a conversion table,
+        building it on first use. Plans are shared across records and threads.
+        """
+        excel_filename = os.path.basename(excel_path)
+        with self._plans_lock:
+            if excel_filename not in self.compiled_plans:
+                self.compiled_plans[excel_filename] = CompiledPlan(
+                    excel_filename, tables=self.table_cache,
+                    unmatched=self.unmatched_values, stats=self.operation_stats,
+                )
+            return self.compiled_plans[excel_filename]
+
+    def collectors(self) -> dict:
+        """
+        Returns the run-wide collectors the compiled plans record into, by name
+        (see SharedTables).
+        """
+        return {"unmatched": self.unmatched_values, "stats": self.operation_stats}
+
+    def adopt_plans(self, plans):
+        """
+        Installs plans compiled by another process (see SharedTables), already
+        rebuilt with this context's collectors.
+
+        Args:
+            plans (Dict[str, CompiledPlan]): Plans by table filename.
+        """
+        with self._plans_lock:
+            self.compiled_plans.update(plans)
+
+    def warm_up(self) -> int:
+        """
+        Reads every workbook of the conversion tables and vocabularies folders as
+        text (the way the tasks read them), so that they are in memory before the
+        worker processes are forked. The compiled plans are built by compile_plans.
+
+        Returns:
+            int: Number of workbooks read.
+        """
+        count = 0
+        for folder in (self.conversion_tables_folder, self.vocabs_folder):
+            if folder and os.path.isdir(folder):
+                count += self.table_cache.preload(folder, dtype=str)
+        return count
+
+    def reset_after_fork(self):
+        """
+        Prepares a context inherited by a forked worker process: new locks (a lock
+        held by another thread of the parent when it forked would never be
+        released), its own changelog writer (and changelog store shard) and empty collectors, so that the
+        worker only hands over what it recorded itself.
+        """
+        self._plans_lock = threading.Lock()
+        self.table_cache._lock = threading.Lock()
+        self._bundle_lock = threading.Lock()
+        if self._enrichment_bundle:
+            self._enrichment_bundle.reset_after_fork()
+        # nor does its logging thread, nor the changelog writer thread
+        reset_logging_after_fork()
+        self.changelog_writer.abandon()
+        self.changelog_writer = ChangelogWriter()
+        if self.changelog_store is not None:
+            # the parent's connection cannot be used across a fork
+            self.changelog_store = ChangelogStore(ChangelogStore.shard_path(self.run_dir), wal=False)
+            self.changelog_store.epoch = self.changelog_epoch
+        self.changelogs = {}
+        # emptied in place: the inherited plans hold these collectors
+        self.unmatched_values.reset_after_fork()
+        self.operation_stats.reset_after_fork()
+
+    def get_fused_plan(self, *excel_paths: str) -> FusedPlan:
+        """
+        Returns a plan applying the given conversion tables one after the other
+        in a single pass, built from the shared compiled plans.
+        """
+        key = tuple(os.path.basename(excel_path) for excel_path in excel_paths)
+        plans = [self.get_compiled_plan(excel_path) for excel_path in key]
+        with self._plans_lock:
+            if key not in self.fused_plans:
+                self.fused_plans[key] = FusedPlan(plans)
+            return self.fused_plans[key]
+
+    def compile_plans(self, excel_paths) -> dict:
+        """
+        Builds and validates the plans of all the given conversion tables before
+        any record is processed, and writes 'compile-report.json' in the run folder.
+
+        Args:
+            excel_paths: Conversion tables used by the tasks of the run.
+
+        Returns:
+            dict: The compile report, one entry per conversion table.
+
+        Raises:
+            ValueError: If any table or configuration fails to compile.
+        """
+        report = {}
+        for excel_filename in dict.fromkeys(os.path.basename(p) for p in excel_paths):
+            try:
+                plan = self.get_compiled_plan(excel_filename)
+            except (FileNotFoundError, ValueError, KeyError) as e:
+                entry = {"errors": [f"{type(e).__name__}: {e}"], "warnings": []}
+            else:
+                entry = plan.describe()
+                entry["errors"], entry["warnings"] = plan.validate()
+            report[excel_filename] = entry
+
+        report_path = self.run_dir / "compile-report.json"
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+        failed = [name for name, entry in report.items() if entry["errors"]]
+        for name, entry in report.items():
+            for warning in entry["warnings"]:
+                self.logger.warning(f"{name}: {warning}")
+            for error in entry["errors"]:
+                self.logger.error(f"{name}: {error}")
+        if failed:
+            raise ValueError(
+                f"{len(failed)} conversion table(s) failed to compile: {', '.join(failed)}. "
+                f"See {report_path}"
+            )
+        self.logger.info(f"Compiled {len(report)} conversion tables, report saved to {report_path}")
+        return report
+
+    def write_unmatched_report(self, top_k: int = 5):
+        """
+        Writes the values missing from the conversion tables, with their top-k
+        approximate matches, to 'unmatched-values.csv' in the run folder.
+        """
+        report_path = self.unmatched_values.write_report(self.run_dir, self.compiled_plans, top_k=top_k)
+        self.logger.info(f"{len(self.unmatched_values)} unmatched values, report saved to {report_path}")
+        return report_path
+
+    def write_operation_stats(self):
+        """
+        Writes the per-operation FieldTransformer counters to 'operation-stats.json'
+        in the run folder and logs a summary (slowest operations, operations that
+        never matched).
+        """
+        report_path = self.operation_stats.write_report(self.run_dir)
+        for line in self.operation_stats.summary():
+            self.logger.info(line)
+        self.logger.info(f"Operation stats saved to {report_path}")
+        return report_path
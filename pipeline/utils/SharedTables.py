@@ -0,0 +1,293 @@
+import io
+import operator
+import pickle
+from bisect import bisect_left
+from collections.abc import Mapping
+from multiprocessing import shared_memory
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Out-of-band buffers are aligned on this boundary inside the segment
+_ALIGNMENT = 64
+
+# Segments attached by this process, kept open while the plans point into them
+_attached: List[shared_memory.SharedMemory] = []
+
+
+def _aligned(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+class StringColumn:
+    """
+    Read-only sequence of strings stored as one UTF-8 blob and the offsets of
+    each string in it (None values are flagged in a mask). It pickles into flat
+    numpy buffers, so that SharedTables publishes it out-of-band and workers
+    read the strings straight from the shared pages.
+    """
+
+    def __init__(self, values: Iterable[Optional[str]]):
+        values = list(values)
+        encoded = [b"" if value is None else value.encode("utf-8", "surrogatepass") for value in values]
+        self.offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(data) for data in encoded], out=self.offsets[1:])
+        self.blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        missing = np.fromiter((value is None for value in values), dtype=bool, count=len(values))
+        self.missing = missing if missing.any() else None
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i) -> Optional[str]:
+        i = operator.index(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("StringColumn index out of range")
+        if self.missing is not None and self.missing[i]:
+            return None
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8", "surrogatepass")
+
+    def __iter__(self) -> Iterator[Optional[str]]:
+        for i in range(len(self)):
+            yield self[i]
+
+
+class PositionLists:
+    """
+    Read-only sequence of row position lists, packed into one int64 array and
+    the offsets of each list in it. Items are numpy views on the packed array.
+    """
+
+    def __init__(self, lists: Iterable[Sequence[int]]):
+        lists = list(lists)
+        self.offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+        np.cumsum([len(positions) for positions in lists], out=self.offsets[1:])
+        self.positions = (
+            np.concatenate([np.asarray(positions, dtype=np.int64) for positions in lists])
+            if lists else np.zeros(0, dtype=np.int64)
+        )
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i) -> np.ndarray:
+        i = operator.index(i)
+        if not 0 <= i < len(self):
+            raise IndexError("PositionLists index out of range")
+        return self.positions[self.offsets[i]:self.offsets[i + 1]]
+
+
+class SharedSet:
+    """
+    Read-only set of strings, kept sorted in a StringColumn and searched by bisection.
+    """
+
+    def __init__(self, values: Iterable[str]):
+        self._values = StringColumn(sorted(set(values)))
+
+    def __contains__(self, value) -> bool:
+        if not isinstance(value, str):
+            return False
+        i = bisect_left(self._values, value)
+        return i < len(self._values) and self._values[i] == value
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._values)
+
+
+class SharedMap(Mapping):
+    """
+    Read-only mapping with string keys, stored as a sorted StringColumn of keys
+    searched by bisection and a packed sequence of values (StringColumn for
+    strings, PositionLists for row positions). Iteration follows the key order.
+    """
+
+    def __init__(self, mapping: Dict[str, Any], pack=StringColumn):
+        """
+        Args:
+            mapping (Dict[str, Any]): Mapping to pack.
+            pack: Sequence type the values are packed into (StringColumn or PositionLists).
+        """
+        keys = sorted(mapping)
+        self._keys = StringColumn(keys)
+        self._values = pack([mapping[key] for key in keys])
+
+    def _position(self, key) -> int:
+        if isinstance(key, str):
+            i = bisect_left(self._keys, key)
+            if i < len(self._keys) and self._keys[i] == key:
+                return i
+        return -1
+
+    def __getitem__(self, key):
+        i = self._position(key)
+        if i < 0:
+            raise KeyError(key)
+        return self._values[i]
+
+    def __contains__(self, key) -> bool:
+        return self._position(key) >= 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def values(self) -> Iterator[Any]:
+        return (self._values[i] for i in range(len(self._values)))
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        return zip(self._keys, self.values())
+
+
+class SharedRecords:
+    """
+    Read-only sequence of table rows as dicts (column -> string or None), stored
+    column by column in StringColumns. Each row is rebuilt when it is accessed.
+    """
+
+    def __init__(self, columns: List[str], records: List[Dict[str, Optional[str]]]):
+        """
+        Args:
+            columns (List[str]): Columns of the rows, in order.
+            records (List[Dict[str, Optional[str]]]): Rows to pack.
+        """
+        self._length = len(records)
+        self._columns = [(column, StringColumn(record[column] for record in records)) for column in columns]
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, pos) -> Dict[str, Optional[str]]:
+        return {column: values[pos] for column, values in self._columns}
+
+    def __iter__(self) -> Iterator[Dict[str, Optional[str]]]:
+        for pos in range(self._length):
+            yield self[pos]
+
+
+class SharedTables:
+    """
+    The run's compiled conversion tables, published once into a shared memory
+    segment for the worker processes.
+
+    The parent pickles every CompiledPlan (already read, sanitized and indexed)
+    with pickle protocol 5 into a single multiprocessing.shared_memory segment.
+    A plan's rows, value maps and value sets are pickled in the columnar layout
+    above (StringColumn, PositionLists, SharedSet, SharedMap, SharedRecords),
+    whose numpy buffers are stored out-of-band; only the configuration and the
+    small per-plan bookkeeping are stored in-band. Workers attach to the segment
+    by name: the buffers are read-only views on the shared pages (no copy), and
+    lookups read the keys and values from them, without reading any workbook or
+    building any index again.
+
+    Attributes:
+        handle (Tuple[str, Dict]): Picklable description of the segment (name and
+            layout), passed to the workers so that they can attach.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, layout: Dict[str, Tuple[Tuple[int, int], List[Tuple[int, int]]]]):
+        self._shm = shm
+        self.layout = layout
+        self.handle = (shm.name, layout)
+
+    @classmethod
+    def publish(cls, plans: Dict[str, object], collectors: Dict[str, object]) -> "SharedTables":
+        """
+        Creates the segment holding the given plans.
+
+        The run-wide collectors the plans refer to are not copied into the segment:
+        they are pickled as references (by name), which attach resolves to the
+        worker's own collectors.
+
+        Args:
+            plans (Dict[str, CompiledPlan]): Compiled plans, by table filename.
+            collectors (Dict[str, object]): Run-wide collectors of the parent, by name
+                (see PipelineContext.collectors).
+
+        Returns:
+            SharedTables: Owner of the segment (see close).
+        """
+        names = {id(collector): name for name, collector in collectors.items()}
+        payloads = {}
+        size = 0
+        for name, plan in plans.items():
+            buffers: List[pickle.PickleBuffer] = []
+            stream = io.BytesIO()
+            pickler = pickle.Pickler(stream, protocol=5, buffer_callback=buffers.append)
+            pickler.persistent_id = lambda obj: names.get(id(obj))
+            pickler.dump(plan)
+            data = stream.getvalue()
+            raws = [buffer.raw() for buffer in buffers]
+            payloads[name] = (data, raws)
+            size = _aligned(size + len(data))
+            for raw in raws:
+                size = _aligned(size + raw.nbytes)
+
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        layout = {}
+        offset = 0
+        for name, (data, raws) in payloads.items():
+            shm.buf[offset:offset + len(data)] = data
+            data_span = (offset, len(data))
+            offset = _aligned(offset + len(data))
+            spans = []
+            for raw in raws:
+                shm.buf[offset:offset + raw.nbytes] = raw
+                spans.append((offset, raw.nbytes))
+                offset = _aligned(offset + raw.nbytes)
+            layout[name] = (data_span, spans)
+            for raw in raws:
+                raw.release()
+        return cls(shm, layout)
+
+    @staticmethod
+    def attach(handle: Tuple[str, Dict], collectors: Dict[str, object]) -> Dict[str, object]:
+        """
+        Attaches to a published segment and returns its plans. Called in the workers.
+
+        The segment stays mapped for the life of the process, since the plans' arrays
+        point into it.
+
+        Args:
+            handle (Tuple[str, Dict]): SharedTables.handle of the parent.
+            collectors (Dict[str, object]): Run-wide collectors of the worker, by name,
+                given to the plans in place of the parent's.
+
+        Returns:
+            Dict[str, CompiledPlan]: The plans, by table filename.
+        """
+        name, layout = handle
+        # workers share the parent's resource tracker, so the segment is only
+        # unlinked by the parent (close) or when the whole run exits
+        shm = shared_memory.SharedMemory(name=name)
+        _attached.append(shm)
+        view = shm.buf.toreadonly()
+
+        plans = {}
+        for table, ((offset, length), spans) in layout.items():
+            buffers = [view[start:start + nbytes] for start, nbytes in spans]
+            unpickler = pickle.Unpickler(io.BytesIO(view[offset:offset + length]), buffers=buffers)
+            unpickler.persistent_load = collectors.__getitem__
+            plans[table] = unpickler.load()
+        return plans
+
+    @property
+    def size(self) -> int:
+        """
+        Size of the segment, in bytes.
+        """
+        return self._shm.size
+
+    def close(self):
+        """
+        Releases and removes the segment. Called by the parent once the workers are done.
+        """
+        self._shm.close()
+        self._shm.unlink()
@@ -0,0 +1,159 @@
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from pipeline.utils.excel_loader import read_workbook
+from pipeline.utils.excel_sidecar import read_excel_with_sidecar
+
+
+def _freeze(option: Any) -> Any:
+    """
+    Returns a hashable form of a read option (e.g. a dtype dict), for use in cache keys.
+    """
+    if isinstance(option, dict):
+        return tuple(sorted((str(k), _freeze(v)) for k, v in option.items()))
+    if isinstance(option, (list, set)):
+        return tuple(_freeze(v) for v in option)
+    return option
+
+
+def _read_only(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Rebuilds a DataFrame on read-only copies of its columns, so that in-place
+    writes (df.loc[...] = ..., df.iloc[...] = ...) raise instead of silently
+    changing a table shared by every record.
+    """
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if not isinstance(series.dtype, np.dtype):
+            # extension dtypes (nullable integers, categoricals...) are kept as a copy
+            columns[col] = series.copy()
+            continue
+        values = series.to_numpy(copy=True)
+        values.flags.writeable = False
+        columns[col] = values
+    frozen = pd.DataFrame(columns, index=df.index, copy=False)
+    frozen.columns = df.columns
+    return frozen
+
+
+class TableCache:
+    """
+    Process-wide cache of the Excel tables read by the tasks.
+
+    Each workbook is read once per (path, modification time, dtype, columns) and
+    each fillna variant is derived once from it, instead of once per record.
+    Workbooks are streamed with excel_loader.read_workbook, which only parses the
+    requested columns. Callers
+    get a shallow copy over read-only columns: they can filter it or replace
+    whole columns (df[col] = ...), which only affects their copy, but writing
+    into the cells raises ValueError.
+
+    A column projection is derived from the whole table when it is already
+    cached with the same dtype (see preload), instead of reading the workbook again.
+
+    A table whose file changes on disk is read again on the next request.
+    Workbooks inside the sidecar folders are read through their binary sidecar
+    (see excel_sidecar), which persists across runs and worker processes.
+    The cache is thread-safe.
+    """
+
+    def __init__(self, sidecar_folders=()):
+        """
+        Args:
+            sidecar_folders: Folders whose workbooks are read through a sidecar
+                (the conversion tables and vocabularies).
+        """
+        # (path, mtime, dtype, columns, fillna) -> read-only DataFrame
+        self._tables: Dict[Tuple, pd.DataFrame] = {}
+        self._lock = threading.Lock()
+        self.sidecar_folders = [os.path.abspath(str(folder)) for folder in sidecar_folders if folder]
+        self.reads = 0
+
+    def _read(self, path: str, dtype, columns) -> pd.DataFrame:
+        """
+        Reads a workbook from disk, through its sidecar when it lies in a sidecar folder.
+        """
+        self.reads += 1
+        if any(os.path.dirname(path) == folder for folder in self.sidecar_folders):
+            return read_excel_with_sidecar(path, dtype=dtype, columns=columns)
+        return read_workbook(path, columns=columns, dtype=dtype)
+
+    def get(self, path, dtype=None, fillna=None, columns=None) -> pd.DataFrame:
+        """
+        Returns a table, reading it only if it is not cached for its current mtime.
+
+        Args:
+            path: Path of the Excel file.
+            dtype: Passed to the parser (e.g. str to read every cell as text).
+            fillna: If not None, value used to fill the empty cells.
+            columns: If not None, names of the columns to read; the other columns
+                are skipped, and requested columns missing from the workbook are ignored.
+
+        Returns:
+            pd.DataFrame: Shallow copy of the cached table, over read-only columns.
+
+        Raises:
+            FileNotFoundError: If the file does not exist.
+        """
+        path = os.path.abspath(str(path))
+        mtime = os.stat(path).st_mtime_ns
+        columns = None if columns is None else tuple(columns)
+        raw_key = (path, mtime, _freeze(dtype), columns, None)
+        key = (path, mtime, _freeze(dtype), columns, _freeze(fillna))
+        full_key = (path, mtime, _freeze(dtype), None, None)
+
+        with self._lock:
+            table = self._tables.get(key)
+            if table is None:
+                # Drop the versions of this file read before it changed
+                for stale in [k for k in self._tables if k[0] == path and k[1] != mtime]:
+                    del self._tables[stale]
+
+                raw = self._tables.get(raw_key)
+                if raw is None:
+                    full = self._tables.get(full_key)
+                    if full is not None:
+                        # same columns, in workbook order, as a projected read
+                        wanted = set(columns)
+                        raw = _read_only(full[[col for col in full.columns if str(col) in wanted]])
+                    else:
+                        raw = _read_only(self._read(path, dtype, columns))
+                    self._tables[raw_key] = raw
+                table = raw if fillna is None else _read_only(raw.fillna(fillna))
+                self._tables[key] = table
+
+        return table.copy(deep=False)
+
+    def preload(self, folder, dtype=None) -> int:
+        """
+        Reads every workbook of a folder, with all its columns. Later requests
+        with the same dtype, whatever their columns and fillna options, are then
+        served from memory.
+
+        Args:
+            folder: Folder of the workbooks.
+            dtype: Read option (e.g. str).
+
+        Returns:
+            int: Number of workbooks read.
+        """
+        count = 0
+        for path in sorted(Path(folder).glob("*.xlsx")):
+            # skip the lock files Excel leaves next to open workbooks
+            if not path.name.startswith("~$"):
+                self.get(path, dtype=dtype)
+                count += 1
+        return count
+
+    def clear(self):
+        """
+        Drops all cached tables.
+        """
+        with self._lock:
+            self._tables.clear()
@@ -0,0 +1,118 @@
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+class TrigramIndex:
+    """
+    Approximate string matching over a fixed list of candidate values.
+
+    Each candidate is split into character trigrams (padded at both ends, so
+    that short values and word boundaries still produce grams), and an inverted
+    index maps every trigram to the candidates containing it. A query only
+    touches the candidates sharing at least one trigram with it; they are
+    scored with the Dice coefficient on trigram sets:
+
+        score = 2 * |shared trigrams| / (|query trigrams| + |candidate trigrams|)
+
+    Attributes:
+        values (List[str]): Distinct candidate values, in insertion order.
+        normalize (Callable[[str], str]): Normalization applied to candidates and queries.
+    """
+
+    def __init__(self, values: Iterable[str], normalize: Optional[Callable[[str], str]] = None):
+        """
+        Builds the index.
+
+        Args:
+            values (Iterable[str]): Candidate values (duplicates and empty values are ignored).
+            normalize (Callable[[str], str], optional): Normalization applied before
+                splitting into trigrams. Defaults to lowercasing.
+        """
+        self.normalize = normalize or str.lower
+        self.values: List[str] = []
+
+        seen = set()
+        postings: Dict[str, List[int]] = {}
+        sizes = []
+        for value in values:
+            if not value:
+                continue
+            key = self.normalize(value)
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            grams = self.trigrams(key)
+            candidate = len(self.values)
+            self.values.append(value)
+            sizes.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(candidate)
+
+        self._postings = {gram: np.asarray(ids, dtype=np.int32) for gram, ids in postings.items()}
+        self._sizes = np.asarray(sizes, dtype=np.float64)
+
+    @staticmethod
+    def trigrams(key: str) -> set:
+        """
+        Returns the set of character trigrams of a normalized value.
+        """
+        padded = f"  {key} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def search(self, value: str, k: int = 5, min_score: float = 0.0) -> List[Tuple[str, float]]:
+        """
+        Returns the k candidates closest to a value.
+
+        Args:
+            value (str): Value to match.
+            k (int): Maximum number of candidates.
+            min_score (float): Candidates scoring below this threshold are dropped.
+
+        Returns:
+            List[Tuple[str, float]]: (candidate, score) pairs, best first.
+        """
+        if not self.values:
+            return []
+        grams = self.trigrams(self.normalize(value))
+        hits = [self._postings[gram] for gram in grams if gram in self._postings]
+        if not hits:
+            return []
+
+        shared = np.bincount(np.concatenate(hits), minlength=len(self.values))
+        candidates = np.flatnonzero(shared)
+        scores = 2.0 * shared[candidates] / (len(grams) + self._sizes[candidates])
+
+        if len(candidates) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            candidates, scores = candidates[top], scores[top]
+        order = np.lexsort((candidates, -scores))
+        return [
+            (self.values[candidates[i]], round(float(scores[i]), 4))
+            for i in order
+            if scores[i] >= min_score
+        ]
+
+    def search_many(self, values: Iterable[str], k: int = 5,
+                    min_score: float = 0.0) -> Dict[str, List[Tuple[str, float]]]:
+        """
+        Matches many values, searching each distinct normalized value only once.
+
+        Args:
+            values (Iterable[str]): Values to match.
+            k (int): Maximum number of candidates per value.
+            min_score (float): Candidates scoring below this threshold are dropped.
+
+        Returns:
+            Dict[str, List[Tuple[str, float]]]: Candidates of each value.
+        """
+        results: Dict[str, List[Tuple[str, float]]] = {}
+        by_key: Dict[str, List[Tuple[str, float]]] = {}
+        for value in values:
+            if value in results:
+                continue
+            key = self.normalize(value)
+            if key not in by_key:
+                by_key[key] = self.search(value, k, min_score)
+            results[value] = by_key[key]
+        return results
@@ -0,0 +1,115 @@
+import csv
+import threading
+from pathlib import Path
+from typing import Dict, Tuple
+
+from pipeline.utils.FieldTransformer import _canon_for_match, _sanitize_for_xml
+from pipeline.utils.TrigramIndex import TrigramIndex
+
+
+class UnmatchedValues:
+    """
+    Run-wide collector of the XML values that a conversion table could not map.
+
+    FieldTransformer records a value when it misses the table lookup of a
+    'replace_set' operation or of an indexed 'general' update (values already
+    equal to a target value of the table are not misses). At the end of the run,
+    write_report matches every distinct value against the table's 'from' column
+    with a TrigramIndex and writes the closest candidates, so that curators can
+    complete the tables.
+
+    Recording is thread-safe.
+    """
+
+    REPORT_FILENAME = "unmatched-values.csv"
+
+    def __init__(self):
+        # (task, conversion table, 'from' column, value) -> file IDs of the records
+        self._values: Dict[Tuple[str, str, str, str], set] = {}
+        self._lock = threading.Lock()
+
+    def record(self, task_name: str, excel_filename: str, from_col: str, value: str, file_id: str):
+        """
+        Records a value missing from a conversion table.
+
+        Args:
+            task_name (str): Name of the task applying the table.
+            excel_filename (str): Filename of the conversion table.
+            from_col (str): Column the value was looked up in.
+            value (str): Sanitized XML value.
+            file_id (str): Identifier of the record holding the value.
+        """
+        key = (task_name, excel_filename, from_col, value)
+        with self._lock:
+            self._values.setdefault(key, set()).add(file_id)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def drain(self) -> Dict[Tuple[str, str, str, str], set]:
+        """
+        Returns the recorded values and forgets them. Used by worker processes to
+        hand their values over to the parent's collector (see merge).
+        """
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def reset_after_fork(self):
+        """
+        Renews the lock and forgets the values inherited by a forked worker process.
+        The collector itself is kept, since the compiled plans hold it.
+        """
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def merge(self, values: Dict[Tuple[str, str, str, str], set]):
+        """
+        Adds values drained from another collector.
+        """
+        with self._lock:
+            for key, file_ids in values.items():
+                self._values.setdefault(key, set()).update(file_ids)
+
+    def write_report(self, run_dir, plans: Dict[str, object], top_k: int = 5) -> Path:
+        """
+        Writes the unmatched values and their top-k candidate matches as CSV in the run folder.
+
+        Each row holds one candidate of one value (rank 1 is the best); values without
+        any candidate sharing a trigram get a single row with empty candidate and score.
+
+        Args:
+            run_dir: Run folder.
+            plans (Dict[str, CompiledPlan]): Compiled plans of the run, by table filename.
+            top_k (int): Number of candidates per value.
+
+        Returns:
+            Path: Path of the report.
+        """
+        with self._lock:
+            values = {key: len(file_ids) for key, file_ids in self._values.items()}
+
+        grouped: Dict[Tuple[str, str], list] = {}
+        for (task_name, excel_filename, from_col, value), records in values.items():
+            grouped.setdefault((excel_filename, from_col), []).append((task_name, value, records))
+
+        report_path = Path(run_dir) / self.REPORT_FILENAME
+        with open(report_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["task", "conversion_table", "column", "value", "records", "rank", "candidate", "score"])
+            for (excel_filename, from_col), entries in sorted(grouped.items()):
+                plan = plans.get(excel_filename)
+                if plan is not None and from_col in plan.df.columns:
+                    candidates = plan.df[from_col].dropna().astype(str).map(_sanitize_for_xml)
+                    index = TrigramIndex(candidates, normalize=lambda s: _canon_for_match(s).lower())
+                    matches = index.search_many((value for _, value, _ in entries), k=top_k)
+                else:
+                    matches = {}
+                for task_name, value, records in sorted(entries, key=lambda e: (e[0], -e[2], e[1])):
+                    row = [task_name, excel_filename, from_col, value, records]
+                    found = matches.get(value) or []
+                    if not found:
+                        writer.writerow(row + ["", "", ""])
+                    for rank, (candidate, score) in enumerate(found, start=1):
+                        writer.writerow(row + [rank, candidate, score])
+        return report_path
@@ -0,0 +1,263 @@
+import gc
+import math
+import multiprocessing
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+from pipeline.utils.SharedTables import SharedTables
+from pipeline.utils.logging import flush_logging
+
+# Worker start modes (configs/pipeline.yaml 'start_method')
+START_METHODS = ("spawn", "prefork")
+
+# State of a worker process, set by _init_worker
+_worker_context = None
+
+
+def _init_worker(run_dir: str, handle):
+    """
+    Initializes a worker process: a PipelineContext on the parent's run folder,
+    recording its changelogs in its own shard of the changelog store, with the
+    compiled plans attached from the shared memory segment.
+    """
+    global _worker_context
+    from pipeline.utils.PipelineContext import PipelineContext
+
+    _worker_context = PipelineContext(run_dir=run_dir, changelog_shard=True)
+    if handle is not None:
+        _worker_context.adopt_plans(SharedTables.attach(handle, _worker_context.collectors()))
+
+
+def _init_forked_worker(context):
+    """
+    Initializes a prefork worker process: the parent's warm context is inherited
+    (copy-on-write), only its locks and collectors are renewed.
+    """
+    global _worker_context
+    context.reset_after_fork()
+    _worker_context = context
+
+
+def _memory_usage(pid: int) -> Dict[str, int]:
+    """
+    Returns the memory of a process from /proc/<pid>/smaps_rollup (Linux), in kB:
+    'rss', 'pss' (shared pages split between the processes sharing them) and
+    'uss' (private pages, i.e. what the process costs on its own).
+    """
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def _run_chunk(runner: Callable, task: Callable, xml_files: List[str], input_folder, output_folder,
+               kwargs: Dict[str, Any], epoch: int = 0, batch_task: Optional[Callable] = None):
+    """
+    Runs a task on a chunk of files in a worker (the whole chunk in one call
+    with the task's batch function, if any), then hands the worker's
+    unmatched values, operation counters and log counts over to the parent,
+    with the worker's PID. The chunk's changelog lines and log records are on
+    disk when it returns.
+    """
+    context = _worker_context
+    context.start_task(epoch, task.__name__)
+    if batch_task is not None:
+        batch_task(xml_files, input_folder=input_folder, output_folder=output_folder, context=context, **kwargs)
+    else:
+        for xml_file in xml_files:
+            context.begin_record(xml_file)
+            try:
+                runner(task, xml_file, input_folder=input_folder, output_folder=output_folder, context=context, **kwargs)
+            finally:
+                context.end_record(xml_file)
+    context.flush_changelogs()
+    # the worker may exit without running the atexit hooks
+    flush_logging()
+    return (
+        context.unmatched_values.drain(), context.operation_stats.drain(), context.log_aggregator.drain(), os.getpid()
+    )
+
+
+class WorkerPool:
+    """
+    Pool of worker processes running the tasks on the records in parallel.
+
+    Tasks still run one after the other; within a task, the XML files are split
+    into chunks processed by the workers, and the task ends when every chunk is
+    done. Each file is processed by a single worker per task, so its changelog
+    is written in the same order as in a sequential run.
+
+    Two start modes are available:
+
+    - 'spawn': fresh worker processes. The compiled conversion tables of the
+      parent are published once in shared memory (see SharedTables) and
+      attached by every worker, instead of each worker reading and indexing
+      every workbook again. Other tables are read by each worker.
+    - 'prefork': the parent warms up (compiled plans, every conversion table
+      and vocabulary) and then forks the workers, which share the warm state
+      copy-on-write. gc.freeze() is called before forking so that the garbage
+      collector does not touch, and copy, the shared objects.
+
+    Workers can be recycled after a number of chunks, to bound their memory.
+    Spawn workers are replaced one by one by the pool. Prefork workers are all
+    replaced between two tasks, from the main thread: forking from the pool's
+    own threads could copy a lock held by the main thread (e.g. the one of the
+    log stream) into the new worker, which would then hang on it.
+    The values missing from the tables, the per-operation counters and the
+    log counts recorded by the workers are merged into the parent's collectors.
+    """
+
+    def __init__(self, context, workers: int, chunk_size: int = 0, start_method: str = "spawn",
+                 max_chunks_per_worker: int = 0):
+        """
+        Starts the workers.
+
+        Args:
+            context (PipelineContext): Context of the run, with its plans compiled.
+            workers (int): Number of worker processes.
+            chunk_size (int): Files sent to a worker at a time (0 = about 4 chunks per worker).
+            start_method (str): 'spawn' or 'prefork'.
+            max_chunks_per_worker (int): Chunks processed by a worker before it is
+                replaced by a new one (0 = never).
+
+        Raises:
+            ValueError: If the start method is unknown.
+        """
+        if start_method not in START_METHODS:
+            raise ValueError(f"Unknown start method '{start_method}', expected one of {START_METHODS}")
+        self.context = context
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.start_method = start_method
+        self.max_chunks_per_worker = max_chunks_per_worker
+        self._chunks_done = 0
+        # PIDs of the workers, as reported by their chunks (see memory_usage)
+        self._worker_pids = set()
+        logger = context.get_logger()
+
+        self.shared_tables: Optional[SharedTables] = None
+        if start_method == "prefork":
+            tables = context.warm_up()
+            logger.info("Warmed up %d compiled plans and %d workbooks before forking",
+                        len(context.compiled_plans), tables)
+            self._mp_context = multiprocessing.get_context("fork")
+            self._initializer, self._initargs = _init_forked_worker, (context,)
+        else:
+            if context.compiled_plans:
+                self.shared_tables = SharedTables.publish(context.compiled_plans, context.collectors())
+                logger.info(
+                    "Published %d compiled tables in shared memory (%d bytes)",
+                    len(context.compiled_plans), self.shared_tables.size,
+                )
+            handle = self.shared_tables.handle if self.shared_tables else None
+            self._mp_context = multiprocessing.get_context("spawn")
+            self._initializer, self._initargs = _init_worker, (str(context.get_run_dir()), handle)
+
+        self._pool = self._start()
+
+    def _start(self):
+        """
+        Starts the worker processes.
+        """
+        if self.start_method == "prefork":
+            # the workers must not inherit changelog lines still buffered by the parent
+            self.context.flush_changelogs()
+            # objects created so far are never collected: their pages stay shared
+            gc.collect()
+            gc.freeze()
+        return self._mp_context.Pool(
+            processes=self.workers,
+            initializer=self._initializer,
+            initargs=self._initargs,
+            maxtasksperchild=(self.max_chunks_per_worker or None) if self.start_method == "spawn" else None,
+        )
+
+    def _chunks(self, xml_files: List[str]) -> List[List[str]]:
+        size = self.chunk_size or max(1, math.ceil(len(xml_files) / (self.workers * 4)))
+        return [xml_files[i:i + size] for i in range(0, len(xml_files), size)]
+
+    def run_task(self, runner: Callable, task: Callable, xml_files: List[str], input_folder=None,
+                 output_folder=None, batch_task: Optional[Callable] = None, **kwargs):
+        """
+        Runs a task on all the files and waits for the workers to finish.
+
+        Args:
+            runner (Callable): Function executing a task on one file (main.execute_task).
+            task (Callable): Task function.
+            xml_files (List[str]): Files to process.
+            input_folder: Input folder of the task.
+            output_folder: Output folder of the task, if any.
+            batch_task (Callable, optional): Function running the task on a whole
+                chunk at once, with the worker's context (see main.get_batch_task),
+                used instead of the runner.
+            **kwargs: Additional task arguments.
+        """
+        jobs = [
+            self._pool.apply_async(
+                _run_chunk,
+                (runner, task, chunk, input_folder, output_folder, kwargs, self.context.changelog_epoch, batch_task),
+            )
+            for chunk in self._chunks(list(xml_files))
+        ]
+        for job in jobs:
+            unmatched, stats, log_counts, pid = job.get()
+            self._worker_pids.add(pid)
+            self.context.unmatched_values.merge(unmatched)
+            self.context.operation_stats.merge(stats)
+            self.context.log_aggregator.merge(log_counts)
+
+        self._chunks_done += len(jobs)
+        if (self.start_method == "prefork" and self.max_chunks_per_worker
+                and self._chunks_done >= self.max_chunks_per_worker * self.workers):
+            self.context.get_logger().info("Recycling the %d prefork workers", self.workers)
+            self._pool.close()
+            self._pool.join()
+            self._pool = self._start()
+            self._chunks_done = 0
+            self._worker_pids.clear()
+
+    def memory_usage(self) -> List[Dict[str, int]]:
+        """
+        Returns the memory of each live worker that has processed a chunk (see
+        _memory_usage), in kB. Workers replaced since then are skipped.
+        """
+        usage = []
+        for pid in sorted(self._worker_pids):
+            try:
+                with open(f"/proc/{pid}/stat") as f:
+                    # the PID may have been reused once the worker exited
+                    is_worker = int(f.read().rsplit(")", 1)[1].split()[1]) == os.getpid()
+                if is_worker:
+                    usage.append(_memory_usage(pid))
+                    continue
+            except OSError:
+                pass
+            # the worker has exited (replaced after max_chunks_per_worker)
+            self._worker_pids.discard(pid)
+        return usage
+
+    def close(self):
+        """
+        Logs the memory of the workers, stops them and removes the shared memory segment.
+        """
+        usage = self.memory_usage()
+        if usage:
+            self.context.get_logger().info(
+                "Worker memory (%s, average of %d): RSS %d kB, PSS %d kB, private %d kB",
+                self.start_method, len(usage),
+                *(sum(u[name] for u in usage) // len(usage) for name in ("rss", "pss", "uss")),
+            )
+        self._pool.close()
+        self._pool.join()
+        if self.shared_tables is not None:
+            self.shared_tables.close()
+            self.shared_tables = None
+        if self.start_method == "prefork":
+            gc.unfreeze()
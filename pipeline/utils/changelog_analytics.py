@@ -0,0 +1,195 @@
+import csv
+import json
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+from pipeline.utils.ChangelogStore import ChangelogStore, STORE_FILENAME
+
+# Columns of a change, as in the per-record CSV changelogs (plus the record)
+CHANGE_COLUMNS = ["record", "timestamp", "task", "action", "field", "old_value", "new_value"]
+
+# Columns the stats can be grouped by
+STATS_KEYS = ("record", "task", "action", "field")
+
+
+def _matches(value, patterns: Optional[Sequence[str]]) -> bool:
+    """
+    Tells whether a value matches one of the shell-style patterns (e.g. 'NationFR*'); no patterns match everything.
+    """
+    return not patterns or any(fnmatchcase(str(value), pattern) for pattern in patterns)
+
+
+def _counted(change: tuple) -> Tuple[str, str, str, int]:
+    """
+    Returns the task, action and field of a change and the number of changes it
+    stands for: a "summary" entry (see Changelog.flush_summary) counts the
+    changes of its action (old_value) that were not recorded one by one.
+    """
+    _, task, action, field, old_value, new_value = change[:6]
+    if action == "summary":
+        return task, old_value, field, int(new_value)
+    return task, action, field, 1
+
+
+def iter_records(run_dir, records: Optional[Sequence[str]] = None) -> Iterator[Tuple[str, Iterator[tuple]]]:
+    """
+    Iterates over the records of a run and their changes, reading either the
+    run's changelog store or its per-record CSV changelogs. Changes are
+    streamed one record at a time, never loaded all at once.
+
+    Args:
+        run_dir: Run folder.
+        records (Sequence[str], optional): Patterns of the records to read. Defaults to every record.
+
+    Yields:
+        Tuple[str, Iterator[tuple]]: The record (XML file name without extension)
+        and its changes, in order, as (timestamp, task, action, field, old_value, new_value).
+
+    Raises:
+        FileNotFoundError: If the run has neither a changelog store nor changelogs.
+    """
+    run_dir = Path(run_dir)
+    store_path = run_dir / STORE_FILENAME
+    if store_path.is_file():
+        # read-only: an analysis never writes to (or creates) the run's store
+        store = ChangelogStore(store_path, read_only=True)
+        try:
+            for record in store.records():
+                if _matches(record, records):
+                    # entries of action 'task' only open a task block in the .log view
+                    yield record, (row[1:] for row in store.changes(record) if row[3] != "task")
+        finally:
+            store.close()
+        return
+
+    changelogs_dir = run_dir / "changelogs"
+    if not changelogs_dir.is_dir():
+        raise FileNotFoundError(f"No changelog store or changelogs folder in {run_dir}")
+    for csv_path in sorted(changelogs_dir.glob("*.csv")):
+        if not _matches(csv_path.stem, records):
+            continue
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            next(reader, None)  # header
+            yield csv_path.stem, (tuple(row) for row in reader)
+
+
+def query_changes(run_dir, records=None, tasks=None, actions=None, fields=None) -> Iterator[tuple]:
+    """
+    Streams the changes of a run matching the filters.
+
+    Args:
+        run_dir: Run folder.
+        records, tasks, actions, fields (Sequence[str], optional): Shell-style
+            patterns; a change is kept if it matches one pattern of each given filter
+            (the action of a "summary" entry is the one of the changes it counts).
+
+    Yields:
+        tuple: The change, in CHANGE_COLUMNS order.
+    """
+    for record, changes in iter_records(run_dir, records):
+        for change in changes:
+            task, action, field, _ = _counted(change)
+            if _matches(task, tasks) and _matches(action, actions) and _matches(field, fields):
+                yield (record, *change)
+
+
+def records_without(run_dir, fields: Sequence[str], records=None, tasks=None, actions=None) -> Iterator[Tuple[str]]:
+    """
+    Streams the records of a run with no change on the given fields (e.g. the
+    records that got no 'NationFR*'), optionally only counting the changes of
+    some tasks or actions.
+
+    Yields:
+        Tuple[str]: The record.
+    """
+    for record, changes in iter_records(run_dir, records):
+        found = False
+        for change in changes:
+            task, action, field, _ = _counted(change)
+            if _matches(task, tasks) and _matches(action, actions) and _matches(field, fields):
+                found = True
+                break
+        if not found:
+            yield (record,)
+
+
+def changelog_stats(run_dir, by: Sequence[str] = ("task", "action", "field"), records=None, tasks=None,
+                    actions=None, fields=None) -> List[tuple]:
+    """
+    Counts the changes of a run matching the filters, grouped by the given columns.
+
+    Memory depends on the number of groups only (not on the number of changes
+    or records, unless grouping by record).
+
+    Args:
+        run_dir: Run folder.
+        by (Sequence[str]): Columns to group by, among STATS_KEYS.
+        records, tasks, actions, fields: Filters, see query_changes.
+
+    Returns:
+        List[tuple]: One row per group, sorted: the group's values, then the
+        number of changes (including the ones only counted by "summary"
+        entries) and the number of records with at least one change.
+
+    Raises:
+        ValueError: If a grouping column is unknown.
+    """
+    unknown = [key for key in by if key not in STATS_KEYS]
+    if unknown:
+        raise ValueError(f"Unknown stats column(s) {unknown}, expected among {STATS_KEYS}")
+
+    changes: Dict[tuple, int] = {}
+    record_counts: Dict[tuple, int] = {}
+    for record, record_changes in iter_records(run_dir, records):
+        seen = set()
+        for change in record_changes:
+            task, action, field, count = _counted(change)
+            if not (_matches(task, tasks) and _matches(action, actions) and _matches(field, fields)):
+                continue
+            values = {"record": record, "task": task, "action": action, "field": field}
+            key = tuple(values[column] for column in by)
+            changes[key] = changes.get(key, 0) + count
+            seen.add(key)
+        for key in seen:
+            record_counts[key] = record_counts.get(key, 0) + 1
+
+    return [(*key, changes[key], record_counts[key]) for key in sorted(changes, key=lambda k: tuple(map(str, k)))]
+
+
+def write_rows(rows: Iterable[tuple], columns: Sequence[str], output: TextIO, fmt: str = "csv") -> int:
+    """
+    Writes rows as CSV (with a header) or as a JSON array of objects, one row
+    at a time.
+
+    Args:
+        rows (Iterable[tuple]): Rows to write.
+        columns (Sequence[str]): Column names.
+        output (TextIO): Output stream.
+        fmt (str): 'csv' or 'json'.
+
+    Returns:
+        int: Number of rows written.
+
+    Raises:
+        ValueError: If the format is unknown.
+    """
+    if fmt not in ("csv", "json"):
+        raise ValueError(f"Unknown format '{fmt}', expected 'csv' or 'json'")
+    count = 0
+    if fmt == "csv":
+        writer = csv.writer(output)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+        return count
+
+    output.write("[")
+    for row in rows:
+        output.write(",\n  " if count else "\n  ")
+        output.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+        count += 1
+    output.write("\n]\n" if count else "]\n")
+    return count
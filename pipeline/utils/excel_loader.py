@@ -0,0 +1,113 @@
+from collections import defaultdict
+from typing import Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+from pandas.io.parsers import TextParser
+
+
+def _convert_cell(cell):
+    """
+    Converts a cell the way pandas' openpyxl reader does: empty cells become "",
+    error cells NaN (by type: a text cell reading '#N/A' stays text), and
+    integral numbers int (so that "12" is not read "12.0").
+    """
+    value = cell.value
+    if value is None:
+        return ""
+    if cell.data_type == TYPE_ERROR:
+        return np.nan
+    if cell.data_type == TYPE_NUMERIC:
+        as_int = int(value)
+        return as_int if as_int == value else float(value)
+    return value
+
+
+def _header_names(header: list) -> list:
+    """
+    Returns the column names pandas gives to a header row: empty cells become
+    'Unnamed: <position>' and duplicates are mangled ('X', 'X.1', 'X.2', ...).
+    """
+    names = [f"Unnamed: {i}" if name == "" else name for i, name in enumerate(header)]
+    counts = defaultdict(int)
+    for i, name in enumerate(names):
+        count = counts[name]
+        while count > 0:
+            counts[name] = count + 1
+            name = f"{name}.{count}"
+            count = counts[name]
+        names[i] = name
+        counts[name] = count + 1
+    return names
+
+
+def read_workbook(path, columns: Optional[Iterable[str]] = None, dtype=None, sheet_name=0) -> pd.DataFrame:
+    """
+    Reads one sheet of a workbook in read-only streaming mode, keeping only the requested columns.
+
+    The rows are streamed from the sheet and only the cells of the requested
+    columns are converted and parsed, which saves time and memory on wide
+    tables. For the columns it keeps, the result is the same DataFrame that
+    pd.read_excel(path, dtype=dtype, usecols=columns) returns (same values, same
+    row count, same dtypes). Requested columns missing from the header are
+    ignored, so that callers can still report them.
+
+    Args:
+        path: Path of the Excel file.
+        columns (Iterable[str], optional): Header names to keep. Defaults to every column.
+        dtype: Passed to the parser (e.g. str to read every cell as text).
+        sheet_name (int | str): Index or title of the sheet. Defaults to the first sheet.
+
+    Returns:
+        pd.DataFrame: The table, with the columns in workbook order.
+    """
+    wanted = None if columns is None else set(columns)
+
+    workbook = load_workbook(path, read_only=True, data_only=True, keep_links=False)
+    try:
+        sheet = workbook.worksheets[sheet_name] if isinstance(sheet_name, int) else workbook[sheet_name]
+        sheet.reset_dimensions()
+
+        # cells rather than values: error cells are told from text by their type
+        rows = sheet.iter_rows()
+        header = [_convert_cell(cell) for cell in next(rows, ())]
+        while header and header[-1] == "":
+            header.pop()
+
+        if wanted is None:
+            # every column: same rows as pandas, padded to the widest row
+            data: List[list] = [header]
+            for row in rows:
+                converted = [_convert_cell(cell) for cell in row]
+                while converted and converted[-1] == "":
+                    converted.pop()
+                data.append(converted)
+            while data and not data[-1]:
+                data.pop()
+            if not data:
+                return pd.DataFrame()
+            width = max(len(row) for row in data)
+            data = [row + [""] * (width - len(row)) for row in data]
+        else:
+            names = _header_names(header)
+            positions = [i for i, name in enumerate(names) if str(name) in wanted]
+            data = [[names[i] for i in positions]]
+            last_row_with_data = 0 if header else -1
+            for row in rows:
+                data.append([_convert_cell(row[i]) if i < len(row) else "" for i in positions])
+                # like pandas, trailing rows count as empty only if the whole row is empty
+                if any(cell.value is not None and cell.value != "" for cell in row):
+                    last_row_with_data = len(data) - 1
+            data = data[: last_row_with_data + 1]
+            if not data:
+                return pd.DataFrame()
+            if not positions:
+                return pd.DataFrame(index=pd.RangeIndex(len(data) - 1))
+    finally:
+        workbook.close()
+
+    # same parser and options as pd.read_excel
+    parser = TextParser(data, header=0, dtype=dtype, skip_blank_lines=False)
+    return parser.read()
@@ -0,0 +1,319 @@
+import datetime
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from pipeline.utils.excel_loader import read_workbook
+
+logger = logging.getLogger(__name__)
+
+# Sidecars are stored next to the workbooks, in this subfolder
+SIDECAR_FOLDER = ".sidecar"
+
+# Bumped when the sidecar layout changes, so that old files are ignored
+SIDECAR_VERSION = 2
+
+# Kinds of the cells of object columns (and of the column names), by position
+# in the '<column>.kind' array of a sidecar: a number, a text (UTF-8 in the
+# '<column>.text' blob, between two '<column>.offsets'), or a date or time
+# (its ISO text)
+_KINDS = ("float", "int", "bool", "str", "none", "datetime", "timestamp", "date", "time")
+_TEXT_KINDS = {
+    "str": str,
+    "datetime": datetime.datetime.fromisoformat,
+    "timestamp": pd.Timestamp,
+    "date": datetime.date.fromisoformat,
+    "time": datetime.time.fromisoformat,
+}
+# numpy kinds of the columns stored as they are (bool, integers, floats, dates, durations)
+_ARRAY_KINDS = "biufMm"
+
+
+class UnsupportedFrame(ValueError):
+    """Raised when a DataFrame holds values a sidecar cannot store (it is then not cached)."""
+
+
+class InvalidSidecar(ValueError):
+    """Raised when a sidecar file does not have the expected layout."""
+
+
+def file_hash(path) -> str:
+    """
+    Returns the SHA-256 of a file's content.
+
+    Args:
+        path: Path of the file.
+
+    Returns:
+        str: Hexadecimal digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _dtype_tag(dtype, columns=None) -> str:
+    """
+    Short, filename-safe tag of the options a table was read with (dtype and column projection).
+    """
+    if dtype is None:
+        tag = "raw"
+    elif dtype is str:
+        tag = "str"
+    else:
+        tag = hashlib.sha1(repr(dtype).encode("utf-8")).hexdigest()[:8]
+    if columns is not None:
+        tag += "-" + hashlib.sha1(repr(sorted(columns)).encode("utf-8")).hexdigest()[:8]
+    return tag
+
+
+def sidecar_path(path, content_hash: str, dtype=None, columns=None) -> Path:
+    """
+    Returns the sidecar file of a workbook for a given content hash and read options.
+
+    Args:
+        path: Path of the Excel file.
+        content_hash (str): SHA-256 of the workbook.
+        dtype: dtype option the table is read with.
+        columns: Columns the table is projected on (None for every column).
+
+    Returns:
+        Path: '<folder>/.sidecar/<name>.<hash prefix>.<options tag>.npz'
+    """
+    path = Path(path)
+    return path.parent / SIDECAR_FOLDER / f"{path.name}.{content_hash[:16]}.{_dtype_tag(dtype, columns)}.npz"
+
+
+def _cell_kind(value) -> str:
+    # checked in this order: bool is an int, pd.Timestamp and datetime are dates
+    if value is None:
+        return "none"
+    if isinstance(value, (bool, np.bool_)):
+        return "bool"
+    if isinstance(value, (int, np.integer)):
+        return "int"
+    if isinstance(value, (float, np.floating)):
+        return "float"
+    if isinstance(value, str):
+        return "str"
+    if isinstance(value, pd.Timestamp):
+        return "timestamp"
+    if isinstance(value, datetime.datetime):
+        return "datetime"
+    if isinstance(value, datetime.date):
+        return "date"
+    if isinstance(value, datetime.time):
+        return "time"
+    raise UnsupportedFrame(f"cells of type {type(value).__name__}")
+
+
+def _encode_cells(values, prefix: str, arrays: dict):
+    """
+    Stores a sequence of cells as plain arrays: '<prefix>.kind' (index in _KINDS),
+    '<prefix>.number' (floats), '<prefix>.int' (integers and booleans) and the
+    texts as a UTF-8 blob ('<prefix>.text') cut by '<prefix>.offsets'.
+    """
+    count = len(values)
+    kinds = np.zeros(count, dtype=np.uint8)
+    numbers = np.zeros(count, dtype=np.float64)
+    integers = np.zeros(count, dtype=np.int64)
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    texts = []
+    length = 0
+    for i, value in enumerate(values):
+        kind = _cell_kind(value)
+        kinds[i] = _KINDS.index(kind)
+        if kind == "float":
+            numbers[i] = value
+        elif kind in ("int", "bool"):
+            try:
+                integers[i] = value
+            except OverflowError:
+                raise UnsupportedFrame("integers out of the int64 range")
+        elif kind != "none":
+            encoded = (value if kind == "str" else value.isoformat()).encode("utf-8", "surrogatepass")
+            texts.append(encoded)
+            length += len(encoded)
+        offsets[i + 1] = length
+    arrays[f"{prefix}.kind"] = kinds
+    arrays[f"{prefix}.number"] = numbers
+    arrays[f"{prefix}.int"] = integers
+    arrays[f"{prefix}.offsets"] = offsets
+    arrays[f"{prefix}.text"] = np.frombuffer(b"".join(texts), dtype=np.uint8)
+
+
+def _decode_cells(sidecar, prefix: str, count: int) -> list:
+    """
+    Rebuilds the cells stored by _encode_cells, checking the arrays' layout.
+
+    Raises:
+        InvalidSidecar: If an array is missing or does not have the expected shape.
+    """
+    try:
+        kinds, numbers, integers, offsets, text = (
+            sidecar[f"{prefix}.{name}"] for name in ("kind", "number", "int", "offsets", "text")
+        )
+    except KeyError as e:
+        raise InvalidSidecar(f"missing array {e}")
+    if (kinds.dtype != np.uint8 or numbers.dtype != np.float64 or integers.dtype != np.int64
+            or offsets.dtype != np.int64 or text.dtype != np.uint8):
+        raise InvalidSidecar(f"unexpected array types for '{prefix}'")
+    if kinds.shape != (count,) or numbers.shape != (count,) or integers.shape != (count,) \
+            or offsets.shape != (count + 1,) or text.ndim != 1:
+        raise InvalidSidecar(f"unexpected array shapes for '{prefix}'")
+    if count and (kinds.max() >= len(_KINDS) or offsets[0] != 0 or offsets[-1] != len(text)
+                  or (np.diff(offsets) < 0).any()):
+        raise InvalidSidecar(f"inconsistent cells for '{prefix}'")
+    blob = text.tobytes()
+    cells = []
+    for i, kind in enumerate(kinds.tolist()):
+        kind = _KINDS[kind]
+        if kind == "float":
+            cells.append(float(numbers[i]))
+        elif kind == "int":
+            cells.append(int(integers[i]))
+        elif kind == "bool":
+            cells.append(bool(integers[i]))
+        elif kind == "none":
+            cells.append(None)
+        else:
+            cells.append(_TEXT_KINDS[kind](blob[offsets[i]:offsets[i + 1]].decode("utf-8", "surrogatepass")))
+    return cells
+
+
+def _frame_arrays(df: pd.DataFrame, content_hash: str) -> dict:
+    """
+    Converts a DataFrame into the arrays of its sidecar: column names and object
+    columns as cells (see _encode_cells), other columns as their numpy array,
+    and a JSON header ('meta') with the layout version, the workbook hash, the
+    row count and the kind of each column.
+
+    Raises:
+        UnsupportedFrame: If the frame holds something the layout cannot store.
+    """
+    if not isinstance(df.index, pd.RangeIndex) or df.index.start != 0 or df.index.step != 1:
+        raise UnsupportedFrame("an index other than 0..n-1")
+    arrays = {}
+    _encode_cells(list(df.columns), "columns", arrays)
+    column_kinds = []
+    for i, (_, column) in enumerate(df.items()):
+        if column.dtype == object:
+            _encode_cells(column.tolist(), f"c{i}", arrays)
+            column_kinds.append("cells")
+        elif isinstance(column.dtype, np.dtype) and column.dtype.kind in _ARRAY_KINDS:
+            arrays[f"c{i}.values"] = column.to_numpy()
+            column_kinds.append("array")
+        else:
+            raise UnsupportedFrame(f"columns of dtype {column.dtype}")
+    meta = {"version": SIDECAR_VERSION, "sha256": content_hash, "rows": len(df), "columns": column_kinds}
+    arrays["meta"] = np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8)
+    return arrays
+
+
+def _load_frame(sidecar_file, content_hash: str) -> pd.DataFrame:
+    """
+    Reads a sidecar written by _frame_arrays. Nothing in it can run code: it is
+    loaded with allow_pickle=False, and its layout is checked before use.
+
+    Raises:
+        InvalidSidecar: If the file is not a sidecar of this layout and workbook.
+    """
+    with np.load(sidecar_file, allow_pickle=False) as sidecar:
+        try:
+            meta = json.loads(sidecar["meta"].tobytes().decode("utf-8"))
+        except (KeyError, ValueError) as e:
+            raise InvalidSidecar(f"no valid header: {e}")
+        if not isinstance(meta, dict) or meta.get("version") != SIDECAR_VERSION or meta.get("sha256") != content_hash:
+            raise InvalidSidecar("written for another layout or workbook")
+        rows, column_kinds = meta.get("rows"), meta.get("columns")
+        if not isinstance(rows, int) or rows < 0 or not isinstance(column_kinds, list):
+            raise InvalidSidecar("invalid header")
+        names = _decode_cells(sidecar, "columns", len(column_kinds))
+        data = {}
+        for i, kind in enumerate(column_kinds):
+            if kind == "cells":
+                values = np.empty(rows, dtype=object)
+                values[:] = _decode_cells(sidecar, f"c{i}", rows)
+            elif kind == "array":
+                try:
+                    values = sidecar[f"c{i}.values"]
+                except KeyError as e:
+                    raise InvalidSidecar(f"missing array {e}")
+                if values.shape != (rows,) or values.dtype.kind not in _ARRAY_KINDS:
+                    raise InvalidSidecar(f"unexpected array for column {i}")
+            else:
+                raise InvalidSidecar(f"unknown column kind {kind!r}")
+            data[i] = values
+    df = pd.DataFrame(data, index=pd.RangeIndex(rows))
+    df.columns = names
+    return df
+
+
+def read_excel_with_sidecar(path, dtype=None, columns=None, reader=None) -> pd.DataFrame:
+    """
+    Reads a workbook through its binary sidecar.
+
+    The sidecar holds the DataFrame exactly as read from the workbook, as plain
+    numpy arrays in an .npz file (one set of arrays per column, loaded in
+    milliseconds with allow_pickle=False: a sidecar cannot run code, and its
+    layout is checked before use). It is looked up by the SHA-256 of the
+    workbook's content, so any change to the workbook invalidates it, whatever
+    its modification time. When no valid sidecar exists, the workbook is read
+    with `reader` and the sidecar is written for the next runs (and for the
+    other worker processes); sidecars of previous versions of the workbook are
+    removed. Tables holding values the layout cannot store are read from the
+    workbook every time.
+
+    Sidecars are a cache written by the pipeline itself: they can be deleted at
+    any time and are rebuilt on the next read.
+
+    Args:
+        path: Path of the Excel file.
+        dtype: Passed to the reader (e.g. str).
+        columns (Iterable[str], optional): Columns to keep. Defaults to every column.
+        reader (Callable, optional): Function (path, dtype, columns) -> DataFrame used
+            on a cache miss. Defaults to excel_loader.read_workbook.
+
+    Returns:
+        pd.DataFrame: The table.
+    """
+    reader = reader or (lambda p, d, c: read_workbook(p, columns=c, dtype=d))
+    content_hash = file_hash(path)
+    sidecar = sidecar_path(path, content_hash, dtype, columns)
+
+    if sidecar.exists():
+        try:
+            return _load_frame(sidecar, content_hash)
+        except Exception as e:
+            logger.warning("Ignoring unreadable sidecar '%s': %s", sidecar, e)
+
+    df = reader(path, dtype, columns)
+
+    try:
+        arrays = _frame_arrays(df, content_hash)
+    except UnsupportedFrame as e:
+        logger.info("No sidecar for '%s': %s", path, e)
+        return df
+
+    try:
+        sidecar.parent.mkdir(exist_ok=True)
+        tag = _dtype_tag(dtype, columns)
+        for stale in sidecar.parent.glob(f"{Path(path).name}.*.{tag}.*"):
+            if stale != sidecar and stale.suffix in (".npz", ".pkl"):
+                stale.unlink(missing_ok=True)
+        # write to a temporary file first, so that concurrent readers never see a partial sidecar
+        tmp = sidecar.with_name(f"{sidecar.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, sidecar)
+    except OSError as e:
+        logger.warning("Could not write sidecar for '%s': %s", path, e)
+
+    return df
@@ -1,30 +1,177 @@
+import atexit
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
 
-def setup_logging():
+from pipeline.utils.LogAggregator import LogAggregator
+
+# Formats of logs/pipeline.log
+LOG_FORMATS = ("text", "json")
+
+_TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Logging of the process: the handler of the root logger, its aggregator and the listener thread
+_queue_handler: Optional[QueueHandler] = None
+_aggregator: Optional[LogAggregator] = None
+_listener: Optional[QueueListener] = None
+_log_format = "text"
+_pid: Optional[int] = None
+
+
+class JsonFormatter(logging.Formatter):
     """
-    Configura le impostazioni di logging per l'applicazione con rotazione file.
+    Formats a log record as a JSON object on one line, with the task and the
+    XML file it was logged for, if any.
     """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "process": record.process,
+            "task": getattr(record, "task", None),
+            "xml_file": getattr(record, "xml_file", None),
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _RecordQueueHandler(QueueHandler):
+    """
+    Queues the records for the listener thread, with their message rendered
+    (the arguments may change once queued) but not formatted: each handler of
+    the listener applies its own format.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # the record is changed in place (copying it costs as much as queueing
+        # it): this handler, on the root logger, is the last one to see it
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _start_listener():
+    """
+    Starts the listener thread writing the queued records to the log file and the console.
+    """
+    global _listener, _pid
     log_folder = "logs"
     if not os.path.exists(log_folder):
         os.makedirs(log_folder)
-    
-    # Impostazione della rotazione per i log file
+
+    # Rotating log file, in text or JSON
     rotating_file_handler = RotatingFileHandler(
         os.path.join(log_folder, 'pipeline.log'),
         maxBytes=10 * 1024 * 1024,  # 10 MB
-        backupCount=3               # Numero di file di backup da mantenere
+        backupCount=3               # Backup files kept
     )
-
     rotating_file_handler.setLevel(logging.INFO)
-    rotating_file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-
-    # Configura il logger con il gestore di rotazione file e lo stream console
-    logging.basicConfig(
-        level=logging.INFO,
-        handlers=[
-            rotating_file_handler,
-            logging.StreamHandler()
-        ]
-    )
\ No newline at end of file
+    rotating_file_handler.setFormatter(
+        JsonFormatter() if _log_format == "json" else logging.Formatter(_TEXT_FORMAT)
+    )
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+
+    _queue_handler.queue = queue.Queue()
+    _listener = QueueListener(_queue_handler.queue, rotating_file_handler, console_handler,
+                              respect_handler_level=True)
+    _listener.start()
+    _pid = os.getpid()
+
+
+def setup_logging(mode: Optional[str] = None, log_format: Optional[str] = None,
+                  rate_limit: Optional[int] = None) -> LogAggregator:
+    """
+    Sets up the logging of the process: the records of every logger are queued
+    by a QueueHandler on the root logger and written to the rotating
+    'logs/pipeline.log' file and to the console by a QueueListener thread, so
+    that the tasks do not wait for the disk or the console. A LogAggregator
+    filters the records first (see LogAggregator for the modes and the rate limit).
+
+    Can be called again (e.g. by each PipelineContext): the handlers are set
+    up once per process, only the given settings are updated.
+
+    Args:
+        mode (str, optional): 'verbose' or 'quiet'. Defaults to the current mode ('verbose').
+        log_format (str, optional): Format of the log file, 'text' or 'json'
+            (one JSON object per line). Defaults to the current format ('text').
+        rate_limit (int, optional): Messages of a kind shown per task (0 = no limit).
+
+    Returns:
+        LogAggregator: The aggregator of the process.
+
+    Raises:
+        ValueError: If the mode or the format is unknown.
+    """
+    global _queue_handler, _aggregator, _log_format
+    if log_format is not None and log_format not in LOG_FORMATS:
+        raise ValueError(f"Unknown log_format '{log_format}', expected one of {LOG_FORMATS}")
+
+    if _aggregator is None:
+        _aggregator = LogAggregator()
+    _aggregator.configure(mode=mode, rate_limit=rate_limit)
+
+    if _queue_handler is None:
+        _log_format = log_format or _log_format
+        _queue_handler = _RecordQueueHandler(queue.Queue())
+        _queue_handler.addFilter(_aggregator)
+        root = logging.getLogger()
+        root.setLevel(logging.INFO)
+        root.addHandler(_queue_handler)
+        _start_listener()
+        atexit.register(stop_logging)
+    elif log_format is not None and log_format != _log_format:
+        # the file handler of the listener is replaced
+        stop_logging()
+        _log_format = log_format
+        _start_listener()
+    return _aggregator
+
+
+def flush_logging():
+    """
+    Waits until the queued records are written. Called by the worker processes
+    at the end of each chunk, as they exit without running the atexit hooks.
+    """
+    if _listener is not None and _pid == os.getpid():
+        _queue_handler.queue.join()
+
+
+def stop_logging():
+    """
+    Writes the queued records and stops the listener thread. Called when the
+    process exits.
+    """
+    global _listener
+    if _listener is not None and _pid == os.getpid():
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def reset_logging_after_fork():
+    """
+    Restarts the logging of a forked worker process: the listener thread of
+    the parent does not run in the worker, and its queue may have been copied
+    locked. The records still queued by the parent are left to the parent.
+    """
+    global _listener
+    if _queue_handler is None or _pid == os.getpid():
+        return
+    _listener = None
+    _aggregator.reset_after_fork()
+    _start_listener()
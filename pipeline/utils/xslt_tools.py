@@ -1,26 +1,127 @@
 import logging
+import os
+import threading
+from typing import Iterable, List
 from saxonche import PySaxonProcessor
 
 logger = logging.getLogger(__name__)
 
+# Saxon processor of the process and its compiled stylesheets (see get_xslt3_processor).
+# SaxonC objects must not be used, nor released, by two threads at once: every
+# call goes through the lock.
+_lock = threading.RLock()
+_saxon = {"pid": None}
+
+
+def _processor():
+    """
+    Returns the Saxon state of the process, creating the processor on first
+    use (and again in a forked worker). Called with the lock held.
+    """
+    if _saxon["pid"] != os.getpid():
+        processor = PySaxonProcessor(license=False)
+        _saxon.update(
+            processor=processor,
+            xslt_processor=processor.new_xslt30_processor(),
+            # stylesheet path -> (modification time, XsltExecutable)
+            executables={},
+            pid=os.getpid(),
+        )
+    return _saxon
+
+
 def execute_xsl_transformation(xml_file, xsl_file):
+    """
+    Applies a stylesheet to an XML file with its compiled stylesheet (see
+    get_xslt3_processor): each record only pays for the parsing and the
+    transformation.
+
+    Args:
+        xml_file: Path of the XML file.
+        xsl_file: Path of the XSL file.
+
+    Returns:
+        str: The transformed document.
+    """
     try:
-        with PySaxonProcessor(license=False) as proc:
-            xsltproc = proc.new_xslt30_processor()
-            xml_input = proc.parse_xml(xml_file_name=xml_file)
-            xslt_exec = xsltproc.compile_stylesheet(stylesheet_file=xsl_file)
-            xml_output = xslt_exec.transform_to_string(xdm_node=xml_input)
-        return xml_output
+        with _lock:
+            xslt_exec = get_xslt3_processor(xsl_file)
+            # parsed by Saxon from the file: a node parsed beforehand would stay
+            # referenced by the executable once released, and crash its next
+            # transform_to_file (see execute_xsl_batch)
+            return xslt_exec.transform_to_string(source_file=str(xml_file))
     except Exception as e:
         logger.error(f"Errore nella trasformazione XSLT: {e}")
         raise
-    
+
+
+def execute_xsl_batch(xml_files: Iterable[str], input_folder, output_folder, xsl_file) -> List[str]:
+    """
+    Applies a stylesheet to a list of XML files in one Saxon session: the lock
+    is taken once and each document is parsed, transformed and written to the
+    output folder by Saxon, without going through a Python string.
+
+    The output is the same as execute_xsl_transformation's, written with the
+    same file name in the output folder.
+
+    Args:
+        xml_files: Names of the XML files.
+        input_folder: Folder containing the XML files.
+        output_folder: Folder where the transformed files are written.
+        xsl_file: Path of the XSL file.
+
+    Returns:
+        List[str]: The paths of the transformed files.
+
+    Raises:
+        PySaxonApiError: If a file cannot be transformed (the files before it are written).
+    """
+    output_paths = []
+    with _lock:
+        xslt_exec = get_xslt3_processor(xsl_file)
+        for xml_file in xml_files:
+            output_path = os.path.join(str(output_folder), xml_file)
+            try:
+                xslt_exec.transform_to_file(
+                    source_file=os.path.join(str(input_folder), xml_file),
+                    output_file=output_path,
+                )
+            except Exception as e:
+                logger.error(f"Errore nella trasformazione XSLT di {xml_file}: {e}")
+                raise
+            output_paths.append(output_path)
+    return output_paths
+
+
 def get_xslt3_processor(xsl_file):
+    """
+    Returns the compiled stylesheet (XsltExecutable) of an XSL file.
+
+    A single PySaxonProcessor is created per process and each stylesheet is
+    compiled once, then again only when the file changes. Calls are
+    serialized by a lock (SaxonC objects are not thread-safe): use the
+    executable with the module's lock held, as execute_xsl_transformation and
+    execute_xsl_batch do.
+
+    Args:
+        xsl_file: Path of the XSL file.
+
+    Returns:
+        PyXsltExecutable: The compiled stylesheet.
+    """
     try:
-        with PySaxonProcessor(license=False) as proc:
-            xsltproc = proc.new_xslt30_processor()
-            xslt_exec = xsltproc.compile_stylesheet(stylesheet_file=xsl_file)
-            return xslt_exec
+        with _lock:
+            saxon = _processor()
+            path = os.path.abspath(str(xsl_file))
+            mtime = os.stat(path).st_mtime_ns
+            cached = saxon["executables"].get(path)
+            if cached is None or cached[0] != mtime:
+                xslt_exec = saxon["xslt_processor"].compile_stylesheet(stylesheet_file=path)
+                if xslt_exec is None:
+                    raise ValueError(f"Could not compile {path}: {saxon['xslt_processor'].error_message}")
+                cached = (mtime, xslt_exec)
+                saxon["executables"][path] = cached
+            return cached[1]
     except Exception as e:
         logger.error(f"Error in initiating processor XSLT: {e}")
         raise
@@ -0,0 +1,117 @@
+import csv
+import json
+import os
+import sys
+
+import openpyxl
+import pytest
+from lxml import etree
+
+# The tests import the pipeline from the repository root and read its configs/
+# folder (load_config) relative to the working directory, as main.py does.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from pipeline.utils.Changelog import Changelog  # noqa: E402
+
+# Two small conversion tables: 'general' updates and a 'replace_set', and a
+# 'by_id' table adding values to some records only
+TABLES = {
+    "population-general.xlsx": (
+        {
+            "mode": "general",
+            "operations": [
+                {"type": "update", "from": {"xpath": "PopulationFR/value", "col": "ValeursPEF"},
+                 "to": {"xpath": "PopulationFR/value", "col": "Valeurs FReSH"}},
+                {"type": "replace_set", "from": {"xpath": "PopulationFR", "col": "Valeurs FReSH"},
+                 "to": {"xpath": "PopulationEN", "col": "FReSHEN"}},
+            ],
+        },
+        [
+            ["ValeursPEF", "Valeurs FReSH", "FReSHEN"],
+            ["Adultes", "Adultes & seniors", "Adults and seniors"],
+            ["Enfants", "Enfants", "Children"],
+            ["Ados", "Adolescents", "Teenagers"],
+            ["Adolescents", "Jeunes", "Young people"],
+            ["Nourrissons", None, "Infants"],
+            ["Bébés", "Nourrissons", None],
+        ],
+    ),
+    "population-by-id.xlsx": (
+        {
+            "file_id_column": "ID_PEF",
+            "operations": [
+                {"type": "add", "to": {"col": "Ajout", "xpath": "PopulationFR/value"}},
+                {"type": "delete", "from": {"col": "Retrait", "xpath": "PopulationFR"}},
+            ],
+        },
+        [
+            ["ID_PEF", "Ajout", "Retrait"],
+            ["1", "Femmes enceintes", None],
+            ["1", "Patients", "Enfants"],
+            ["3", None, "Adultes & seniors"],
+        ],
+    ),
+}
+
+RECORDS = {
+    "1_fiche.xml": ["Adultes", "Enfants", "Inconnu"],
+    "2_fiche.xml": ["Ados", "Bébés"],
+    "3_fiche.xml": ["Adultes & seniors", "Nourrissons", "Ados"],
+    "4_fiche.xml": [],
+}
+
+
+@pytest.fixture
+def conversion_tables(tmp_path, monkeypatch):
+    """
+    Writes TABLES (configs/ and files/conversion-tables/) in a temporary folder
+    and makes it the working directory. Returns the table filenames.
+    """
+    (tmp_path / "configs").mkdir()
+    tables_dir = tmp_path / "files" / "conversion-tables"
+    tables_dir.mkdir(parents=True)
+    for filename, (config, rows) in TABLES.items():
+        (tmp_path / "configs" / filename.replace(".xlsx", ".json")).write_text(json.dumps(config), encoding="utf-8")
+        book = openpyxl.Workbook()
+        for row in rows:
+            book.active.append(row)
+        book.save(tables_dir / filename)
+    monkeypatch.chdir(tmp_path)
+    return list(TABLES)
+
+
+def record_tree(values):
+    """
+    Returns a small record with the given PopulationFR values.
+    """
+    items = "".join(f"<value>{value.replace('&', '&amp;')}</value>" for value in values)
+    return etree.ElementTree(etree.fromstring(
+        f"<Fiche><ID>0</ID><PopulationFR>{items}</PopulationFR><PopulationEN><value>x</value></PopulationEN></Fiche>"
+    ))
+
+
+def changelog_rows(changelog: Changelog):
+    """
+    Returns the rows of a changelog CSV, without their timestamps.
+    """
+    with open(changelog.csv_path, newline="", encoding="utf-8") as f:
+        return [row[1:] for row in csv.reader(f)]
+
+
+def pytest_addoption(parser):
+    parser.addoption("--run-slow", action="store_true", help="Also run the tests marked slow (full-corpus runs)")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: runs the pipeline on a large corpus (skipped without --run-slow)")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--run-slow"):
+        return
+    skip = pytest.mark.skip(reason="slow test, run with --run-slow")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip)
@@ -0,0 +1,36 @@
+import pytest
+
+from pipeline.utils.ChangelogWriter import ChangelogWriter
+
+
+def _failing_diff():
+    raise ValueError("diff failed to render")
+
+
+def test_failing_line_is_the_only_one_lost(tmp_path):
+    first, second = str(tmp_path / "first.log"), str(tmp_path / "second.log")
+    writer = ChangelogWriter()
+    try:
+        writer.write(first, "line 1\n")
+        writer.write(first, _failing_diff)
+        writer.write(second, lambda: "line 2\n")
+        writer.write(first, "line 3\n")
+        with pytest.raises(OSError, match="first.log"):
+            writer.flush()
+        # the writer keeps working once the error is raised
+        writer.write(second, "line 4\n")
+        writer.flush()
+    finally:
+        writer.close()
+
+    assert (tmp_path / "first.log").read_text(encoding="utf-8") == "line 1\nline 3\n"
+    assert (tmp_path / "second.log").read_text(encoding="utf-8") == "line 2\nline 4\n"
+
+
+def test_error_is_raised_once(tmp_path):
+    writer = ChangelogWriter()
+    writer.write(str(tmp_path / "first.log"), _failing_diff)
+    with pytest.raises(OSError):
+        writer.flush()
+    writer.flush()
+    writer.close()
@@ -0,0 +1,71 @@
+import datetime
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pytest
+
+from pipeline.utils.excel_sidecar import file_hash, read_excel_with_sidecar, sidecar_path
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    """A workbook mixing texts, numbers, booleans, dates, times and empty cells."""
+    book = openpyxl.Workbook()
+    sheet = book.active
+    sheet.append(["ID", 2020, "Date", "Label", "Flag"])
+    sheet.append(["1001", 1, datetime.datetime(2020, 1, 2, 3, 4), datetime.date(2021, 5, 6), True])
+    sheet.append([None, 2.5, datetime.time(10, 11), None, False])
+    sheet.append(["é #N/A", 3, None, "t", None])
+    path = tmp_path / "table.xlsx"
+    book.save(path)
+    return path
+
+
+@pytest.mark.parametrize("dtype", [None, str])
+def test_sidecar_gives_the_workbook_frame(workbook, dtype):
+    expected = pd.read_excel(workbook, dtype=dtype)
+    first = read_excel_with_sidecar(workbook, dtype=dtype)
+    assert sidecar_path(workbook, file_hash(workbook), dtype).is_file()
+    cached = read_excel_with_sidecar(workbook, dtype=dtype)
+    pd.testing.assert_frame_equal(first, expected, check_exact=True)
+    pd.testing.assert_frame_equal(cached, expected, check_exact=True)
+
+
+def test_pickled_sidecar_is_never_unpickled(workbook):
+    read_excel_with_sidecar(workbook)
+    sidecar = sidecar_path(workbook, file_hash(workbook), None)
+    executed = []
+
+    class Payload:
+        def __reduce__(self):
+            return executed.append, ("unpickled",)
+
+    with open(sidecar, "wb") as f:
+        np.savez(f, meta=np.array([Payload()], dtype=object))
+
+    pd.testing.assert_frame_equal(read_excel_with_sidecar(workbook), pd.read_excel(workbook))
+    assert executed == []
+    # rewritten with a valid layout
+    pd.testing.assert_frame_equal(read_excel_with_sidecar(workbook), pd.read_excel(workbook))
+
+
+def test_sidecar_with_unexpected_shapes_is_ignored(workbook):
+    read_excel_with_sidecar(workbook)
+    sidecar = sidecar_path(workbook, file_hash(workbook), None)
+    arrays = dict(np.load(sidecar, allow_pickle=False))
+    arrays["c0.offsets"] = arrays["c0.offsets"][::-1].copy()
+    with open(sidecar, "wb") as f:
+        np.savez(f, **arrays)
+
+    pd.testing.assert_frame_equal(read_excel_with_sidecar(workbook), pd.read_excel(workbook))
+
+
+def test_edited_workbook_invalidates_its_sidecar(workbook):
+    read_excel_with_sidecar(workbook)
+    book = openpyxl.load_workbook(workbook)
+    book.active["A2"] = "1002"
+    book.save(workbook)
+
+    assert read_excel_with_sidecar(workbook)["ID"].iloc[0] == "1002"
+    assert len(list((workbook.parent / ".sidecar").glob("*.npz"))) == 1
@@ -0,0 +1,42 @@
+import pytest
+from lxml import etree
+
+from conftest import RECORDS, changelog_rows, record_tree
+from pipeline.utils.Changelog import Changelog
+from pipeline.utils.FieldTransformer import CompiledPlan, FusedPlan
+
+
+def _apply_each(plan, tmp_path):
+    """
+    Applies a plan record by record; returns the XML and changelog rows of each record.
+    """
+    results = []
+    for xml_file, values in RECORDS.items():
+        changelog = Changelog(xml_file, tmp_path / "each")
+        tree = plan.apply(record_tree(values), xml_file.split("_")[0], "task", changelog)
+        results.append((etree.tostring(tree), changelog_rows(changelog)))
+    return results
+
+
+def _apply_many(plan, tmp_path):
+    """
+    Applies a plan to all the records in one batch; returns the same as _apply_each.
+    """
+    changelogs = [Changelog(xml_file, tmp_path / "many") for xml_file in RECORDS]
+    trees = plan.apply_transformations_many(
+        [record_tree(values) for values in RECORDS.values()],
+        [xml_file.split("_")[0] for xml_file in RECORDS],
+        "task",
+        changelogs,
+    )
+    return [(etree.tostring(tree), changelog_rows(changelog)) for tree, changelog in zip(trees, changelogs)]
+
+
+@pytest.mark.parametrize("fused", [False, True])
+def test_batch_apply_matches_per_record_apply(conversion_tables, tmp_path, fused):
+    plans = [CompiledPlan(name) for name in conversion_tables]
+    targets = [FusedPlan(plans)] if fused else plans
+    for i, plan in enumerate(targets):
+        each = _apply_each(plan, tmp_path / str(i))
+        assert any(rows[1:] for _, rows in each)
+        assert _apply_many(plan, tmp_path / str(i)) == each
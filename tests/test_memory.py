@@ -0,0 +1,87 @@
+import os
+import shutil
+import threading
+
+import pytest
+
+import main
+import pipeline.tasks
+from pipeline.utils.PipelineContext import PipelineContext
+
+pytestmark = pytest.mark.slow
+
+# Size of the replicated corpus (MEMORY_CHECK_RECORDS overrides it)
+RECORDS = int(os.environ.get("MEMORY_CHECK_RECORDS", 100000))
+
+# Tasks run on the replicated corpus
+TASKS = ["align_sex", "update_regions", "update_population_types"]
+
+# Growth allowed, in MiB, of the peak RSS of the run over the peak of its first
+# tenth (the warm-up: tables, caches)
+MAX_GROWTH = 64
+
+
+def _rss_mib():
+    """Resident memory of the process (Linux, /proc/self/statm), in MiB."""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def replicate_corpus(input_folder, output_folder, records):
+    """
+    Fills a folder with `records` XML files, copies of the files of the input
+    folder taken in turn ('1000_fiche.xml' -> '1000_fiche-00002.xml' for its
+    third copy: the ID before the first '_' is kept). Copies are hard links
+    when the file system allows it.
+    """
+    sources = sorted(name for name in os.listdir(input_folder) if name.endswith(".xml"))
+    os.makedirs(output_folder, exist_ok=True)
+    for index in range(records):
+        name = sources[index % len(sources)]
+        source = os.path.join(input_folder, name)
+        target = os.path.join(output_folder, f"{name[:-len('.xml')]}-{index // len(sources):05d}.xml")
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copyfile(source, target)
+
+
+def test_memory_stays_flat_on_a_large_corpus(tmp_path):
+    """
+    Replicates the input files to RECORDS records, runs TASKS on them in this
+    process (each record between begin_record and end_record) and samples the
+    RSS every second: after the warm-up, it must not grow with the records.
+    """
+    run_context = PipelineContext(run_dir=tmp_path / "run")
+    input_folder = run_context.get_original_folder()
+    if not os.path.isdir(input_folder or "") or not any(name.endswith(".xml") for name in os.listdir(input_folder)):
+        pytest.skip(f"no input files in {input_folder}")
+    corpus = tmp_path / "replicated-inputs"
+    replicate_corpus(input_folder, corpus, RECORDS)
+    run_context.original_folder = str(corpus)
+
+    tasks = [(getattr(pipeline.tasks, name), {}) for name in TASKS]
+    run_context.compile_plans(main.get_conversion_tables(tasks))
+    samples = [_rss_mib()]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(1):
+            samples.append(_rss_mib())
+
+    sampler = threading.Thread(target=sample, name="memory-sampler", daemon=True)
+    sampler.start()
+    try:
+        main.run_tasks(tasks, run_context)
+    finally:
+        done.set()
+        sampler.join()
+        samples.append(_rss_mib())
+        run_context.close_changelogs()
+
+    warm_up_peak = max(samples[:max(1, len(samples) // 10)])
+    growth = max(samples) - warm_up_peak
+    assert growth <= MAX_GROWTH, (
+        f"RSS grew by {growth:.1f} MiB after the first tenth of the run "
+        f"({len(samples)} samples, {warm_up_peak:.1f} MiB after the warm-up)"
+    )
@@ -0,0 +1,107 @@
+from os.path import join
+
+import pytest
+
+from pipeline.tasks.add_fresh_enrichment_namespace import (
+    _xsl_file, add_fresh_enrichment_namespace_batch, compare_engines as compare_enrichment_namespace,
+    enrich_namespace,
+)
+from pipeline.tasks.split_fr_en import LANGUAGES, compare_engines as compare_split_fr_en, split_document
+from pipeline.utils.load_config import load_config
+from pipeline.utils.xslt_tools import execute_xsl_transformation
+
+DECLARATION = '<?xml version="1.0" encoding="UTF-8"?>\n'
+
+# Small bilingual records, and whether enrich_namespace transforms them itself
+# (True) or leaves them to the stylesheet (False)
+DOCUMENTS = {
+    "plain.xml": (True, DECLARATION + (
+        "<FichePortailEpidemiologieFrance>\n  <ID>1</ID>\n  <NomFR>Étude</NomFR><NomEN>Study</NomEN>\n"
+        "  <PopulationFR><value>Adultes</value><value/></PopulationFR><PopulationEN/>\n"
+        "</FichePortailEpidemiologieFrance>\n"
+    )),
+    "escapes.xml": (True, DECLARATION + (
+        '<FichePortailEpidemiologieFrance version="2" note="a &quot;b&quot;&#9;c">'
+        "<TexteFR>a &amp; b &lt; c &gt; d \" ' &#13; é</TexteFR>"
+        "<TexteEN>tab\there &#10; end</TexteEN>"
+        "<Donnees><TypeFR>x</TypeFR><TypeEN>y</TypeEN><Autre>z</Autre></Donnees>"
+        "</FichePortailEpidemiologieFrance>"
+    )),
+    "control-characters.xml": (False, DECLARATION + (
+        "<FichePortailEpidemiologieFrance><TexteFR>\x85 \x7f \u2028</TexteFR></FichePortailEpidemiologieFrance>"
+    )),
+    "default-namespace.xml": (False, DECLARATION + (
+        '<FichePortailEpidemiologieFrance><Bloc xmlns="urn:other"><ChampFR>a</ChampFR><Champ>b</Champ></Bloc>'
+        "</FichePortailEpidemiologieFrance>"
+    )),
+    "fresh-values.xml": (False, DECLARATION + (
+        '<FichePortailEpidemiologieFrance><PopulationFR><value>a</value>'
+        '<ns0:value xmlns:ns0="urn:fresh-enrichment:v1">b</ns0:value></PopulationFR>'
+        "</FichePortailEpidemiologieFrance>"
+    )),
+    "already-enriched.xml": (True, DECLARATION + (
+        '<FichePortailEpidemiologieFrance xmlns:fresh="urn:fresh-enrichment:v1"><ID>3</ID>'
+        "</FichePortailEpidemiologieFrance>"
+    )),
+    "comments.xml": (False, DECLARATION + (
+        "<FichePortailEpidemiologieFrance><!-- note --><ID>4</ID><?marker keep?><NomFR>n</NomFR>"
+        "</FichePortailEpidemiologieFrance>"
+    )),
+    "nested-root.xml": (False, DECLARATION + (
+        "<Export><FichePortailEpidemiologieFrance><ID>5</ID></FichePortailEpidemiologieFrance></Export>"
+    )),
+    "other-root.xml": (True, DECLARATION + "<Autre><TitreFR>t</TitreFR><TitreEN>t</TitreEN></Autre>"),
+}
+
+
+@pytest.fixture
+def documents(tmp_path):
+    """
+    Writes DOCUMENTS to a temporary folder and returns it.
+    """
+    for name, (_, text) in DOCUMENTS.items():
+        (tmp_path / name).write_bytes(text.encode("utf-8"))
+    return tmp_path
+
+
+@pytest.mark.parametrize("name", DOCUMENTS)
+def test_enrich_namespace_matches_stylesheet(documents, name):
+    native_expected, _ = DOCUMENTS[name]
+    path = str(documents / name)
+    native = enrich_namespace((documents / name).read_bytes())
+    assert (native is not None) == native_expected
+    if native is not None:
+        assert native == execute_xsl_transformation(path, _xsl_file()).encode("utf-8")
+
+
+@pytest.mark.parametrize("name", DOCUMENTS)
+def test_split_document_matches_stylesheets(documents, name):
+    xslt_files_folder = load_config("folders.yaml").get("xslt_files_folder")
+    references = tuple(
+        execute_xsl_transformation(str(documents / name), join(xslt_files_folder, f"split-{language.lower()}.xsl"))
+        for language in LANGUAGES
+    )
+    assert split_document((documents / name).read_bytes()) == references
+
+
+def test_split_document_fails_where_stylesheets_fail(tmp_path):
+    path = tmp_path / "suffix-only.xml"
+    path.write_text(DECLARATION + "<Fiche><FR>a</FR></Fiche>", encoding="utf-8")
+    assert compare_split_fr_en(str(tmp_path)) == {"files": 1, "native": 1, "different": []}
+    with pytest.raises(ValueError):
+        split_document(path.read_bytes())
+
+
+def test_compare_engines_find_no_difference(documents):
+    native = sum(1 for native_expected, _ in DOCUMENTS.values() if native_expected)
+    assert compare_enrichment_namespace(str(documents)) == {"files": len(DOCUMENTS), "native": native, "different": []}
+    assert compare_split_fr_en(str(documents)) == {"files": len(DOCUMENTS), "native": len(DOCUMENTS), "different": []}
+
+
+def test_batch_matches_stylesheet_on_each_file(documents, tmp_path):
+    output_folder = tmp_path / "outputs"
+    output_folder.mkdir()
+    add_fresh_enrichment_namespace_batch(sorted(DOCUMENTS), str(documents), str(output_folder))
+    for name in DOCUMENTS:
+        expected = execute_xsl_transformation(str(documents / name), _xsl_file()).encode("utf-8")
+        assert (output_folder / name).read_bytes() == expected
@@ -0,0 +1,85 @@
+import pytest
+from lxml import etree
+
+from conftest import RECORDS, changelog_rows, record_tree
+from pipeline.utils.Changelog import Changelog
+from pipeline.utils.FieldTransformer import CompiledPlan
+from pipeline.utils.OperationStats import OperationStats
+from pipeline.utils.SharedTables import SharedMap, SharedSet, StringColumn, PositionLists
+from pipeline.utils.SharedTables import SharedTables
+from pipeline.utils.UnmatchedValues import UnmatchedValues
+
+
+@pytest.fixture
+def published(conversion_tables):
+    """
+    Plans compiled in this process, published, and the same plans attached with
+    other collectors (as a worker would).
+    """
+    unmatched, stats = UnmatchedValues(), OperationStats()
+    plans = {name: CompiledPlan(name, unmatched=unmatched, stats=stats) for name in conversion_tables}
+    shared = SharedTables.publish(plans, {"unmatched": unmatched, "stats": stats})
+    collectors = {"unmatched": UnmatchedValues(), "stats": OperationStats()}
+    yield shared, plans, SharedTables.attach(shared.handle, collectors), collectors
+    shared.close()
+
+
+def test_string_column_keeps_text_and_missing_values():
+    values = ["", "é & <b>", None, "\ud800", "x" * 1000]
+    column = StringColumn(values)
+    assert list(column) == values
+    assert column[-1] == values[-1]
+    with pytest.raises(IndexError):
+        column[len(values)]
+
+
+def test_shared_map_and_set_lookups():
+    mapping = SharedMap({"b": "2", "a": "1", "é": ""})
+    assert mapping.get("a") == "1" and mapping["é"] == "" and mapping.get("c") is None
+    assert "b" in mapping and None not in mapping
+    assert dict(mapping.items()) == {"a": "1", "b": "2", "é": ""}
+    positions = SharedMap({"k": [3, 5], "j": []}, pack=PositionLists)
+    assert list(positions["k"]) == [3, 5] and len(positions["j"]) == 0
+    values = SharedSet(["y", "x", "y"])
+    assert "x" in values and "z" not in values and None not in values and len(values) == 2
+
+
+def test_values_stay_out_of_band(published):
+    shared, _, _, _ = published
+    segment = bytes(shared._shm.buf)
+    for (offset, length), _ in shared.layout.values():
+        in_band = segment[offset:offset + length]
+        for value in (b"Adultes", b"Children", b"Femmes enceintes"):
+            assert value not in in_band
+
+
+def test_attached_plans_match_compiled_plans(published):
+    _, plans, attached, collectors = published
+    for name, plan in plans.items():
+        copy = attached[name]
+        assert copy.unmatched is collectors["unmatched"] and copy.stats is collectors["stats"]
+        assert copy.df is None and list(copy.records) == plan.records
+        for file_id in ("1", "2", "3", "9"):
+            assert copy.records_for(file_id) == plan.records_for(file_id)
+        for key, mapping in plan._replace_set_maps.items():
+            assert dict(copy._replace_set_maps[key].items()) == mapping
+            for value in ("adultes & seniors", "Enfants", "inconnu"):
+                assert copy.replace_set_lookup(*key, value) == plan.replace_set_lookup(*key, value)
+        for op_idx in plan._update_indexes:
+            for value in ("Adultes", "Ados", "Bébés", "Inconnu"):
+                assert copy.update_chain(op_idx, value) == plan.update_chain(op_idx, value)
+                assert copy.is_update_known(op_idx, value) == plan.is_update_known(op_idx, value)
+        for value in ("Enfants", " ", None):
+            assert copy.is_significant(value) == plan.is_significant(value)
+
+
+def test_attached_plans_transform_like_compiled_plans(published, tmp_path):
+    _, plans, attached, _ = published
+    for name in plans:
+        for xml_file, values in RECORDS.items():
+            results = []
+            for source, plan in (("compiled", plans[name]), ("attached", attached[name])):
+                changelog = Changelog(xml_file, tmp_path / source / name)
+                tree = plan.apply(record_tree(values), xml_file.split("_")[0], "task", changelog)
+                results.append((etree.tostring(tree), changelog_rows(changelog)))
+            assert results[0] == results[1]